@@ -1,4 +1,4 @@
-from apps.models import Sale, SaleItem, User
+from apps.models import Job, Sale, SaleItem, StockMovement, User
 from apps.models.products import Product
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
@@ -20,6 +20,7 @@ class ProductAdmin(admin.ModelAdmin):
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
     extra = 0
+    readonly_fields = ('line_total', 'line_cost')
 
 
 @admin.register(Sale)
@@ -29,6 +30,27 @@ class SaleAdmin(admin.ModelAdmin):
     list_filter = ('payment_type', 'created_at')
 
 
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('product', 'kind', 'quantity', 'sale', 'purchase', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('product__name', 'product__barcode')
+    list_select_related = ('product',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('result', 'filename', 'content_type', 'error', 'started_at', 'finished_at')
+
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
@@ -7,3 +7,8 @@ class AppsConfig(AppConfig):
 
     def ready(self):
         import apps.signals  # noqa 401
+        from django.conf import settings
+
+        if getattr(settings, 'PRELOAD_DOCUMENT_BACKENDS', False):
+            from apps.services.document_backends import preload
+            preload()
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from apps.models import Product, SaleItem
+from apps.services.sales_summary import rebuild_summaries
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the cost snapshot and line totals of sale items recorded before they existed, "
+        "using today's product cost prices, then rebuild the affected daily summaries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        current_cost = Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1]
+        filled, first, last = 0, None, None
+
+        while True:
+            pks = list(
+                SaleItem.objects.filter(cost_price__isnull=True)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+
+            batch = SaleItem.objects.filter(pk__in=pks)
+            with transaction.atomic():
+                # items whose product is gone get a zero cost, so they are not picked up again
+                batch.update(
+                    cost_price=Coalesce(Subquery(current_cost), Decimal('0.00'), output_field=DecimalField()),
+                    line_total=F('quantity') * F('price'),
+                )
+                batch.update(line_cost=F('quantity') * F('cost_price'))
+            span = batch.aggregate(first=Min('sale__created_at'), last=Max('sale__created_at'))
+            first = min(filter(None, [first, span['first']]), default=None)
+            last = max(filter(None, [last, span['last']]), default=None)
+            filled += len(pks)
+            self.stdout.write(f"Filled {filled} item(s)...")
+
+        if first is None:
+            self.stdout.write(self.style.SUCCESS("Nothing to backfill."))
+            return
+
+        days = rebuild_summaries(timezone.localdate(first), timezone.localdate(last))
+        self.stdout.write(self.style.SUCCESS(f"Filled {filled} item(s); rebuilt {days} daily summaries."))
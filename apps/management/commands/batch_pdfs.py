@@ -0,0 +1,42 @@
+import time
+from datetime import date
+
+from apps.services.batch_documents import BATCH_FORMATS, BATCH_KINDS, batch_members, render_batch
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every purchase PDF and sale receipt of a date range across a process pool "
+        "and write them as one zip or one merged PDF."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day (YYYY-MM-DD); defaults to the first of the month.")
+        parser.add_argument('--end', help="Last day (YYYY-MM-DD); defaults to today.")
+        parser.add_argument('--kinds', nargs='+', choices=BATCH_KINDS, default=list(BATCH_KINDS))
+        parser.add_argument('--format', choices=BATCH_FORMATS, default='zip')
+        parser.add_argument('--workers', type=int, help="Processes; defaults to BATCH_PDF_WORKERS or one per core.")
+        parser.add_argument('--output', help="File to write; defaults to documents_<start>_<end>.<format>.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else today.replace(day=1)
+            end = date.fromisoformat(options['end']) if options['end'] else today
+        except ValueError as e:
+            raise CommandError(e)
+        if start > end:
+            raise CommandError("--start is after --end")
+
+        members = batch_members(start, end, options['kinds'])
+        output = options['output'] or f"documents_{start:%Y-%m-%d}_{end:%Y-%m-%d}.{options['format']}"
+        started = time.perf_counter()
+        with open(output, 'wb') as file:
+            render_batch(file, members, options['format'], options['workers'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(members)} document(s) to {output} in {elapsed:.1f}s "
+            f"({len(members) / elapsed:,.0f} documents/s)."
+        ))
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+
+from apps.models import Product, Sale, SaleItem, User
+from apps.services.batch_documents import render_members
+from apps.services.document_cache import DocumentCache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed sales and measure receipts/s of the batch renderer with 1, 2, 4 ... processes up to the "
+        "core count, each run into an empty cache. Writes to the configured database and removes what it created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=2000)
+        parser.add_argument('--lines', type=int, default=6, help="Lines per sale.")
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        cashier = User.objects.create(username=f"bench-{tag}", role='cashier')
+        products = Product.objects.bulk_create([
+            Product(name=f"bench {tag} product {i}", barcode=f"bench-{tag}-{i}", cost_price=3, sell_price=5, stock=0)
+            for i in range(50)
+        ])
+        try:
+            self.stdout.write(f"Seeding {options['sales']} sales...")
+            sales = self.seed(cashier, products, options['sales'], options['lines'])
+            members = [('receipt', sale.pk) for sale in sales]
+
+            workers, baseline = 1, None
+            while workers <= options['max_workers']:
+                with tempfile.TemporaryDirectory() as root:
+                    cache = DocumentCache(root, 2**40)
+                    started = time.perf_counter()
+                    for _ in render_members(members, workers, cache):
+                        pass
+                    elapsed = time.perf_counter() - started
+                rate = len(members) / elapsed
+                baseline = baseline or rate
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{workers} worker(s)"))
+                self.stdout.write(f"  receipts/s {rate:,.0f}")
+                self.stdout.write(f"  speedup    {rate / baseline:.2f}x (ideal {workers}x)")
+                workers *= 2
+        finally:
+            items = connection.ops.quote_name(SaleItem._meta.db_table)
+            sales_table = connection.ops.quote_name(Sale._meta.db_table)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {items} WHERE sale_id IN (SELECT id FROM {sales_table} WHERE cashier_id = %s)",
+                    [cashier.pk],
+                )
+                cursor.execute(f"DELETE FROM {sales_table} WHERE cashier_id = %s", [cashier.pk])
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            cashier.delete()
+
+    @staticmethod
+    def seed(cashier, products, count, lines):
+        sales = [
+            Sale(
+                cashier=cashier, payment_type=Sale.PAYMENT.values[n % 3],
+                total_amount=Decimal(5 * lines), paid_amount=Decimal(5 * lines),
+            )
+            for n in range(count)
+        ]
+        items = [
+            SaleItem(
+                sale=sale, product=products[(n + i) % len(products)], quantity=1, price=5,
+                cost_price=3, line_total=5, line_cost=3,
+            )
+            for n, sale in enumerate(sales)
+            for i in range(lines)
+        ]
+        with transaction.atomic():
+            Sale.objects.bulk_create(sales)
+            SaleItem.objects.bulk_create(items, batch_size=5000)
+        return sales
@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from apps.models import Product, Sale, User
+from apps.services.checkout import checkout
+from apps.services.group_commit import GroupCommitWriter
+from apps.services.sales_summary import summary_metrics
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Submit baskets from many simulated tills at once and compare one transaction per "
+        "basket with group commit. Writes to the configured database and removes what it created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=16)
+        parser.add_argument('--baskets', type=int, default=50, help="Baskets per till.")
+        parser.add_argument('--lines', type=int, default=5, help="Lines per basket.")
+        parser.add_argument('--max-batch', type=int, default=32)
+        parser.add_argument('--max-delay', type=float, default=0.005, help="Seconds.")
+        parser.add_argument('--mode', choices=['sync', 'group', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['sync', 'group'] if options['mode'] == 'both' else [options['mode']]
+        tag = uuid.uuid4().hex[:8]
+        cashier = User.objects.create(username=f"bench-{tag}", role='cashier')
+        products = Product.objects.bulk_create([
+            Product(
+                name=f"bench product {i}",
+                barcode=f"bench-{tag}-{i}",
+                cost_price=1,
+                sell_price=1,
+                stock=Decimal('1000000'),
+            )
+            for i in range(max(options['lines'] * 4, 20))
+        ])
+        try:
+            for mode in modes:
+                writer = None
+                if mode == 'group':
+                    writer = GroupCommitWriter(max_batch=options['max_batch'], max_delay=options['max_delay'])
+                self.run(mode, writer, cashier, products, options['tills'], options['baskets'], options['lines'])
+        finally:
+            Sale.objects.filter(cashier=cashier).delete()
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            cashier.delete()
+
+    def run(self, mode, writer, cashier, products, tills, baskets, lines):
+        latencies = []
+        start_gate = threading.Barrier(tills)
+
+        def till(offset):
+            own_latencies = []
+            try:
+                start_gate.wait()
+                for n in range(baskets):
+                    cart = [
+                        {'barcode': products[(offset + n + i) % len(products)].barcode, 'qty': 1, 'price': 1}
+                        for i in range(lines)
+                    ]
+                    started = time.perf_counter()
+                    checkout(cashier, cart, Sale.PAYMENT.CASH, lines, writer=writer)
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            latencies.extend(own_latencies)
+
+        summary_metrics.reset()
+        threads = [threading.Thread(target=till, args=(i,)) for i in range(tills)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = tills * baskets
+        latencies.sort()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{mode}: {tills} tills x {baskets} baskets x {lines} lines"))
+        self.stdout.write(f"  throughput   {len(latencies) / elapsed:,.0f} baskets/s ({elapsed:.2f}s)")
+        if latencies:
+            self.stdout.write(f"  latency p50  {statistics.median(latencies) * 1000:.2f} ms")
+            self.stdout.write(f"  latency p95  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms")
+        self.stdout.write(f"  committed    {len(latencies)} of {total}")
+        summary = summary_metrics.snapshot()
+        self.stdout.write(
+            f"  summary row  {summary['lock_waits']} of {summary['updates']} increments waited "
+            f"({summary['wait_seconds'] * 1000:.0f} ms in total)"
+        )
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import openpyxl
+from apps.models import Product
+from apps.services.exports import PRODUCT_HEADER, product_rows, write_xlsx
+from django.core.management.base import BaseCommand
+
+
+class RSSSampler:
+    """Peak resident set size of this process while the block runs, sampled every ``interval`` seconds."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def current():
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def legacy_export(file, products):
+    """The in-memory workbook ExportProductsExcelView built before streaming."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(PRODUCT_HEADER)
+    for p in products:
+        ws.append([p.name, p.barcode or "-", float(p.cost_price), float(p.sell_price), p.stock])
+    wb.save(file)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed products and measure rows/s and peak RSS of the streaming product export at growing sizes, "
+        "then of the old in-memory workbook. Writes to the configured database and removes what it created. "
+        "Reads RSS from /proc, so Linux only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--skip-legacy', action='store_true')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rows = options['rows']
+        self.stdout.write(f"Seeding {rows} products...")
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"bench {tag} {i:07d}", barcode=f"bench-{tag}-{i}",
+                    cost_price=i % 500 + 1, sell_price=i % 500 + 2, stock=i % 90,
+                )
+                for i in range(rows)
+            ),
+            batch_size=5000,
+        )
+        seeded = Product.objects.filter(barcode__startswith=f"bench-{tag}-").order_by('name')
+        try:
+            # the peak RSS only grows, so the streaming runs go first, smallest first
+            for size in sorted({max(rows // 10, 1), max(rows // 2, 1), rows}):
+                self.measure(f"streaming {size}", size, lambda file: write_xlsx(
+                    file, "Products", PRODUCT_HEADER, product_rows(seeded[:size])
+                ))
+            if not options['skip_legacy']:
+                self.measure(f"in-memory {rows}", rows, lambda file: legacy_export(file, seeded.all()))
+        finally:
+            seeded.delete()
+
+    def measure(self, name, size, export):
+        with tempfile.TemporaryFile() as file, RSSSampler() as rss:
+            started = time.perf_counter()
+            export(file)
+            elapsed = time.perf_counter() - started
+            file_size = file.tell()
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f"  rows/s    {size / elapsed:,.0f}")
+        self.stdout.write(f"  RSS       +{(rss.peak - rss.start) / 2**20:.1f} MiB (peak {rss.peak / 2**20:.0f} MiB)")
+        self.stdout.write(f"  file      {file_size / 2**20:.1f} MiB")
@@ -0,0 +1,121 @@
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.models import Product, Purchase, Sale, SaleItem, User
+from apps.services.report_engine import build_report
+from apps.services.sales_summary import rebuild_summaries
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+def legacy_report(start, end, today):
+    """The aggregates ReportsView.get ran before the report engine."""
+    sales_range = Sale.objects.filter(created_at__date__range=[start, end])
+    purchases_range = Purchase.objects.filter(purchased_at__date__range=[start, end])
+    sales_today = Sale.objects.filter(created_at__date=today)
+    purchases_today = Purchase.objects.filter(purchased_at__date=today)
+    cost = Sum(F("quantity") * F("product__cost_price"), output_field=DecimalField())
+
+    for sales, purchases in [(sales_range, purchases_range), (sales_today, purchases_today)]:
+        sales.aggregate(total=Sum("total_amount"))
+        SaleItem.objects.filter(sale__in=sales).aggregate(cost=cost)
+        purchases.aggregate(exp=Sum("total_price"))
+    list(SaleItem.objects.filter(sale__in=sales_range).values("product__name")
+         .annotate(qty=Sum("quantity")).order_by("-qty")[:5])
+    list(sales_range.values("payment_type").annotate(total=Sum("total_amount")))
+    list(sales_range.values("cashier__username").annotate(total=Sum("total_amount")))
+    list(sales_range.annotate(day=TruncDate("created_at")).values("day").annotate(
+        revenue=Sum("total_amount"),
+        cost=Sum(F("items__quantity") * F("items__product__cost_price"), output_field=DecimalField()),
+    ).order_by("day"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a sales history and compare query count and wall time of the old report "
+        "aggregates with the report engine. Writes to the configured database and removes what it created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help="Days of history to seed.")
+        parser.add_argument('--sales-per-day', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=4, help="Lines per sale.")
+        parser.add_argument('--range-days', type=int, default=7, help="Days covered by the report.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        cashier = User.objects.create(username=f"bench-{tag}", role='cashier')
+        products = Product.objects.bulk_create([
+            Product(name=f"bench {tag} {i}", barcode=f"bench-{tag}-{i}", cost_price=3, sell_price=5, stock=0)
+            for i in range(50)
+        ])
+        today = timezone.localdate()
+        first_day = today - timedelta(days=options['days'] - 1)
+        try:
+            self.stdout.write("Seeding...")
+            self.seed(cashier, products, first_day, options['days'], options['sales_per_day'], options['lines'])
+            rebuild_summaries(first_day, today)
+
+            start = today - timedelta(days=options['range_days'] - 1)
+            for name, report in [('legacy', legacy_report), ('engine', build_report)]:
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        report(start, today, today)
+                        timings.append(time.perf_counter() - started)
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(f"  queries   {len(queries)}")
+                self.stdout.write(f"  best      {min(timings) * 1000:.1f} ms")
+        finally:
+            self.cleanup(cashier)
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+            cashier.delete()
+            rebuild_summaries(first_day, today)
+
+    @staticmethod
+    def cleanup(cashier):
+        # Plain DELETEs: going through the ORM would fire the per-line delete
+        # signals, which put every seeded line back into stock one by one.
+        items = connection.ops.quote_name(SaleItem._meta.db_table)
+        sales = connection.ops.quote_name(Sale._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {items} WHERE sale_id IN (SELECT id FROM {sales} WHERE cashier_id = %s)", [cashier.pk]
+            )
+            cursor.execute(f"DELETE FROM {sales} WHERE cashier_id = %s", [cashier.pk])
+
+    def seed(self, cashier, products, first_day, days, per_day, lines):
+        for offset in range(days):
+            day_start = timezone.make_aware(
+                timezone.datetime.combine(first_day + timedelta(days=offset), timezone.datetime.min.time())
+            )
+            sales, items = [], []
+            for n in range(per_day):
+                sale = Sale(
+                    cashier=cashier,
+                    payment_type=Sale.PAYMENT.values[n % 3],
+                    total_amount=Decimal(5 * lines),
+                )
+                sales.append(sale)
+                items.extend(
+                    SaleItem(
+                        sale=sale, product=products[(n + i) % len(products)], quantity=1, price=5,
+                        cost_price=3, line_total=5, line_cost=3,
+                    )
+                    for i in range(lines)
+                )
+            with transaction.atomic():
+                Sale.objects.bulk_create(sales)
+                SaleItem.objects.bulk_create(items)
+                Sale.objects.filter(pk__in=[s.pk for s in sales]).update(
+                    created_at=day_start + timedelta(hours=10)
+                )
+                SaleItem.objects.filter(sale__in=sales).update(created_at=day_start + timedelta(hours=10))
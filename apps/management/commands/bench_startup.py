@@ -0,0 +1,89 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: what a gunicorn worker does before its first
+# request. Prints one JSON line.
+PROBE = """
+import json, resource, sys, time
+
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - started
+
+from django.urls import get_resolver
+started = time.perf_counter()
+# the first resolve imports the URLconf and with it every view module
+get_resolver().resolve('/sales/create/')
+urls = time.perf_counter() - started
+
+from apps.services.document_backends import loaded_backends, preload
+backends = loaded_backends()
+modules = len(sys.modules)
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+started = time.perf_counter()
+# e.g. WeasyPrint without Pango; start-up itself does not need it
+error = "; ".join(f"{name}: {failure}" for name, failure in preload().items()) or None
+preload_time = time.perf_counter() - started
+
+print(json.dumps({
+    'setup': setup, 'urls': urls, 'rss': rss, 'modules': modules, 'backends': backends,
+    'preload': preload_time, 'preload_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    'preload_error': error,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure import time and peak RSS of django.setup() plus the first URL resolution in fresh "
+        "interpreters, then what loading the document backends (WeasyPrint, reportlab, openpyxl) adds. "
+        "Fails when a backend is imported at start-up, or past --max-ms / --max-rss."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--max-ms', type=float, help="Fail if start-up takes longer (median).")
+        parser.add_argument('--max-rss', type=float, help="Fail if start-up peak RSS is larger (MiB, median).")
+
+    def handle(self, *args, **options):
+        runs = [self.probe() for _ in range(options['repeat'])]
+
+        def median(key):
+            return statistics.median(run[key] for run in runs)
+
+        startup_ms = (median('setup') + median('urls')) * 1000
+        rss = median('rss') / 2**20
+        self.stdout.write(self.style.MIGRATE_HEADING(f"start-up (median of {len(runs)})"))
+        self.stdout.write(f"  django.setup()   {median('setup') * 1000:.0f} ms")
+        self.stdout.write(f"  URL resolution   {median('urls') * 1000:.0f} ms")
+        self.stdout.write(f"  peak RSS         {rss:.1f} MiB")
+        self.stdout.write(f"  modules          {median('modules'):.0f}")
+        self.stdout.write(self.style.MIGRATE_HEADING("document backends loaded afterwards"))
+        if runs[0]['preload_error']:
+            self.stdout.write(self.style.WARNING(f"  not all could be loaded: {runs[0]['preload_error']}"))
+        self.stdout.write(f"  import           {median('preload') * 1000:.0f} ms")
+        self.stdout.write(f"  peak RSS         +{(median('preload_rss') - median('rss')) / 2**20:.1f} MiB")
+
+        backends = sorted({name for run in runs for name in run['backends']})
+        if backends and not getattr(settings, 'PRELOAD_DOCUMENT_BACKENDS', False):
+            raise CommandError(f"Imported at start-up: {', '.join(backends)}")
+        if options['max_ms'] is not None and startup_ms > options['max_ms']:
+            raise CommandError(f"Start-up took {startup_ms:.0f} ms, over {options['max_ms']:g} ms")
+        if options['max_rss'] is not None and rss > options['max_rss']:
+            raise CommandError(f"Start-up peak RSS is {rss:.1f} MiB, over {options['max_rss']:g} MiB")
+
+    @staticmethod
+    def probe():
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,91 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from apps.models import Product
+from apps.services.stock import decrease_stock, stock_metrics
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+def legacy_decrease(product_id, quantity):
+    """The SELECT ... FOR UPDATE / save() flow Product.decrease_stock used before."""
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        if product.stock < quantity:
+            raise ValueError(f"Insufficient stock: {product.stock}")
+        product.stock -= quantity
+        product.save(update_fields=['stock', 'updated_at'])
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one hot product from many simulated tills and compare the guarded UPDATE "
+        "with the old row-locking decrement. Writes to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=16)
+        parser.add_argument('--iterations', type=int, default=200, help="Decrements per till.")
+        parser.add_argument('--mode', choices=['guarded', 'locking', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['locking', 'guarded'] if options['mode'] == 'both' else [options['mode']]
+        for mode in modes:
+            self.run(mode, options['tills'], options['iterations'])
+
+    def run(self, mode, tills, iterations):
+        decrease = legacy_decrease if mode == 'locking' else decrease_stock
+        total = tills * iterations
+        product = Product.objects.create(
+            name="bench hot product",
+            barcode=f"bench-{uuid.uuid4().hex[:12]}",
+            cost_price=1,
+            sell_price=1,
+            # a tenth short, so the last decrements exercise the failure path
+            stock=Decimal(total - total // 10),
+        )
+        stock_metrics.reset()
+        latencies, failures = [], []
+        start_gate = threading.Barrier(tills)
+
+        def till():
+            own_latencies, own_failures = [], 0
+            try:
+                start_gate.wait()
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    try:
+                        decrease(product.pk, Decimal('1'))
+                    except ValueError:
+                        own_failures += 1
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            latencies.extend(own_latencies)
+            failures.append(own_failures)
+
+        threads = [threading.Thread(target=till) for _ in range(tills)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        latencies.sort()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{mode}: {tills} tills x {iterations} decrements"))
+        self.stdout.write(f"  throughput   {total / elapsed:,.0f} decrements/s ({elapsed:.2f}s)")
+        self.stdout.write(f"  latency p50  {statistics.median(latencies) * 1000:.2f} ms")
+        self.stdout.write(f"  latency p95  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms")
+        self.stdout.write(f"  failed       {sum(failures)} (expected {total // 10}), final stock {product.stock}")
+        if mode == 'guarded':
+            counters = stock_metrics.snapshot().get(product.pk, {})
+            self.stdout.write(
+                f"  metrics      attempts={counters.get('attempts', 0)} failed={counters.get('failed', 0)} "
+                f"lock_waits={counters.get('lock_waits', 0)} wait={counters.get('wait_seconds', 0):.2f}s"
+            )
+        product.delete()
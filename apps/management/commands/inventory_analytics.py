@@ -0,0 +1,30 @@
+import time
+
+from apps.services.inventory_analytics import compute_inventory_analytics, store_reorder_points
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Compute ABC classes, velocity and reorder points from sales history and store the reorder points."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, help="Days of history (default INVENTORY_WINDOW_DAYS).")
+        parser.add_argument(
+            '--lead-time', type=int, help="Supplier lead time in days (default INVENTORY_LEAD_TIME_DAYS).",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Report only, do not update products.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        analytics = compute_inventory_analytics(window_days=options['window'], lead_time_days=options['lead_time'])
+        elapsed = time.perf_counter() - started
+
+        counts = analytics.class_counts()
+        below = int((analytics.stock <= analytics.reorder_point).sum())
+        self.stdout.write(
+            f"{len(analytics)} product(s) in {elapsed * 1000:.0f} ms: "
+            f"A={counts['A']} B={counts['B']} C={counts['C']}, {below} at or below reorder point."
+        )
+        if not options['dry_run']:
+            stored = store_reorder_points(analytics)
+            self.stdout.write(self.style.SUCCESS(f"Stored reorder points of {stored} product(s)."))
@@ -0,0 +1,56 @@
+from datetime import date
+
+from apps.models import Sale
+from apps.services.partitions import (
+    convert_to_partitioned,
+    detach_partitions,
+    ensure_future_partitions,
+    is_partitioned,
+    month_start,
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the monthly partitions of Sale and SaleItem on PostgreSQL: convert the tables once, "
+        "create partitions ahead of time (run daily) or detach old months for archiving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', choices=['create', 'convert', 'detach'], default='create')
+        parser.add_argument('--ahead', type=int, help="Months to create after the current one.")
+        parser.add_argument('--before', help="detach: first month to keep (YYYY-MM).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning needs PostgreSQL.")
+
+        if options['action'] == 'convert':
+            months = convert_to_partitioned(months_ahead=options['ahead'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Sales tables partitioned: {len(months)} month(s) from {months[0]:%Y-%m} to {months[-1]:%Y-%m}. "
+                f"Set SALES_PARTITIONED = True."
+            ))
+            return
+
+        if not is_partitioned(Sale):
+            raise CommandError("The sales tables are not partitioned yet; run `partition_sales convert` first.")
+
+        if options['action'] == 'create':
+            created = ensure_future_partitions(months_ahead=options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partition(s)."))
+            return
+
+        if not options['before']:
+            raise CommandError("detach needs --before YYYY-MM")
+        try:
+            before = date.fromisoformat(f"{options['before']}-01")
+        except ValueError as e:
+            raise CommandError(e)
+        if before > month_start(timezone.localdate()):
+            raise CommandError("--before cannot be after the current month")
+        for name in detach_partitions(before):
+            self.stdout.write(f"Detached {name}.")
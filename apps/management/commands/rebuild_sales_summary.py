@@ -0,0 +1,40 @@
+from datetime import date
+
+from apps.models import Purchase, Sale
+from apps.services.sales_summary import rebuild_summaries
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales summary from raw sales and purchases for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day (YYYY-MM-DD); defaults to the first sale or purchase.")
+        parser.add_argument('--end', help="Last day (YYYY-MM-DD); defaults to today.")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else self._first_day()
+            end = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(e)
+
+        if start is None:
+            self.stdout.write("No sales or purchases yet.")
+            return
+        if start > end:
+            raise CommandError("--start is after --end")
+
+        days = rebuild_summaries(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} day(s) from {start} to {end}."))
+
+    @staticmethod
+    def _first_day():
+        firsts = [
+            Sale.objects.aggregate(first=Min('created_at'))['first'],
+            Purchase.objects.aggregate(first=Min('purchased_at'))['first'],
+        ]
+        firsts = [timezone.localdate(first) for first in firsts if first is not None]
+        return min(firsts, default=None)
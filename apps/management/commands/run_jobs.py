@@ -0,0 +1,63 @@
+import signal
+import time
+
+from apps.services.document_backends import preload
+from apps.services.jobs import claim_job, purge_finished, requeue_stale, run_job
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Work through queued document jobs (BACKGROUND_JOBS). Runs until stopped with SIGTERM or Ctrl+C, "
+        "finishing the current job first; start several to render in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument(
+            '--poll', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 1),
+            help="Seconds to wait before looking at an empty queue again.",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # every job renders a document; load the libraries before the first one
+        preload()
+
+        # reclaim jobs of dead workers now and then, not only at start-up
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
+        next_maintenance = 0
+        done = 0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() >= next_maintenance:
+                self.maintain()
+                next_maintenance = time.monotonic() + interval
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+
+            started = time.perf_counter()
+            run_job(job)
+            done += 1
+            self.stdout.write(
+                f"{job.pk} {job.kind}: {job.get_status_display()} in {time.perf_counter() - started:.2f}s "
+                f"(attempt {job.attempts})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} job(s)."))
+
+    def maintain(self):
+        requeued, failed = requeue_stale()
+        purged = purge_finished()
+        if requeued or failed or purged:
+            self.stdout.write(f"Requeued {requeued}, failed {failed} stale job(s); purged {purged} old job(s).")
+
+    def stop(self, signum, frame):
+        self.stopping = True
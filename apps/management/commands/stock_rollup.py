@@ -0,0 +1,34 @@
+from apps.services.stock import reconcile, rollup_balances, take_snapshot
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Roll stock movements up into per-product balances and optionally take a snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', action='store_true', help="Store a stock snapshot after the rollup.")
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help=(
+                "Repair and report balances that drifted from the ledger, then record adjustments where "
+                "the ledger differs from Product.stock (run once to open the ledger)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            adjusted, drift = reconcile()
+            if drift:
+                self.stdout.write(self.style.WARNING(
+                    f"Rolled-up balances of {len(drift)} product(s) had drifted from the ledger "
+                    f"by {sum(drift.values())} in total; corrected."
+                ))
+            self.stdout.write(f"Adjusted {adjusted} product(s).")
+
+        if options['snapshot']:
+            taken = take_snapshot()
+            self.stdout.write(self.style.SUCCESS(f"Snapshot of {taken} product(s) stored."))
+        else:
+            rolled = rollup_balances()
+            self.stdout.write(self.style.SUCCESS(f"Rolled up {rolled} product(s)."))
@@ -0,0 +1,27 @@
+import numpy as np
+from apps.services.forecasting import METHODS, create_suggested_purchase, forecast_purchases
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Forecast demand from sales history and create a PENDING purchase with the suggested quantities."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=METHODS, help="Default PURCHASE_FORECAST_METHOD.")
+        parser.add_argument('--history', type=int, help="Days of history (default PURCHASE_FORECAST_HISTORY_DAYS).")
+        parser.add_argument('--dry-run', action='store_true', help="Only print how much would be ordered.")
+
+    def handle(self, *args, **options):
+        forecast = forecast_purchases(history_days=options['history'], method=options['method'])
+        lines = int(np.count_nonzero(forecast.suggested))
+        self.stdout.write(
+            f"{lines} of {len(forecast)} product(s) need ordering for the next {forecast.horizon_days} days."
+        )
+
+        if options['dry_run']:
+            return
+        purchase = create_suggested_purchase(forecast)
+        if purchase is None:
+            self.stdout.write("Nothing to order.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Created {purchase} for {purchase.total_price}."))
@@ -1,6 +1,9 @@
 from apps.models.customers import Customer
 from apps.models.debts import Debt
+from apps.models.jobs import Job
 from apps.models.products import Product
 from apps.models.purchases import Purchase, PurchaseItem
-from apps.models.sales import Sale, SaleItem
+from apps.models.reports import DailySalesSummary
+from apps.models.sales import CheckoutRequest, Sale, SaleItem
+from apps.models.stock import StockBalance, StockMovement, StockRollupGap, StockSnapshot
 from apps.models.users import User
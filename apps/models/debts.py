@@ -2,7 +2,7 @@ from decimal import Decimal
 
 from apps.models.base import CreatedBaseModel, UUIDBaseModel
 from apps.models.customers import Customer
-from django.db.models import CASCADE, CharField, DecimalField, ForeignKey, TextChoices
+from django.db.models import CASCADE, CharField, DecimalField, ForeignKey, Index, TextChoices
 
 from apps.utils import to_decimal
 
@@ -21,6 +21,11 @@ class Debt(CreatedBaseModel, UUIDBaseModel):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            Index(fields=['created_at']),
+            # covers the aging report scan; ``include`` is ignored off Postgres
+            Index(fields=['customer', 'created_at'], include=['amount', 'paid_amount'], name='debt_aging_idx'),
+        ]
         verbose_name = 'Debt'
         verbose_name_plural = 'Debts'
 
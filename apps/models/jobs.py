@@ -0,0 +1,55 @@
+from apps.models.base import CreatedBaseModel, UUIDBaseModel
+from django.db.models import (
+    SET_NULL,
+    CharField,
+    DateTimeField,
+    ForeignKey,
+    Index,
+    JSONField,
+    PositiveSmallIntegerField,
+    Q,
+    TextChoices,
+    TextField,
+    UniqueConstraint,
+)
+
+
+class Job(CreatedBaseModel, UUIDBaseModel):
+    """A render or export queued for ``manage.py run_jobs``; ``result`` is relative to MEDIA_ROOT."""
+
+    class StatusChoices(TextChoices):
+        QUEUED = 'queued', 'Navbatda'
+        RUNNING = 'running', 'Bajarilmoqda'
+        DONE = 'done', 'Tayyor'
+        FAILED = 'failed', 'Xato'
+
+    kind = CharField(max_length=50)
+    params = JSONField(default=dict, blank=True)
+    status = CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.QUEUED)
+    attempts = PositiveSmallIntegerField(default=0)
+    result = CharField(max_length=255, blank=True)
+    filename = CharField(max_length=255, blank=True)
+    content_type = CharField(max_length=100, blank=True)
+    error = TextField(blank=True)
+    created_by = ForeignKey('apps.User', on_delete=SET_NULL, null=True, blank=True, related_name='jobs')
+    started_at = DateTimeField(null=True, blank=True)
+    finished_at = DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [Index(fields=['status', 'created_at'])]
+        constraints = [
+            # one pending job per request, so concurrent submissions of the same export share it
+            UniqueConstraint(
+                fields=['kind', 'params'],
+                condition=Q(status__in=['queued', 'running']),
+                name='job_pending_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.StatusChoices.DONE, self.StatusChoices.FAILED)
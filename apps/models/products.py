@@ -1,11 +1,9 @@
 from decimal import Decimal
 
-from django.db import transaction
-
 from apps.models.base import CreatedBaseModel, UUIDBaseModel
-from django.db.models import CharField, DecimalField, TextChoices
-
-from apps.utils import to_decimal, CENTS
+from apps.models.stock import StockMovement
+from django.db.models import Case, CharField, DecimalField, Index, Q, TextChoices, Value, When
+from django.db.models.functions import Coalesce
 
 
 class Product(CreatedBaseModel, UUIDBaseModel):
@@ -19,6 +17,13 @@ class Product(CreatedBaseModel, UUIDBaseModel):
     sell_price = DecimalField(max_digits=12, decimal_places=2)
     unit = CharField(max_length=10, choices=UnitChoices.choices, default=UnitChoices.kg)
     stock = DecimalField(max_digits=12, decimal_places=1, default=0)
+    # set from sales history by ``manage.py inventory_analytics``; until then
+    # the fixed LOW_STOCK_THRESHOLDS apply
+    reorder_point = DecimalField(max_digits=12, decimal_places=1, null=True, blank=True)
+
+    class Meta:
+        # the catalog version and its deltas read the newest updated_at
+        indexes = [Index(fields=['updated_at'])]
 
     def __str__(self):
         return f"{self.name} ({self.barcode})"
@@ -29,32 +34,32 @@ class Product(CreatedBaseModel, UUIDBaseModel):
     }
 
     def get_low_stock_threshold(self):
+        if self.reorder_point is not None:
+            return self.reorder_point
         return self.LOW_STOCK_THRESHOLDS.get(self.unit, Decimal('1.00'))
 
     @property
     def is_low_stock(self):
         return self.stock <= self.get_low_stock_threshold()
 
-    def decrease_stock(self, quantity):
-        q = to_decimal(quantity)
-        if q <= 0:
-            raise ValueError("Quantity must be positive")
-        with transaction.atomic():
-            # reload to avoid race condition
-            prod = Product.objects.select_for_update().get(pk=self.pk)
-            if prod.stock < q:
-                raise ValueError(f"Insufficient stock: {prod.stock}")
-            prod.stock = (prod.stock - q).quantize(CENTS)
-            prod.save(update_fields=['stock'])
-            return prod.stock
-
-    def increase_stock(self, quantity):
-        q = to_decimal(quantity)
-        if q <= 0:
-            raise ValueError("Quantity must be positive")
-        with transaction.atomic():
-            prod = Product.objects.select_for_update().get(pk=self.pk)
-            prod.stock = (prod.stock + q).quantize(CENTS)
-            prod.save(update_fields=['stock'])
-            return prod.stock
+    @classmethod
+    def low_stock_filter(cls):
+        """``is_low_stock`` as a filter, for counting in the database."""
+        threshold = Coalesce(
+            'reorder_point',
+            Case(
+                *[When(unit=unit, then=Value(value)) for unit, value in cls.LOW_STOCK_THRESHOLDS.items()],
+                default=Value(Decimal('1.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        return Q(stock__lte=threshold)
+
+    # apps.services.stock imports this module, hence the imports inside the methods
+    def decrease_stock(self, quantity, kind=StockMovement.KindChoices.SALE, sale=None):
+        from apps.services.stock import decrease_stock
+        return decrease_stock(self.pk, quantity, kind=kind, sale=sale)
 
+    def increase_stock(self, quantity, kind=StockMovement.KindChoices.PURCHASE, purchase=None):
+        from apps.services.stock import increase_stock
+        return increase_stock(self.pk, quantity, kind=kind, purchase=purchase)
@@ -4,15 +4,24 @@ from django.db import transaction
 
 from apps.models import Product
 from apps.models.base import UUIDBaseModel
+from apps.models.reports import DailySalesSummary
+from apps.services.totals import mark_dirty
 from django.db.models import (
     CASCADE,
     CharField,
     DateTimeField,
     DecimalField,
+    F,
     ForeignKey,
+    Index,
     Model,
+    OuterRef,
+    Subquery,
+    Sum,
     TextChoices,
 )
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from apps.utils import to_decimal
 
@@ -27,18 +36,33 @@ class Purchase(UUIDBaseModel):
     total_price = DecimalField(max_digits=12, decimal_places=2)
     purchased_at = DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [Index(fields=['purchased_at'])]
+
     def __str__(self):
         return f"Purchase #{self.id}"
 
     def recalc_total(self):
-        total = sum((item.total_price for item in self.items.all()), Decimal('0.00'))
+        total = self.items.aggregate(total=Sum(F('quantity') * F('cost_price')))['total']
         self.total_price = to_decimal(total)
         return self.total_price
 
+    @classmethod
+    def refresh_totals(cls, pks, using=None):
+        items = (
+            PurchaseItem.objects.filter(purchase=OuterRef('pk'))
+            .values('purchase')
+            .annotate(total=Sum(F('quantity') * F('cost_price')))
+            .values('total')
+        )
+        cls.objects.using(using).filter(pk__in=pks).update(
+            total_price=Coalesce(Subquery(items), Decimal('0.00'), output_field=DecimalField())
+        )
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        self.recalc_total()
-        super().save(update_fields=['total_price'])
+        mark_dirty(Purchase, self.pk, using=self._state.db)
+        mark_dirty(DailySalesSummary, timezone.localdate(self.purchased_at), using=self._state.db)
 
 
 class PurchaseItem(Model):
@@ -56,10 +80,10 @@ class PurchaseItem(Model):
         is_new = self.pk is None
         with transaction.atomic():
             super().save(*args, **kwargs)
-            self.purchase.recalc_total()
-            self.purchase.save(update_fields=['total_price'])
+            mark_dirty(Purchase, self.purchase_id, using=self._state.db)
+            mark_dirty(DailySalesSummary, timezone.localdate(self.purchase.purchased_at), using=self._state.db)
             if is_new:
-                self.product.increase_stock(self.quantity)
+                self.product.increase_stock(self.quantity, purchase=self.purchase)
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity} {self.product.unit}"
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.db.models import DateField, DateTimeField, DecimalField, Model, PositiveIntegerField
+
+
+class DailySalesSummary(Model):
+    """Sales and purchase totals of one local calendar day.
+
+    Checkouts add their sales to the row as they commit; any other write of
+    a sale or purchase marks the day dirty (see ``refresh_totals``), and
+    ``manage.py rebuild_sales_summary`` recomputes any range from the raw rows.
+    """
+
+    day = DateField(unique=True)
+    revenue = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    cogs = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    expenses = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    sale_count = PositiveIntegerField(default=0)
+    cash_revenue = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    card_revenue = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    credit_revenue = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    updated_at = DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.day}: {self.revenue}"
+
+    @property
+    def profit(self):
+        return self.revenue - self.cogs
+
+    @property
+    def net(self):
+        return self.profit - self.expenses
+
+    @classmethod
+    def refresh_totals(cls, days, using=None):
+        """Recompute the given days; the ``mark_dirty`` hook, keyed by day instead of pk."""
+        # imported here: the service imports the models package
+        from apps.services.sales_summary import summarize_days
+
+        summarize_days(days, using=using)
@@ -1,8 +1,12 @@
+from collections import defaultdict
 from decimal import Decimal
 
 from django.db import transaction
 
 from apps.models.base import UUIDBaseModel
+from apps.models.customers import Customer
+from apps.models.reports import DailySalesSummary
+from apps.services.totals import mark_dirty
 from django.conf import settings
 from django.db.models import (
     CASCADE,
@@ -10,10 +14,17 @@ from django.db.models import (
     CharField,
     DateTimeField,
     DecimalField,
+    F,
     ForeignKey,
+    Index,
     Model,
+    OuterRef,
+    Subquery,
+    Sum,
 )
 from django.db.models.enums import TextChoices
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from apps.utils import to_decimal
 
@@ -33,20 +44,46 @@ class Sale(UUIDBaseModel):
     paid_amount = DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [Index(fields=['created_at'])]
+
     def recalc_total(self):
-        total = sum((item.subtotal for item in self.items.all()), Decimal('0.00'))
+        total = self.items.aggregate(total=Sum('line_total'))['total']
         self.total_amount = to_decimal(total)
         return self.total_amount
 
+    @classmethod
+    def refresh_totals(cls, pks, using=None):
+        items = (
+            SaleItem.objects.filter(sale=OuterRef('pk'))
+            .values('sale')
+            .annotate(total=Sum('line_total'))
+            .values('total')
+        )
+        sales = cls.objects.using(using).filter(pk__in=pks)
+        credit = sales.filter(payment_type=cls.PAYMENT.CREDIT, customer__isnull=False)
+        before = dict(credit.values_list('pk', 'total_amount'))
+        sales.update(total_amount=Coalesce(Subquery(items), Decimal('0.00'), output_field=DecimalField()))
+
+        # a credit sale's customer owes whatever its total moved by
+        changes = defaultdict(Decimal)
+        for pk, customer_id, total in credit.values_list('pk', 'customer', 'total_amount'):
+            changes[customer_id] += total - before[pk]
+        for customer_id, change in changes.items():
+            if change:
+                Customer.objects.using(using).filter(pk=customer_id).update(total_debt=F('total_debt') + change)
+
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
         super().save(*args, **kwargs)
-        self.recalc_total()
-        super().save(update_fields=['total_amount'])
-        # update customer debt only for credit sales
-        if self.payment_type == Sale.PAYMENT.CREDIT and self.customer:
-            self.customer.total_debt = to_decimal(self.customer.total_debt) + (self.total_amount - to_decimal(self.paid_amount))
-            self.customer.save(update_fields=['total_debt'])
-
+        mark_dirty(Sale, self.pk, using=self._state.db)
+        mark_dirty(DailySalesSummary, timezone.localdate(self.created_at), using=self._state.db)
+        # A new credit sale opens its customer's debt at what the row was saved
+        # with; refresh_totals adds any change of the total once it is recomputed.
+        if is_new and self.payment_type == Sale.PAYMENT.CREDIT and self.customer_id:
+            Customer.objects.using(self._state.db).filter(pk=self.customer_id).update(
+                total_debt=F('total_debt') + (to_decimal(self.total_amount) - to_decimal(self.paid_amount))
+            )
 
     def __str__(self):
             return f"Sale #{self.id} - Total: {self.total_amount}, Remaining: {self.total_amount - self.paid_amount}"
@@ -57,17 +94,55 @@ class SaleItem(Model):
     product = ForeignKey('apps.Product', on_delete=SET_NULL, null=True)
     quantity = DecimalField(max_digits=10, decimal_places=2)
     price = DecimalField(max_digits=12, decimal_places=2)
+    # Unit cost at the time of sale, so profit does not move when a cost
+    # price is edited later; null only on rows older than the snapshot.
+    cost_price = DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    # quantity * price and quantity * cost_price, stored so revenue and COGS
+    # are plain sums over this table
+    line_total = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    line_cost = DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # copy of sale.created_at: the partition key when the sales tables are
+    # partitioned by month; null only on rows older than the copy
+    created_at = DateTimeField(null=True, blank=True, editable=False)
 
     @property
     def subtotal(self):
         return to_decimal(self.quantity) * to_decimal(self.price)
 
+    def fill_line_totals(self):
+        if self.cost_price is None and self.product is not None:
+            self.cost_price = self.product.cost_price
+        self.line_total = self.subtotal
+        self.line_cost = to_decimal(to_decimal(self.quantity) * to_decimal(self.cost_price))
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        self.fill_line_totals()
+        if self.created_at is None:
+            self.created_at = self.sale.created_at
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'cost_price', 'line_total', 'line_cost', 'created_at'}
 
         with transaction.atomic():
             if is_new:
-                self.product.decrease_stock(self.quantity)
+                self.product.decrease_stock(self.quantity, sale=self.sale)
             super().save(*args, **kwargs)
-            self.sale.recalc_total()
-            self.sale.save(update_fields=['total_amount'])
\ No newline at end of file
+            mark_dirty(Sale, self.sale_id, using=self._state.db)
+            mark_dirty(DailySalesSummary, timezone.localdate(self.sale.created_at), using=self._state.db)
+
+
+class CheckoutRequest(Model):
+    """Idempotency key of a till checkout, who sent it and the sale it produced.
+
+    ``basket_hash`` is the digest of the submitted basket; a retry must match
+    it and the cashier to be replayed.
+    """
+
+    key = CharField(max_length=64, unique=True)
+    sale = ForeignKey('apps.Sale', on_delete=CASCADE, related_name='checkout_requests')
+    cashier = ForeignKey('apps.User', on_delete=SET_NULL, null=True, blank=True, related_name='checkout_requests')
+    basket_hash = CharField(max_length=64, blank=True)
+    created_at = DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} -> {self.sale_id}"
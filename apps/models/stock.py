@@ -0,0 +1,82 @@
+from django.db.models import (
+    CASCADE,
+    SET_NULL,
+    BigIntegerField,
+    CharField,
+    DateTimeField,
+    DecimalField,
+    ForeignKey,
+    Index,
+    Model,
+    OneToOneField,
+    TextChoices,
+)
+
+
+class StockMovement(Model):
+    """Append-only record of a single stock change; ``quantity`` is signed.
+
+    The ledger is history kept next to ``Product.stock``, not a replacement
+    for it: every change still goes through the guarded UPDATE of the
+    product row, which checkout validates against, so tills selling the same
+    product still wait on that row's lock. Movements are written in the same
+    transaction and back ``stock_as_of`` and the balances.
+    """
+
+    class KindChoices(TextChoices):
+        SALE = 'sale', 'Sotuv'
+        PURCHASE = 'purchase', 'Xarid'
+        RETURN = 'return', 'Qaytarish'
+        ADJUSTMENT = 'adjustment', 'Tuzatish'
+
+    product = ForeignKey('apps.Product', on_delete=CASCADE, related_name='movements')
+    kind = CharField(max_length=20, choices=KindChoices.choices)
+    quantity = DecimalField(max_digits=12, decimal_places=2)
+    sale = ForeignKey('apps.Sale', on_delete=SET_NULL, null=True, blank=True, related_name='stock_movements')
+    purchase = ForeignKey('apps.Purchase', on_delete=SET_NULL, null=True, blank=True, related_name='stock_movements')
+    created_at = DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            Index(fields=['product', 'created_at']),
+            Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.product_id} {self.quantity:+}"
+
+
+class StockBalance(Model):
+    """Ledger total per product, rolled up to ``last_movement_id``."""
+
+    product = OneToOneField('apps.Product', on_delete=CASCADE, primary_key=True, related_name='balance')
+    quantity = DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_movement_id = BigIntegerField(default=0)
+    updated_at = DateTimeField(auto_now=True)
+
+
+class StockRollupGap(Model):
+    """A movement id a rollup passed over without seeing a row.
+
+    The insert either rolled back or belongs to a transaction that had not
+    committed yet; rollups and readers keep looking for the movement until
+    it shows up (``filled_at``) or the gap expires.
+    """
+
+    movement_id = BigIntegerField(primary_key=True)
+    noted_at = DateTimeField()
+    filled_at = DateTimeField(null=True, blank=True)
+
+
+class StockSnapshot(Model):
+    """Balance of a product at ``taken_at``, covering movements up to ``last_movement_id``."""
+
+    product = ForeignKey('apps.Product', on_delete=CASCADE, related_name='snapshots')
+    taken_at = DateTimeField()
+    quantity = DecimalField(max_digits=12, decimal_places=2)
+    last_movement_id = BigIntegerField()
+
+    class Meta:
+        ordering = ['-taken_at']
+        indexes = [Index(fields=['taken_at', 'product'])]
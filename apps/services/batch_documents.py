@@ -0,0 +1,195 @@
+import io
+import multiprocessing
+import os
+import shutil
+import signal
+import zipfile
+
+import django
+from apps.models import DailySalesSummary, Purchase, PurchaseItem, Sale
+from apps.services.dates import between_days
+from apps.services.document_backends import canvas, pagesizes, weasyprint
+from apps.services.document_cache import DocumentCache, document_cache
+from apps.services.documents import (
+    PDF_CONTENT_TYPE,
+    ZIP_CONTENT_TYPE,
+    Document,
+    purchase_document,
+    receipt_document,
+    sale_names,
+)
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+
+BATCH_KINDS = ('purchase', 'receipt')
+BATCH_FORMATS = ('zip', 'pdf')
+
+# kind -> Document of one batch member, by primary key
+MEMBER_DOCUMENTS = {
+    'purchase': lambda pk: purchase_document(Purchase(pk=pk)),
+    'receipt': lambda pk: receipt_document(Sale(pk=pk)),
+}
+
+_warmed = set()
+_worker_cache = None
+
+
+def _warm_purchase():
+    get_template('purchases/purchase_pdf.html')
+    weasyprint.HTML(string="<p>warm-up</p>").write_pdf(io.BytesIO())
+
+
+def _warm_receipt():
+    p = canvas.Canvas(io.BytesIO(), pagesize=pagesizes.A4)
+    for font in ("Courier", "Helvetica", "Helvetica-Bold"):
+        p.setFont(font, 10)
+        p.drawString(0, 0, font)
+    p.save()
+
+
+# kind -> loads what rendering that kind needs: WeasyPrint and the template
+# for purchases, only reportlab for receipts
+WARM_UPS = {
+    'purchase': _warm_purchase,
+    'receipt': _warm_receipt,
+}
+
+
+def warm_up(kinds=BATCH_KINDS):
+    """Load the templates, stylesheets and fonts the renders of ``kinds`` need, once per process.
+
+    Run before the pool forks, the children share what was loaded instead of
+    each paying for it on its first document.
+    """
+    for kind in sorted(set(kinds) - _warmed):
+        WARM_UPS[kind]()
+        _warmed.add(kind)
+
+
+def batch_members(start, end, kinds=BATCH_KINDS):
+    """(kind, pk) of the purchases and sales made on the local days ``start``..``end``."""
+    members = []
+    if 'purchase' in kinds:
+        purchases = Purchase.objects.filter(between_days('purchased_at', start, end)).order_by('purchased_at', 'pk')
+        members += [('purchase', pk) for pk in purchases.values_list('pk', flat=True)]
+    if 'receipt' in kinds:
+        sales = Sale.objects.filter(between_days('created_at', start, end)).order_by('created_at', 'pk')
+        members += [('receipt', pk) for pk in sales.values_list('pk', flat=True)]
+    return members
+
+
+def _init_worker(root, max_bytes, kinds):
+    global _worker_cache
+    if not apps.ready:
+        # spawned rather than forked: a fresh interpreter
+        django.setup()
+    # forked children inherit the parent's handlers; run_jobs catches SIGTERM
+    # to stop gracefully, which would keep Pool.terminate() from ending them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # nor may they share its database sockets
+    connections.close_all()
+    warm_up(kinds)
+    _worker_cache = DocumentCache(root, max_bytes)
+
+
+def _render_member(member, cache=None):
+    kind, pk = member
+    document = MEMBER_DOCUMENTS[kind](pk)
+    return member, str((cache or _worker_cache).fetch(document, evict=False)), document.filename
+
+
+def render_members(members, workers=None, cache=None):
+    """Render ``members`` through the document cache; yields (member, path, filename) in order.
+
+    The documents are rendered by a pool of ``workers`` processes (one per
+    core by default) so PDF rendering, which holds the GIL, runs in
+    parallel. Each worker renders straight into the cache and only passes
+    the path back.
+    """
+    cache = cache or document_cache
+    workers = workers or getattr(settings, 'BATCH_PDF_WORKERS', None) or os.cpu_count()
+    kinds = {kind for kind, _ in members}
+    warm_up(kinds)
+    if workers == 1 or len(members) < 2:
+        for member in members:
+            yield _render_member(member, cache)
+        return
+
+    connections.close_all()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    # large enough chunks to keep inter-process traffic down, small enough
+    # that a slow purchase PDF does not leave the other workers idle
+    chunksize = max(1, min(64, len(members) // (workers * 4)))
+    with context.Pool(workers, initializer=_init_worker, initargs=(cache.root, cache.max_bytes, kinds)) as pool:
+        yield from pool.imap(_render_member, members, chunksize=chunksize)
+
+
+def _member_files(results, cache):
+    for member, path, filename in results:
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            # evicted by another process since it was rendered
+            file = cache.open(MEMBER_DOCUMENTS[member[0]](member[1]))
+        with file:
+            yield file, filename
+
+
+def write_zip(file, results, cache=None):
+    # PDFs are compressed already; storing them is as small and much faster
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for member_file, filename in _member_files(results, cache or document_cache):
+            with archive.open(filename, 'w') as entry:
+                shutil.copyfileobj(member_file, entry)
+
+
+def write_merged_pdf(file, results, cache=None):
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for member_file, _ in _member_files(results, cache or document_cache):
+        writer.append(io.BytesIO(member_file.read()))
+    writer.write(file)
+
+
+def render_batch(file, members, fmt='zip', workers=None, cache=None):
+    """Write ``members`` to ``file`` as one zip of PDFs or, with ``fmt='pdf'``, one merged PDF."""
+    cache = cache or document_cache
+    results = render_members(members, workers, cache)
+    if fmt == 'pdf':
+        write_merged_pdf(file, results, cache)
+    else:
+        write_zip(file, results, cache)
+    cache.evict()
+    return len(members)
+
+
+def batch_document(start, end, fmt='zip', kinds=BATCH_KINDS):
+    # like the sales export, receipts follow their days' summaries and the
+    # names they print; purchases are few enough to list with their products'
+    kinds = sorted(kinds)
+    source = [[start, end, fmt, kinds]]
+    if 'purchase' in kinds:
+        purchases = Purchase.objects.filter(between_days('purchased_at', start, end)).order_by('pk')
+        products = (
+            PurchaseItem.objects.filter(purchase__in=purchases)
+            .values_list('product_id', 'product__name')
+            .distinct()
+            .order_by('product_id')
+        )
+        source += [list(row) for row in purchases.values_list('pk', 'status', 'total_price')]
+        source += [list(row) for row in products]
+    if 'receipt' in kinds:
+        days = DailySalesSummary.objects.filter(day__gte=start, day__lte=end).order_by('day')
+        source += [list(row) for row in days.values_list('day', 'updated_at')]
+        source += sale_names(start, end)
+    return Document(
+        kind='batch',
+        filename=f"documents_{start:%Y-%m-%d}_{end:%Y-%m-%d}.{fmt}",
+        content_type=PDF_CONTENT_TYPE if fmt == 'pdf' else ZIP_CONTENT_TYPE,
+        source=source,
+        render=lambda file: render_batch(file, batch_members(start, end, kinds), fmt),
+    )
@@ -0,0 +1,77 @@
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from apps.models import Product
+from django.db.models import Count, Max
+from django.utils.dateparse import parse_datetime
+
+CATALOG_FIELDS = ["barcode", "name", "price", "unit", "stock"]
+
+# Rows updated inside a transaction that commits after a client synced carry
+# an updated_at older than the version that client received. Re-sending a few
+# seconds of history on every delta makes sure such rows are not skipped.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_version(value):
+    if value is None:
+        return 0
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_version(version):
+    return EPOCH + timedelta(microseconds=version)
+
+
+def parse_since(value):
+    """Accept either a catalog version (microseconds) or an ISO ``updated_at``."""
+    if not value:
+        return None
+    if value.isdigit():
+        return from_version(int(value))
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Noto‘g‘ri since qiymati: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def catalog_state():
+    """(version, count, recent) of the catalog.
+
+    ``updated_at`` is stamped when the writing transaction starts, so a row
+    that commits late can carry a stamp below the version without moving
+    it. ``recent`` digests the rows stamped within SYNC_OVERLAP of the
+    version, the window every delta re-sends, so such a row still changes
+    the ETag and reaches the tills with the next delta.
+    """
+    state = Product.objects.aggregate(last=Max('updated_at'), count=Count('pk'))
+    digest = hashlib.sha1()
+    if state['last'] is not None:
+        rows = (
+            Product.objects.filter(updated_at__gte=state['last'] - SYNC_OVERLAP)
+            .order_by('pk')
+            .values_list('pk', 'updated_at')
+        )
+        for pk, updated_at in rows:
+            digest.update(f"{pk}:{to_version(updated_at)};".encode())
+    return to_version(state['last']), state['count'], digest.hexdigest()[:16]
+
+
+def catalog_etag(version, count, recent, since=None):
+    return f'"catalog-{version}-{count}-{recent}-{to_version(since)}"'
+
+
+def catalog_rows(since=None):
+    products = Product.objects.order_by()
+    if since is not None:
+        products = products.filter(updated_at__gt=since - SYNC_OVERLAP)
+    return [
+        [barcode, name, float(price), unit, float(stock)]
+        for barcode, name, price, unit, stock in products.values_list(
+            'barcode', 'name', 'sell_price', 'unit', 'stock'
+        ).iterator(chunk_size=2000)
+    ]
@@ -0,0 +1,328 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from apps.models import CheckoutRequest, Customer, Debt, Product, Sale, SaleItem, StockMovement
+from apps.services.counters import dashboard_counters
+from apps.services.receipts import receipt_store
+from apps.services.sales_summary import add_to_summaries, sale_deltas
+from apps.services.stock import InsufficientStockError, build_movements, decrease_stock_many
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from apps.utils import to_decimal
+
+
+# How long a committed idempotency key is answered from the cache before
+# falling back to the CheckoutRequest table.
+IDEMPOTENCY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f"Stock yetarli emas: {product.name}")
+
+
+class IdempotencyConflict(CheckoutError):
+    """The key was already used by another cashier or for a different basket."""
+
+    def __init__(self, key):
+        self.key = key
+        super().__init__("Bu so‘rov kaliti boshqa savdo uchun ishlatilgan")
+
+
+@dataclass
+class CartLine:
+    product: Product
+    quantity: Decimal
+    price: Decimal
+
+    @property
+    def subtotal(self):
+        return self.quantity * self.price
+
+
+@dataclass
+class CheckoutPlan:
+    lines: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+
+    @property
+    def total_amount(self):
+        return to_decimal(sum((line.subtotal for line in self.lines), Decimal('0.00')))
+
+    @property
+    def demand(self):
+        """Total quantity per product pk, duplicate barcodes merged."""
+        result = {}
+        for line in self.lines:
+            result[line.product.pk] = result.get(line.product.pk, Decimal('0.00')) + line.quantity
+        return result
+
+
+@dataclass
+class CheckoutOrder:
+    """A validated basket waiting to be written."""
+
+    plan: CheckoutPlan
+    cashier: object
+    payment_type: str
+    received_amount: Decimal
+    customer_name: str = ''
+    idempotency_key: str = None
+    basket_hash: str = ''
+
+    @property
+    def cashier_id(self):
+        return getattr(self.cashier, 'pk', None)
+
+
+@dataclass
+class CheckoutResult:
+    sale_id: object
+    sale: Sale = None
+    missing: list = field(default_factory=list)
+    replayed: bool = False
+
+
+def prepare_checkout(cart_items):
+    """Resolve every barcode of the cart in one query and validate stock against the fetched rows."""
+    barcodes = {str(item.get('barcode') or '').strip() for item in cart_items}
+    products = Product.objects.in_bulk([b for b in barcodes if b], field_name='barcode')
+
+    plan = CheckoutPlan()
+    for item in cart_items:
+        product = products.get(str(item.get('barcode') or '').strip())
+        if product is None:
+            plan.missing.append(item.get('name') or item.get('barcode'))
+            continue
+
+        quantity = to_decimal(item.get('qty', 1) or 1)
+        if quantity <= 0:
+            raise CheckoutError(f"Miqdor noto‘g‘ri: {product.name}")
+        price = item.get('price')
+        price = to_decimal(price) if price is not None else to_decimal(product.sell_price)
+        plan.lines.append(CartLine(product=product, quantity=quantity, price=price))
+
+    by_pk = {line.product.pk: line.product for line in plan.lines}
+    for pk, quantity in plan.demand.items():
+        if by_pk[pk].stock < quantity:
+            raise InsufficientStock(by_pk[pk])
+
+    return plan
+
+
+def decrement_stock(plan):
+    """Decrease stock of every product in the plan with a single guarded UPDATE.
+
+    Each row only matches while it still holds enough stock, so a basket that
+    raced another till for the last units fails as a whole.
+    """
+    try:
+        decrease_stock_many(plan.demand)
+    except InsufficientStockError as e:
+        product = next(line.product for line in plan.lines if line.product.pk == e.product_ids[0])
+        raise InsufficientStock(product)
+
+
+def build_sale(plan, cashier, payment_type, received_amount, customer=None):
+    sale = Sale(
+        customer=customer,
+        cashier=cashier,
+        payment_type=payment_type,
+        total_amount=plan.total_amount,
+        paid_amount=to_decimal(received_amount),
+    )
+    items = [
+        SaleItem(sale=sale, product=line.product, quantity=line.quantity, price=line.price)
+        for line in plan.lines
+    ]
+    for item in items:
+        item.fill_line_totals()
+    return sale, items
+
+
+def record_credit(sale, cashier):
+    debt_amount = sale.total_amount - sale.paid_amount
+    if sale.payment_type != Sale.PAYMENT.CREDIT or debt_amount <= 0 or not sale.customer:
+        return None
+
+    Customer.objects.filter(pk=sale.customer.pk).update(total_debt=F('total_debt') + debt_amount)
+    debt = Debt.objects.create(
+        customer=sale.customer,
+        amount=sale.total_amount,
+        paid_amount=sale.paid_amount,
+        created_by=cashier,
+    )
+    debt.update_status()
+    return debt
+
+
+def basket_digest(cart_items, payment_type, received_amount, customer_name=''):
+    """Digest of a checkout submission, the same for every retry of it."""
+    lines = sorted(
+        [
+            str(item.get('barcode') or '').strip(),
+            str(to_decimal(item.get('qty', 1) or 1)),
+            str(to_decimal(item['price'])) if item.get('price') is not None else '',
+        ]
+        for item in cart_items
+    )
+    payload = [lines, payment_type, str(to_decimal(received_amount)), customer_name.strip()]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+def _idempotency_cache_key(key):
+    return f"checkout-request:{key}"
+
+
+def match_claim(idempotency_key, claim, cashier_id, basket_hash):
+    """Sale of ``claim`` ((sale_id, cashier_id, basket_hash)) if this submission made it.
+
+    A retry must come from the same cashier with the same basket; anything
+    else reusing the key raises IdempotencyConflict instead of being handed
+    someone else's sale.
+    """
+    sale_id, claimed_by, claimed_hash = claim
+    if (claimed_by, claimed_hash) != (cashier_id, basket_hash):
+        raise IdempotencyConflict(idempotency_key)
+    return sale_id
+
+
+def committed_sale_id(idempotency_key, cashier_id, basket_hash):
+    """Sale created by an earlier checkout with this key, or None.
+
+    Raises IdempotencyConflict when the key belongs to another submission.
+    """
+    cache_key = _idempotency_cache_key(idempotency_key)
+    claim = cache.get(cache_key)
+    if claim is None:
+        claim = (
+            CheckoutRequest.objects.filter(key=idempotency_key)
+            .values_list('sale_id', 'cashier_id', 'basket_hash')
+            .first()
+        )
+        if claim is None:
+            return None
+        cache.set(cache_key, claim, IDEMPOTENCY_CACHE_TIMEOUT)
+    return match_claim(idempotency_key, claim, cashier_id, basket_hash)
+
+
+def stage_checkout(order):
+    """Apply every side effect of an order except inserting its rows.
+
+    Claims the idempotency key, decrements stock and records credit. Returns
+    the unsaved Sale, SaleItems and StockMovements for ``persist_sales``,
+    which lets several orders share one bulk insert. Must run in a
+    transaction.
+    """
+    customer = None
+    if order.payment_type == Sale.PAYMENT.CREDIT:
+        customer, _ = Customer.objects.get_or_create(name=order.customer_name)
+
+    sale, items = build_sale(order.plan, order.cashier, order.payment_type, order.received_amount, customer)
+    if order.idempotency_key:
+        # Claim the key before touching stock: a concurrent retry blocks
+        # on the unique index here and fails once this one commits.
+        CheckoutRequest.objects.create(
+            key=order.idempotency_key, sale_id=sale.pk, cashier_id=order.cashier_id, basket_hash=order.basket_hash,
+        )
+        claim = (sale.pk, order.cashier_id, order.basket_hash)
+        transaction.on_commit(
+            lambda: cache.set(_idempotency_cache_key(order.idempotency_key), claim, IDEMPOTENCY_CACHE_TIMEOUT),
+            robust=True,
+        )
+
+    decrement_stock(order.plan)
+    record_credit(sale, order.cashier)
+
+    movements = build_movements(
+        {pk: -quantity for pk, quantity in order.plan.demand.items()},
+        StockMovement.KindChoices.SALE,
+        sale=sale,
+    )
+    return sale, items, movements
+
+
+def persist_sales(sales, items, movements):
+    # bulk_create skips Sale.save()/SaleItem.save(): totals are already
+    # known and stock was decremented while staging, so the per-row
+    # recalculation and locking they do would only repeat the work.
+    Sale.objects.bulk_create(sales)
+    for item in items:
+        item.created_at = item.sale.created_at
+    SaleItem.objects.bulk_create(items)
+    StockMovement.objects.bulk_create(movements)
+    # last, so the day's summary row stays locked only until the commit
+    add_to_summaries(sale_deltas(sales, items))
+    # robust: a cache outage must not fail a sale that has already committed
+    transaction.on_commit(lambda: dashboard_counters.record_sales(sales), robust=True)
+    transaction.on_commit(lambda: receipt_store.prepare(sales, items), robust=True)
+
+
+def commit_checkout(order):
+    with transaction.atomic():
+        sale, items, movements = stage_checkout(order)
+        persist_sales([sale], items, movements)
+    return sale
+
+
+def commit_order(order):
+    """Commit one order on its own; a lost race on its idempotency key is a replay."""
+    try:
+        sale = commit_checkout(order)
+    except IntegrityError:
+        sale_id = (
+            committed_sale_id(order.idempotency_key, order.cashier_id, order.basket_hash)
+            if order.idempotency_key else None
+        )
+        if sale_id is None:
+            raise
+        return CheckoutResult(sale_id=sale_id, replayed=True)
+    return CheckoutResult(sale_id=sale.pk, sale=sale, missing=order.plan.missing)
+
+
+def prepare_order(cashier, cart_items, payment_type, received_amount, customer_name='', idempotency_key=None):
+    plan = prepare_checkout(cart_items)
+    if not plan.lines:
+        raise CheckoutError("Savatchadagi mahsulotlar topilmadi")
+
+    received_amount = to_decimal(received_amount)
+    if payment_type in [Sale.PAYMENT.CASH, Sale.PAYMENT.CARD] and received_amount < plan.total_amount:
+        raise CheckoutError("To‘lov summasi kam")
+
+    digest = basket_digest(cart_items, payment_type, received_amount, customer_name) if idempotency_key else ''
+    return CheckoutOrder(plan, cashier, payment_type, received_amount, customer_name, idempotency_key, digest)
+
+
+def checkout(cashier, cart_items, payment_type, received_amount, customer_name='', idempotency_key=None,
+             writer=None):
+    """Turn a till basket into a committed Sale in a fixed number of queries.
+
+    With an ``idempotency_key`` a retried submission returns the sale of the
+    first one (``replayed=True``) without touching stock again; the same key
+    from another cashier or with another basket raises IdempotencyConflict.
+    With a ``writer`` (see apps.services.group_commit) the basket is
+    validated here and committed together with other tills' baskets.
+
+    Raises CheckoutError (a ValueError) when the basket cannot be sold; nothing
+    is written in that case.
+    """
+    if idempotency_key:
+        digest = basket_digest(cart_items, payment_type, received_amount, customer_name)
+        sale_id = committed_sale_id(idempotency_key, getattr(cashier, 'pk', None), digest)
+        if sale_id is not None:
+            return CheckoutResult(sale_id=sale_id, replayed=True)
+
+    order = prepare_order(cashier, cart_items, payment_type, received_amount, customer_name, idempotency_key)
+    if writer is not None:
+        return writer.submit(order)
+
+    return commit_order(order)
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import timedelta
+
+from apps.models import DailySalesSummary, Product, User
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.utils import to_decimal
+
+
+class LocalCounterBackend:
+    """Counters in this process only; other workers' sales show up at the next reconcile."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get_many(self, keys):
+        with self._lock:
+            return {key: self._values[key] for key in keys if key in self._values}
+
+    def set_many(self, values):
+        with self._lock:
+            self._values.update(values)
+
+    def incr_many(self, deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                if key in self._values:
+                    self._values[key] += delta
+
+
+class CacheCounterBackend:
+    """Counters in a Django cache shared by all workers (Redis, Memcached)."""
+
+    def __init__(self, alias='default', timeout=8 * 24 * 3600):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get_many(self, keys):
+        return self.cache.get_many(list(keys))
+
+    def set_many(self, values):
+        self.cache.set_many(values, self.timeout)
+
+    def incr_many(self, deltas):
+        for key, delta in deltas.items():
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                pass
+
+
+class DashboardCounters:
+    """Today's sale count and revenue, the last days' revenue and table counts.
+
+    Checkouts add to the counters when they commit. Increments only apply to
+    counters that exist: a missing counter is unknown rather than zero, and
+    the next read fills it from the database. Reads also reconcile once the
+    last reconciliation is older than ``reconcile_interval`` seconds, which
+    corrects anything written outside checkout (admin edits, deletes) and
+    the increments of other workers with the local backend.
+    """
+
+    def __init__(self, backend, reconcile_interval=60):
+        self.backend = backend
+        self.reconcile_interval = reconcile_interval
+
+    @staticmethod
+    def _day_keys(day):
+        return f"dashboard:{day.isoformat()}:sales", f"dashboard:{day.isoformat()}:revenue"
+
+    def record_sales(self, sales):
+        deltas = {}
+        for sale in sales:
+            sales_key, revenue_key = self._day_keys(timezone.localdate(sale.created_at))
+            deltas[sales_key] = deltas.get(sales_key, 0) + 1
+            # cents, so a cache backend can add them atomically
+            deltas[revenue_key] = deltas.get(revenue_key, 0) + int(to_decimal(sale.total_amount) * 100)
+        self.backend.incr_many(deltas)
+
+    def reconcile(self, today, days=7):
+        first = today - timedelta(days=days - 1)
+        summaries = {s.day: s for s in DailySalesSummary.objects.filter(day__gte=first, day__lte=today)}
+        values = {
+            'dashboard:products': Product.objects.count(),
+            'dashboard:employees': User.objects.filter(is_staff=True).count(),
+            'dashboard:reconciled': time.time(),
+        }
+        for n in range(days):
+            day = first + timedelta(days=n)
+            summary = summaries.get(day)
+            sales_key, revenue_key = self._day_keys(day)
+            values[sales_key] = summary.sale_count if summary else 0
+            values[revenue_key] = int(summary.revenue * 100) if summary else 0
+        self.backend.set_many(values)
+        return values
+
+    def dashboard(self, today, days=7):
+        """Counters for the dashboard: today's figures, table counts and ``days`` of revenue."""
+        last_days = [today - timedelta(days=n) for n in range(days - 1, -1, -1)]
+        keys = ['dashboard:products', 'dashboard:employees', 'dashboard:reconciled']
+        keys += [key for day in last_days for key in self._day_keys(day)]
+
+        values = self.backend.get_many(keys)
+        stale = time.time() - values.get('dashboard:reconciled', 0) > self.reconcile_interval
+        if stale or len(values) < len(keys):
+            values = self.reconcile(today, days)
+
+        sales_key, revenue_key = self._day_keys(today)
+        return {
+            'total_sales_today': values[sales_key],
+            'total_amount_today': values[revenue_key] / 100,
+            'total_products': values['dashboard:products'],
+            'total_employees': values['dashboard:employees'],
+            'days': last_days,
+            'revenue': [values[self._day_keys(day)[1]] / 100 for day in last_days],
+        }
+
+
+dashboard_counters = DashboardCounters(
+    import_string(getattr(settings, 'DASHBOARD_COUNTERS_BACKEND', 'apps.services.counters.LocalCounterBackend'))(),
+    reconcile_interval=getattr(settings, 'DASHBOARD_COUNTERS_RECONCILE_INTERVAL', 60),
+)
@@ -0,0 +1,34 @@
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def day_bounds(start, end=None):
+    """Half-open datetime range [start 00:00, end+1 00:00) in the current time zone."""
+    end = end or start
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def between_days(field, start, end=None):
+    """Filter for ``field`` falling on the local days ``start``..``end``, both inclusive.
+
+    The bounds compare the bare column, so an index on it serves the
+    filter; ``__date`` and ``__date__range`` cast every row to a date first
+    and cannot use one.
+    """
+    low, high = day_bounds(start, end)
+    return Q(**{f'{field}__gte': low, f'{field}__lt': high})
+
+
+def parse_day(value, default=None):
+    """A YYYY-MM-DD query parameter as a date, or ``default`` when it is missing or malformed."""
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return default
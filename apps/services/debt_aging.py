@@ -0,0 +1,64 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.models import Debt
+from apps.services.dates import day_bounds
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+# (key, label, youngest, oldest): debts taken between ``youngest`` and
+# ``oldest`` days ago, both inclusive; ``None`` leaves the bucket open
+AGING_BUCKETS = (
+    ('days_0_30', '0–30 kun', 0, 30),
+    ('days_31_60', '31–60 kun', 31, 60),
+    ('days_61_90', '61–90 kun', 61, 90),
+    ('days_over_90', '90+ kun', 91, None),
+)
+SORT_FIELDS = [bucket[0] for bucket in AGING_BUCKETS] + ['total', 'customer__name']
+DEFAULT_SORT = '-total'
+
+
+def _zero():
+    return Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _bucket_filter(today, youngest, oldest):
+    window = Q()
+    if youngest:
+        window &= Q(created_at__lt=day_bounds(today - timedelta(days=youngest))[1])
+    if oldest is not None:
+        window &= Q(created_at__gte=day_bounds(today - timedelta(days=oldest))[0])
+    return window
+
+
+def aging_queryset(today=None, search='', sort=DEFAULT_SORT):
+    """Remaining debt per customer split by age, one row per customer who still owes.
+
+    Each bucket is a filtered ``SUM`` over the same grouped scan of Debt, so
+    the whole page is one statement no matter how many buckets there are.
+    ``sort`` is a bucket key, ``total`` or ``customer__name``, with ``-`` for
+    descending; anything else falls back to the largest total first.
+    """
+    today = today or timezone.localdate()
+    remaining = Greatest(F('amount') - Coalesce('paid_amount', _zero()), _zero())
+    buckets = {
+        key: Coalesce(Sum(remaining, filter=_bucket_filter(today, youngest, oldest)), _zero())
+        for key, _, youngest, oldest in AGING_BUCKETS
+    }
+
+    queryset = Debt.objects.order_by()
+    if search:
+        queryset = queryset.filter(customer__name__icontains=search)
+    queryset = (
+        queryset.values('customer', 'customer__name')
+        .annotate(**buckets, total=Sum(remaining))
+        .filter(total__gt=0)
+    )
+
+    field = sort.lstrip('-')
+    if field not in SORT_FIELDS:
+        sort, field = DEFAULT_SORT, DEFAULT_SORT.lstrip('-')
+    ordering = F(field).desc() if sort.startswith('-') else F(field).asc()
+    # customer id last so pages stay stable when amounts tie
+    return queryset.order_by(ordering, 'customer')
@@ -0,0 +1,63 @@
+import importlib
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    ``from apps.services.document_backends import openpyxl`` then reads like
+    the plain import, but the library is only loaded by the first worker
+    that actually renders a document.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+# WeasyPrint (with Pango and its fonts), reportlab and openpyxl are the bulk
+# of a worker's start-up time and memory, while most requests are sales
+weasyprint = LazyModule('weasyprint')
+canvas = LazyModule('reportlab.pdfgen.canvas')
+pagesizes = LazyModule('reportlab.lib.pagesizes')
+units = LazyModule('reportlab.lib.units')
+openpyxl = LazyModule('openpyxl')
+
+DOCUMENT_BACKENDS = [canvas, pagesizes, units, openpyxl, weasyprint]
+
+
+def preload():
+    """Import every backend now, for workers that mostly render documents (PRELOAD_DOCUMENT_BACKENDS, run_jobs).
+
+    A backend that cannot be imported (WeasyPrint without Pango, say) is
+    logged and skipped: the worker still starts, and only the documents that
+    need it fail, with the same error, when they are rendered. Returns the
+    failures by module name.
+    """
+    failures = {}
+    for backend in DOCUMENT_BACKENDS:
+        try:
+            backend._load()
+        except (ImportError, OSError) as e:
+            failures[backend._name] = f"{type(e).__name__}: {e}"
+            logger.warning("Document backend %s could not be preloaded: %s", backend._name, failures[backend._name])
+    return failures
+
+
+def loaded_backends():
+    """Names of the backends already imported in this process, by anything."""
+    return [backend._name for backend in DOCUMENT_BACKENDS if backend._name in sys.modules]
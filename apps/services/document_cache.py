@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from apps.services.documents import LAYOUT_VERSIONS
+from django.conf import settings
+from django.http import FileResponse
+
+
+class DocumentCache:
+    """Rendered documents on disk, named by a hash of what they were rendered from.
+
+    A changed purchase, sale or catalog hashes to a new name, so a stale file
+    is never served and nothing has to be invalidated; old files are simply
+    not asked for again. Once the directory grows past ``max_bytes`` the
+    least recently served files are removed. Files are written under a
+    temporary name and renamed into place, so concurrent workers never see
+    a partial file.
+
+    The directory is only scanned when this process's running total, the
+    size found by the last scan plus what it has rendered since, passes
+    ``max_bytes``; a scan then evicts down to ``EVICT_TO`` of the limit so
+    the next one is some renders away. What other processes wrote in
+    between is seen at the next scan, so the directory can overshoot the
+    limit by that much.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(document):
+        digest = hashlib.sha256()
+        digest.update(f"{document.kind}:{LAYOUT_VERSIONS.get(document.kind, 0)}".encode())
+        for row in document.source:
+            digest.update(json.dumps(row, default=str, separators=(',', ':')).encode())
+        return digest.hexdigest()
+
+    def path(self, document):
+        key = self.key(document)
+        extension = Path(document.filename).suffix
+        return self.root / document.kind / key[:2] / f"{key}{extension}"
+
+    def lookup(self, document):
+        """Path of ``document`` if it is already rendered, else None."""
+        path = self.path(document)
+        try:
+            # the modification time doubles as the last use for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, document, evict=True):
+        """Path of the rendered ``document``, rendering it on a miss.
+
+        Batch renders pass ``evict=False`` and evict once at the end, instead
+        of counting every document.
+        """
+        path = self.lookup(document)
+        if path is not None:
+            return path
+
+        path = self.path(document)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                document.render(file)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        if evict and self._grow(path.stat().st_size):
+            self.evict()
+        return path
+
+    def _grow(self, size):
+        """Add ``size`` to the running total; True when it calls for a scan."""
+        with self._lock:
+            if self._size is None:
+                return True
+            self._size += size
+            return self._size > self.max_bytes
+
+    def open(self, document):
+        # another worker may evict the file between fetch and open; an open
+        # file stays readable after it is removed
+        for _ in range(3):
+            try:
+                return open(self.fetch(document), 'rb')
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(self.path(document))
+
+    def evict(self):
+        entries, total = [], 0
+        for path in self.root.rglob('*'):
+            if path.suffix == '.part' or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in entries:
+                if total <= self.max_bytes * self.EVICT_TO:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        with self._lock:
+            self._size = total
+        return removed
+
+
+document_cache = DocumentCache(
+    getattr(settings, 'DOCUMENT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'documents'),
+    getattr(settings, 'DOCUMENT_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+)
+
+
+def document_response(document, as_attachment=True):
+    return FileResponse(
+        document_cache.open(document),
+        as_attachment=as_attachment,
+        filename=document.filename,
+        content_type=document.content_type,
+    )
@@ -0,0 +1,288 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from apps.models import DailySalesSummary, Purchase, Sale, SaleItem
+from apps.services.catalog import catalog_state
+from apps.services.dates import day_bounds
+from apps.services.document_backends import canvas, pagesizes, units, weasyprint
+from apps.services.exports import (
+    CSV_CONTENT_TYPE,
+    INVENTORY_HEADER,
+    PRODUCT_HEADER,
+    SALE_HEADER,
+    XLSX_CONTENT_TYPE,
+    inventory_rows,
+    product_rows,
+    sale_rows,
+    write_csv,
+    write_xlsx,
+)
+from apps.services.inventory_analytics import analytics_settings, compute_inventory_analytics
+from apps.services.sales_summary import sale_items_between
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+PDF_CONTENT_TYPE = "application/pdf"
+ZIP_CONTENT_TYPE = "application/zip"
+
+# Part of every cache key: bump a kind's number when its layout changes so
+# documents rendered with the old layout are not served any more.
+LAYOUT_VERSIONS = {
+    'purchase': 1,
+    'receipt': 1,
+    'products-pdf': 1,
+    'products-xlsx': 1,
+    'sales-export': 1,
+    'inventory-xlsx': 1,
+    'batch': 1,
+}
+
+
+@dataclass
+class Document:
+    """A downloadable document and what it is rendered from.
+
+    ``source`` holds the rows the content depends on; equal sources render
+    equal documents, which is what the document cache relies on. ``render``
+    writes the document to a binary file.
+    """
+
+    kind: str
+    filename: str
+    content_type: str
+    source: list
+    render: Callable
+
+
+def render_purchase_pdf(purchase, file):
+    html_string = render_to_string('purchases/purchase_pdf.html', {'purchase': purchase})
+    weasyprint.HTML(string=html_string).write_pdf(file)
+
+
+def render_receipt_pdf(sale, file):
+    mm = units.mm
+    page_width = 80 * mm
+    page_height = pagesizes.A4[1]
+    p = canvas.Canvas(file, pagesize=(page_width, page_height))
+    width, height = page_width, page_height
+    y = height - 10 * mm
+
+    p.setFont("Courier", 7)
+
+    p.drawCentredString(width / 2, y, "🏪 DILYORBEK MARKET")
+    y -= 3 * mm
+    p.drawCentredString(width / 2, y, "📍 Farg'ona vil., Quva tumani")
+    y -= 3 * mm
+    p.drawCentredString(width / 2, y, "☎ +998 90 123 45 67")
+    y -= 5 * mm
+
+    p.drawString(2 * mm, y, f"Sana: {sale.created_at.strftime('%Y-%m-%d %H:%M')}")
+    y -= 3 * mm
+    p.drawString(2 * mm, y, f"Kassir: {sale.cashier.username if sale.cashier else '-'}")
+    y -= 3 * mm
+    p.drawString(2 * mm, y, f"To‘lov: {sale.get_payment_type_display()}")
+    y -= 5 * mm
+
+    if sale.payment_type in ['cash', 'card']:
+        p.drawString(2 * mm, y, f"Berilgan summa: {sale.paid_amount}")
+        y -= 5 * mm
+        p.drawString(2 * mm, y, f"Qaytim: {sale.paid_amount - sale.total_amount}")
+        y -= 5 * mm
+
+    p.drawString(2 * mm, y, "-" * 39)
+    y -= 3 * mm
+    p.drawString(2 * mm, y, "Mahsulot       | Soni | Narx    | Jami")
+    y -= 2 * mm
+    p.drawString(2 * mm, y, "-" * 39)
+    y -= 3 * mm
+
+    for item in sale.items.all():
+        name = item.product.name
+        qty = str(item.quantity)
+        price = f"{int(item.price):,}"
+        subtotal = f"{int(item.subtotal):,}"
+
+        max_len = 14
+        name_lines = [name[i:i + max_len] for i in range(0, len(name), max_len)]
+
+        for i, line_name in enumerate(name_lines):
+            if i == 0:
+                line = f"{line_name:<14} | {qty:>3}  | {price:>7} | {subtotal:>7}"
+            else:
+                line = f"{line_name:<14} |      |         |       "
+            p.drawString(2 * mm, y, line)
+            y -= 3 * mm
+
+        p.drawString(2 * mm, y, "-" * 39)
+        y -= 3 * mm
+
+        if y < 20 * mm:
+            p.showPage()
+            p.setFont("Courier", 7)
+            y = height - 10 * mm
+
+    p.drawString(2 * mm, y, "=" * 39)
+    y -= 5 * mm
+    p.drawRightString(width - 2 * mm, y, f"Jami: {int(sale.total_amount):,} so‘m")
+    y -= 7 * mm
+
+    p.drawCentredString(width / 2, y, "✅ Rahmat! Sizni kutib qolamiz!")
+    y -= 5 * mm
+
+    p.showPage()
+    p.save()
+
+
+def render_products_pdf(rows, file):
+    p = canvas.Canvas(file, pagesize=pagesizes.A4)
+    width, height = pagesizes.A4
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(200, height - 50, "📦 Ombordagi mahsulotlar")
+
+    p.setFont("Helvetica-Bold", 12)
+    y = height - 100
+    p.drawString(50, y, "Nomi")
+    p.drawString(200, y, "Barcode")
+    p.drawString(400, y, "Narxi")
+    p.drawString(480, y, "Soni")
+
+    y -= 20
+    p.setFont("Helvetica", 10)
+    for name, barcode, _, sell_price, stock in rows:
+        p.drawString(50, y, name)
+        p.drawString(200, y, barcode)
+        p.drawString(400, y, f"{sell_price:.2f}")
+        p.drawString(480, y, f"{stock:g}")
+        y -= 20
+        if y < 50:
+            p.showPage()
+            y = height - 50
+
+    p.save()
+
+
+def purchase_document(purchase):
+    purchase = Purchase.objects.prefetch_related('items__product').get(pk=purchase.pk)
+    items = purchase.items.all()
+    source = [[purchase.pk, purchase.purchased_at, purchase.total_price]] + [
+        [item.pk, item.product.name, item.quantity, item.cost_price] for item in items
+    ]
+    return Document(
+        kind='purchase',
+        filename=f"purchase_{purchase.pk}.pdf",
+        content_type=PDF_CONTENT_TYPE,
+        source=source,
+        render=lambda file: render_purchase_pdf(purchase, file),
+    )
+
+
+def receipt_document(sale):
+    sale = Sale.objects.select_related('cashier').prefetch_related('items__product').get(pk=sale.pk)
+    items = sale.items.all()
+    source = [[
+        sale.pk, sale.created_at, sale.cashier.username if sale.cashier else None,
+        sale.payment_type, sale.paid_amount, sale.total_amount,
+    ]] + [[item.pk, item.product.name, item.quantity, item.price] for item in items]
+    return Document(
+        kind='receipt',
+        filename=f"receipt_{sale.pk}.pdf",
+        content_type=PDF_CONTENT_TYPE,
+        source=source,
+        render=lambda file: render_receipt_pdf(sale, file),
+    )
+
+
+def products_pdf_document():
+    # every product write moves updated_at (stock changes included), so the
+    # catalog version stands in for the rows. The exports list stock, so any
+    # sale changes them too: during trading hours the cache only spares
+    # repeated downloads between two sales, while run_jobs still folds
+    # identical requests waiting in the queue into one render.
+    return Document(
+        kind='products-pdf',
+        filename="products.pdf",
+        content_type=PDF_CONTENT_TYPE,
+        source=[catalog_state()],
+        render=lambda file: render_products_pdf(product_rows(), file),
+    )
+
+
+def products_xlsx_document():
+    return Document(
+        kind='products-xlsx',
+        filename="products.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+        source=[catalog_state()],
+        render=lambda file: write_xlsx(file, "Products", PRODUCT_HEADER, product_rows()),
+    )
+
+
+def inventory_xlsx_document(today=None):
+    # The window ends with today, so the analytics only change with the
+    # settings, a product write (stock included) or a sale in the window,
+    # which refreshes its day's summary.
+    today = today or timezone.localdate()
+    window_days, lead_time_days, service_levels = analytics_settings()
+    first = today - timedelta(days=window_days - 1)
+    days = DailySalesSummary.objects.filter(day__gte=first, day__lte=today).order_by('day')
+    source = [[today, window_days, lead_time_days, sorted(service_levels.items())], catalog_state()]
+    source += [list(row) for row in days.values_list('day', 'updated_at')]
+    now = day_bounds(today)[1]
+    return Document(
+        kind='inventory-xlsx',
+        filename="inventory_analytics.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+        source=source,
+        render=lambda file: write_xlsx(
+            file, "Inventory", INVENTORY_HEADER,
+            inventory_rows(compute_inventory_analytics(window_days, lead_time_days, service_levels, now=now)),
+        ),
+    )
+
+
+def sale_names(start, end):
+    """Key rows for the names the sales of the local days ``start``..``end`` print.
+
+    Day summaries only move when sales do, so a renamed product, cashier or
+    customer has to reach the key through these rows. The catalog version
+    would do too, but every checkout moves it and a past month would miss
+    each time.
+    """
+    items = SaleItem.objects.filter(sale_items_between(*day_bounds(start, end)))
+    products = (
+        items.values_list('product_id', 'product__name', 'product__barcode')
+        .distinct()
+        .order_by('product_id')
+    )
+    people = (
+        items.values_list('sale__cashier_id', 'sale__cashier__username', 'sale__customer_id', 'sale__customer__name')
+        .distinct()
+        .order_by('sale__cashier_id', 'sale__customer_id')
+    )
+    return [list(row) for row in products] + [list(row) for row in people]
+
+
+def sales_export_document(start, end, fmt='xlsx'):
+    # any sale written, edited or deleted refreshes its day's summary; names
+    # are added on their own
+    days = DailySalesSummary.objects.filter(day__gte=start, day__lte=end).order_by('day')
+    source = [[start, end, fmt]] + [list(row) for row in days.values_list('day', 'updated_at')]
+    source += sale_names(start, end)
+    filename = f"sales_{start:%Y-%m-%d}_{end:%Y-%m-%d}"
+    if fmt == 'csv':
+        return Document(
+            kind='sales-export',
+            filename=f"{filename}.csv",
+            content_type=CSV_CONTENT_TYPE,
+            source=source,
+            render=lambda file: write_csv(file, SALE_HEADER, sale_rows(start, end)),
+        )
+    return Document(
+        kind='sales-export',
+        filename=f"{filename}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+        source=source,
+        render=lambda file: write_xlsx(file, "Sotuvlar", SALE_HEADER, sale_rows(start, end)),
+    )
@@ -0,0 +1,142 @@
+import csv
+import io
+
+from apps.models import Product, Sale, SaleItem
+from apps.services.dates import day_bounds
+from apps.services.document_backends import openpyxl
+from apps.services.sales_summary import sale_items_between
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+# rows per sheet Excel can open, header included
+XLSX_MAX_ROWS = 1_048_576
+# rows fetched per round trip; on PostgreSQL iterator() reads them through a
+# server-side cursor, so only one chunk is held at a time
+EXPORT_CHUNK_SIZE = 2000
+
+PRODUCT_HEADER = ["Nomi", "Barcode", "Sotib olish narxi", "Sotish narxi", "Soni"]
+INVENTORY_HEADER = [
+    "Nomi", "Barcode", "Birlik", "ABC", "Soni", "Sotilgan", "Tushum",
+    "Kunlik sotuv", "Yetadigan kunlar", "Buyurtma nuqtasi",
+]
+SALE_HEADER = [
+    "Sana", "Sotuv", "Kassir", "Mijoz", "To'lov turi", "Sotuv summasi", "To'langan",
+    "Mahsulot", "Barcode", "Miqdor", "Narx", "Tannarx", "Summa", "Xarajat",
+]
+
+
+def write_xlsx(file, title, header, rows):
+    """Write ``header`` and ``rows`` to ``file`` as a workbook; returns the row count.
+
+    The workbook is write-only: appended rows go straight to openpyxl's
+    temporary sheet file instead of staying in memory as cells. Rows past
+    the size of a sheet continue on "``title`` (2)" and so on.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet, sheet_rows, count = None, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(f"{title} ({len(workbook.worksheets) + 1})" if sheet else title)
+            sheet.append(header)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+        count += 1
+    if sheet is None:
+        workbook.create_sheet(title).append(header)
+    workbook.save(file)
+    return count
+
+
+def product_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Rows of PRODUCT_HEADER, read in chunks without building model instances."""
+    queryset = Product.objects.order_by('name') if queryset is None else queryset
+    values = queryset.values_list('name', 'barcode', 'cost_price', 'sell_price', 'stock')
+    for name, barcode, cost_price, sell_price, stock in values.iterator(chunk_size=chunk_size):
+        yield [name, barcode or "-", float(cost_price), float(sell_price), float(stock)]
+
+
+def inventory_rows(analytics):
+    """Rows of INVENTORY_HEADER from an InventoryAnalytics, in the report page's order."""
+    for row in analytics.rows():
+        yield [
+            row['name'], row['barcode'], row['unit'], row['abc'], row['stock'], row['sold'], row['revenue'],
+            row['velocity'], row['days_of_cover'], row['reorder_point'],
+        ]
+
+
+def write_csv(file, header, rows):
+    """Write ``header`` and ``rows`` to the binary ``file`` as UTF-8 CSV with a BOM, for Excel."""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+
+class _Echo:
+    """File-like object whose write returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, header, rows):
+    """Attachment response that writes CSV lines while the client downloads them.
+
+    The file starts with a BOM so Excel reads it as UTF-8.
+    """
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield "\ufeff" + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type=CSV_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def sale_rows(start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """Rows of SALE_HEADER, one per sale line, for the local days ``start``..``end``.
+
+    Lines are read joined to their sale, product, cashier and customer in a
+    single query, chunk by chunk, as plain tuples. Times are local and naive,
+    which both CSV and openpyxl take as they are.
+    """
+    payment_types = dict(Sale.PAYMENT.choices)
+    lines = (
+        SaleItem.objects.filter(sale_items_between(*day_bounds(start, end)))
+        .order_by('sale__created_at', 'sale_id', 'pk')
+        .values_list(
+            'sale__created_at', 'sale_id', 'sale__cashier__username', 'sale__customer__name',
+            'sale__payment_type', 'sale__total_amount', 'sale__paid_amount',
+            'product__name', 'product__barcode', 'quantity', 'price', 'cost_price', 'line_total', 'line_cost',
+        )
+    )
+    for (created_at, sale_id, cashier, customer, payment_type, sale_total, paid,
+         product, barcode, quantity, price, cost_price, line_total, line_cost) in lines.iterator(chunk_size=chunk_size):
+        yield [
+            timezone.localtime(created_at).replace(tzinfo=None, microsecond=0),
+            str(sale_id),
+            cashier or "",
+            customer or "",
+            payment_types.get(payment_type, payment_type),
+            float(sale_total),
+            float(paid),
+            product or "",
+            barcode or "",
+            float(quantity),
+            float(price),
+            None if cost_price is None else float(cost_price),
+            float(line_total),
+            float(line_cost),
+        ]
@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from apps.models import Product, Purchase, PurchaseItem, SaleItem
+from apps.services.dates import day_bounds
+from apps.services.sales_summary import sale_items_between
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.utils import to_decimal
+
+METHODS = ('ses', 'moving_average')
+
+
+@dataclass
+class DemandForecast:
+    """Forecast of one product per array element, over ``horizon_days`` from today."""
+
+    horizon_days: int
+    product_ids: np.ndarray
+    units: np.ndarray
+    cost_prices: np.ndarray
+    stock: np.ndarray
+    on_order: np.ndarray
+    forecast: np.ndarray
+    safety_stock: np.ndarray
+    suggested: np.ndarray
+
+    def __len__(self):
+        return len(self.product_ids)
+
+
+def weekday_indices(demand, first_weekday):
+    """Per-product demand of each weekday relative to the product's mean, shape (products, 7).
+
+    Products that never sold get a flat profile of ones.
+    """
+    weekdays = (first_weekday + np.arange(demand.shape[1])) % 7
+    means = np.stack([demand[:, weekdays == w].mean(axis=1) for w in range(7)], axis=1)
+    overall = means.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(overall > 0, means / overall, 1.0)
+
+
+def fit_demand(demand, first_weekday, horizon_days, method='ses', alpha=0.2, window=28, variability_days=56):
+    """Fit every product's daily demand at once; returns (forecast over horizon, daily std).
+
+    ``demand`` is a (products, days) array of daily quantities, oldest day
+    first, whose first column falls on ``first_weekday`` (Monday is 0).
+    Demand is divided by its weekday profile, smoothed, and multiplied back
+    by the profile of the days in the horizon. Simple exponential smoothing
+    is written in closed form, as weights on the days, so the whole catalog
+    is one matrix product instead of a loop over days. Weekdays on which a
+    product never sells say nothing about its level and are left out: the
+    days are summed per weekday first, and only the product's selling
+    weekdays are added up.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown forecasting method: {method}")
+    products, days = demand.shape
+    profile = weekday_indices(demand, first_weekday)
+    weekdays = (first_weekday + np.arange(days)) % 7
+    seasonal = profile[:, weekdays]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deseasonalised = np.where(seasonal > 0, demand / seasonal, 0.0)
+    selling = profile > 0
+    by_weekday = np.eye(7)[weekdays]
+
+    if method == 'ses':
+        weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+        # the first day is also the initial level; the weights then sum to one
+        weights[0] += (1 - alpha) ** days
+    else:
+        weights = np.zeros(days)
+        weights[-window:] = 1
+    weighted = (deseasonalised @ (weights[:, None] * by_weekday) * selling).sum(axis=1)
+    total = selling @ (weights @ by_weekday)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        level = np.where(total > 0, weighted / total, 0.0)
+
+    future = (first_weekday + days + np.arange(horizon_days)) % 7
+    forecast = level * profile[:, future].sum(axis=1)
+
+    recent, recent_days = deseasonalised[:, -variability_days:], by_weekday[-variability_days:]
+    count = selling @ recent_days.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, (recent @ recent_days * selling).sum(axis=1) / count, 0.0)
+        mean_square = np.where(count > 0, (recent ** 2 @ recent_days * selling).sum(axis=1) / count, 0.0)
+    variability = np.sqrt(np.maximum(mean_square - mean ** 2, 0))
+    return forecast, variability
+
+
+def load_demand(history_days, today=None):
+    """Daily sold quantities per product as a (products, days) array ending yesterday."""
+    today = today or timezone.localdate()
+    first_day = today - timedelta(days=history_days)
+    catalog = list(Product.objects.order_by().values_list('pk', 'unit', 'cost_price', 'stock'))
+    position = {row[0]: i for i, row in enumerate(catalog)}
+
+    low, high = day_bounds(first_day, today - timedelta(days=1))
+    history = (
+        SaleItem.objects.filter(sale_items_between(low, high))
+        .annotate(day=TruncDate('sale__created_at'))
+        .values_list('product', 'day')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    rows = [(position[pk], (day - first_day).days, quantity) for pk, day, quantity in history if pk in position]
+    demand = np.zeros((len(catalog), history_days), dtype=np.float64)
+    if rows:
+        products, days, quantities = zip(*rows)
+        demand[list(products), list(days)] = np.array(quantities, dtype=np.float64)
+    return catalog, demand, first_day
+
+
+def forecast_purchases(history_days=None, lead_time_days=None, cover_days=None, method=None, today=None):
+    """Demand until the next order arrives and the quantity to order now, per product.
+
+    The suggestion covers ``lead_time_days + cover_days`` of forecast demand
+    plus a safety stock, minus what is in stock and on PENDING purchases.
+    """
+    history_days = history_days or getattr(settings, 'PURCHASE_FORECAST_HISTORY_DAYS', 365)
+    lead_time_days = lead_time_days or getattr(settings, 'INVENTORY_LEAD_TIME_DAYS', 7)
+    cover_days = cover_days or getattr(settings, 'PURCHASE_FORECAST_COVER_DAYS', 14)
+    method = method or getattr(settings, 'PURCHASE_FORECAST_METHOD', 'ses')
+    z = getattr(settings, 'PURCHASE_FORECAST_Z', 1.65)
+    horizon = lead_time_days + cover_days
+
+    catalog, demand, first_day = load_demand(history_days, today)
+    forecast, variability = fit_demand(demand, first_day.weekday(), horizon, method=method)
+
+    pending = dict(
+        PurchaseItem.objects.filter(purchase__status=Purchase.StatusChoices.PENDING)
+        .values_list('product')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    product_ids = np.array([row[0] for row in catalog], dtype=object)
+    units = np.array([row[1] for row in catalog], dtype=object)
+    stock = np.array([float(row[3]) for row in catalog], dtype=np.float64)
+    on_order = np.array([float(pending.get(pk, 0)) for pk in product_ids], dtype=np.float64)
+
+    safety_stock = z * variability * np.sqrt(lead_time_days)
+    suggested = np.maximum(forecast + safety_stock - stock - on_order, 0)
+    # PurchaseItem quantities have two decimals; pieces are ordered whole
+    suggested = np.where(units == Product.UnitChoices.piece, np.ceil(suggested), np.round(suggested, 2))
+
+    return DemandForecast(
+        horizon_days=horizon,
+        product_ids=product_ids,
+        units=units,
+        cost_prices=np.array([row[2] for row in catalog], dtype=object),
+        stock=stock,
+        on_order=on_order,
+        forecast=forecast,
+        safety_stock=safety_stock,
+        suggested=suggested,
+    )
+
+
+def create_suggested_purchase(forecast):
+    """A PENDING Purchase of every product with a suggested quantity, or None if nothing is needed."""
+    lines = np.flatnonzero(forecast.suggested > 0)
+    if not len(lines):
+        return None
+
+    with transaction.atomic():
+        purchase = Purchase(total_price=Decimal('0.00'), status=Purchase.StatusChoices.PENDING)
+        items = [
+            PurchaseItem(
+                purchase=purchase,
+                product_id=forecast.product_ids[i],
+                quantity=Decimal(str(forecast.suggested[i])),
+                cost_price=forecast.cost_prices[i],
+            )
+            for i in lines
+        ]
+        purchase.total_price = to_decimal(sum(item.total_price for item in items))
+        purchase.save()
+        # bulk_create: PurchaseItem.save would add the stock now, while a
+        # PENDING purchase only adds it once it is completed
+        PurchaseItem.objects.bulk_create(items)
+    return purchase
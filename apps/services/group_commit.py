@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from apps.services.checkout import (
+    CheckoutResult,
+    commit_order,
+    committed_sale_id,
+    match_claim,
+    persist_sales,
+    stage_checkout,
+)
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+
+class GroupCommitWriter:
+    """Commit baskets from many tills together, one transaction per group.
+
+    Request threads validate their basket and hand it to ``submit``, which
+    blocks until a single writer thread has committed it. The writer takes
+    whatever arrived within ``max_delay`` seconds (at most ``max_batch``
+    baskets), stages each one in its own savepoint so a basket that fails
+    only fails itself, and inserts the rows of all of them with one bulk
+    insert per table. Ten tills checking out at once then cost one commit
+    instead of ten.
+    """
+
+    def __init__(self, max_batch=32, max_delay=0.005, timeout=10):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, order):
+        """Queue a prepared order and wait for its CheckoutResult.
+
+        Raises whatever committing this basket raised. On a timeout the
+        basket may still commit later; a retry with the same idempotency key
+        then replays it.
+        """
+        future = Future()
+        self._ensure_running()
+        self._queue.put((order, future))
+        return future.result(timeout=self.timeout)
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkout-group-commit', daemon=True)
+                self._thread.start()
+
+    def _next_group(self):
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                group.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            try:
+                self.commit_group(group)
+            except Exception as exc:
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(exc)
+            finally:
+                connection.close_if_unusable_or_obsolete()
+
+    def commit_group(self, group):
+        """Commit ``group`` ([(order, future), ...]) and resolve every future.
+
+        Anything raised inside the try happened before or during the commit,
+        so nothing of the group is written and each basket is retried alone.
+        The post-commit hooks of this path are registered robust and cannot
+        raise out of the atomic block once the sales are committed.
+        """
+        try:
+            with transaction.atomic():
+                staged, replays, failed, claimed = self._stage_group(group)
+                persist_sales(
+                    [sale for _, _, sale, _, _ in staged],
+                    [item for _, _, _, items, _ in staged for item in items],
+                    [movement for _, _, _, _, movements in staged for movement in movements],
+                )
+        except Exception:
+            # The group as a whole could not commit; retry the baskets one by one
+            # so a single bad row does not fail every till waiting on it.
+            for order, future in group:
+                self._resolve(future, commit_order, order)
+            return
+
+        for future, exc in failed:
+            future.set_exception(exc)
+        for order, future, sale, _, _ in staged:
+            future.set_result(CheckoutResult(sale_id=sale.pk, sale=sale, missing=order.plan.missing))
+        for order, future in replays:
+            self._resolve(future, self._replay, order, claimed)
+
+    @staticmethod
+    def _stage_group(group):
+        staged, replays, failed, claimed = [], [], [], {}
+        for order, future in group:
+            key = order.idempotency_key
+            if key and key in claimed:
+                # the same basket sent twice within one group
+                replays.append((order, future))
+                continue
+            try:
+                with transaction.atomic():
+                    sale, items, movements = stage_checkout(order)
+            except IntegrityError:
+                if not key:
+                    raise
+                # committed earlier by another group or process
+                replays.append((order, future))
+                continue
+            except Exception as exc:
+                failed.append((future, exc))
+                continue
+            if key:
+                claimed[key] = (sale.pk, order.cashier_id, order.basket_hash)
+            staged.append((order, future, sale, items, movements))
+        return staged, replays, failed, claimed
+
+    @staticmethod
+    def _replay(order, claimed):
+        key = order.idempotency_key
+        if key in claimed:
+            sale_id = match_claim(key, claimed[key], order.cashier_id, order.basket_hash)
+        else:
+            sale_id = committed_sale_id(key, order.cashier_id, order.basket_hash)
+        if sale_id is None:
+            raise IntegrityError(f"Idempotency key {key} is claimed but has no sale")
+        return CheckoutResult(sale_id=sale_id, replayed=True)
+
+    @staticmethod
+    def _resolve(future, func, *args):
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+
+
+checkout_writer = GroupCommitWriter(
+    max_batch=getattr(settings, 'CHECKOUT_GROUP_COMMIT_MAX_BATCH', 32),
+    max_delay=getattr(settings, 'CHECKOUT_GROUP_COMMIT_MAX_DELAY', 0.005),
+    timeout=getattr(settings, 'CHECKOUT_GROUP_COMMIT_TIMEOUT', 10),
+)
@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from apps.models import Product, SaleItem
+from apps.services.sales_summary import sale_items_between
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+ABC_CUTOFFS = (0.80, 0.95)
+ABC_CLASSES = np.array(['A', 'B', 'C'])
+
+
+@dataclass
+class InventoryAnalytics:
+    """Per-product inventory metrics, one array element per product.
+
+    ``velocity`` is the mean daily demand over the window (days without
+    sales count as zero) and ``demand_std`` its standard deviation.
+    ``reorder_point`` covers the lead time at that velocity plus a safety
+    stock of ``z * demand_std * sqrt(lead_time)``, with ``z`` set by the
+    product's ABC class. ``days_of_cover`` is ``inf`` for products that did
+    not sell.
+    """
+
+    window_days: int
+    lead_time_days: int
+    product_ids: np.ndarray
+    names: np.ndarray
+    barcodes: np.ndarray
+    units: np.ndarray
+    stock: np.ndarray
+    sold: np.ndarray
+    revenue: np.ndarray
+    velocity: np.ndarray
+    demand_std: np.ndarray
+    days_of_cover: np.ndarray
+    reorder_point: np.ndarray
+    abc: np.ndarray
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def class_counts(self):
+        return {str(cls): int((self.abc == cls).sum()) for cls in ABC_CLASSES}
+
+    def rows(self, abc=None, below_reorder_point=False):
+        """Dicts for the report page and the export, by class then revenue."""
+        mask = np.ones(len(self), dtype=bool)
+        if abc:
+            mask &= self.abc == abc
+        if below_reorder_point:
+            mask &= self.stock <= self.reorder_point
+        indexes = np.flatnonzero(mask)
+        indexes = indexes[np.lexsort((-self.revenue[indexes], self.abc[indexes]))]
+        return [
+            {
+                'product_id': self.product_ids[i],
+                'name': self.names[i],
+                'barcode': self.barcodes[i],
+                'unit': self.units[i],
+                'abc': str(self.abc[i]),
+                'stock': float(self.stock[i]),
+                'sold': float(self.sold[i]),
+                'revenue': float(self.revenue[i]),
+                'velocity': round(float(self.velocity[i]), 2),
+                'days_of_cover': None if np.isinf(self.days_of_cover[i]) else round(float(self.days_of_cover[i]), 1),
+                'reorder_point': float(self.reorder_point[i]),
+                'below_reorder_point': bool(self.stock[i] <= self.reorder_point[i]),
+            }
+            for i in indexes
+        ]
+
+
+def _classify_abc(revenue):
+    """A: products making the first 80% of revenue, B: the next 15%, C: the rest and non-sellers."""
+    abc = np.full(len(revenue), 'C')
+    total = revenue.sum()
+    if not total:
+        return abc
+    order = np.argsort(-revenue, kind='stable')
+    share = revenue[order] / total
+    before = np.cumsum(share) - share
+    abc[order] = ABC_CLASSES[np.searchsorted(ABC_CUTOFFS, before, side='right')]
+    abc[revenue <= 0] = 'C'
+    return abc
+
+
+def analytics_settings():
+    """(window_days, lead_time_days, service_levels) configured in settings."""
+    return (
+        getattr(settings, 'INVENTORY_WINDOW_DAYS', 90),
+        getattr(settings, 'INVENTORY_LEAD_TIME_DAYS', 7),
+        getattr(settings, 'INVENTORY_SERVICE_LEVELS', {'A': 1.65, 'B': 1.28, 'C': 0.84}),
+    )
+
+
+def compute_inventory_analytics(window_days=None, lead_time_days=None, service_levels=None, now=None):
+    """Metrics for the whole catalog from ``window_days`` of sale history.
+
+    The history is read with one grouped query (product, day) and the
+    catalog with another; everything else is array arithmetic.
+    """
+    default_window, default_lead_time, default_levels = analytics_settings()
+    window_days = window_days or default_window
+    lead_time_days = lead_time_days or default_lead_time
+    service_levels = service_levels or default_levels
+    since = (now or timezone.now()) - timedelta(days=window_days)
+
+    catalog = list(Product.objects.order_by().values_list('pk', 'name', 'barcode', 'unit', 'stock'))
+    product_ids = np.array([row[0] for row in catalog], dtype=object)
+    position = {pk: i for i, pk in enumerate(product_ids)}
+    n = len(catalog)
+
+    history = (
+        SaleItem.objects.filter(sale_items_between(since), product__isnull=False)
+        .annotate(day=TruncDate('sale__created_at'))
+        .values_list('product', 'day')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('line_total'))
+        .order_by()
+    )
+    rows = [(position[pk], quantity, revenue) for pk, _, quantity, revenue in history if pk in position]
+    index = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    daily = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    daily_revenue = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=len(rows))
+
+    sold = np.bincount(index, weights=daily, minlength=n)
+    revenue = np.bincount(index, weights=daily_revenue, minlength=n)
+    velocity = sold / window_days
+    # days without a row sold nothing, so E[x^2] over the window needs no padding
+    mean_square = np.bincount(index, weights=daily ** 2, minlength=n) / window_days
+    demand_std = np.sqrt(np.maximum(mean_square - velocity ** 2, 0))
+
+    stock = np.array([float(row[4]) for row in catalog], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.inf)
+
+    abc = _classify_abc(revenue)
+    z = np.array([service_levels[cls] for cls in abc], dtype=np.float64)
+    reorder_point = velocity * lead_time_days + z * demand_std * np.sqrt(lead_time_days)
+    units = np.array([row[3] for row in catalog], dtype=object)
+    reorder_point = np.where(units == Product.UnitChoices.piece, np.ceil(reorder_point), np.round(reorder_point, 1))
+
+    return InventoryAnalytics(
+        window_days=window_days,
+        lead_time_days=lead_time_days,
+        product_ids=product_ids,
+        names=np.array([row[1] for row in catalog], dtype=object),
+        barcodes=np.array([row[2] for row in catalog], dtype=object),
+        units=units,
+        stock=stock,
+        sold=sold,
+        revenue=revenue,
+        velocity=velocity,
+        demand_std=demand_std,
+        days_of_cover=days_of_cover,
+        reorder_point=reorder_point,
+        abc=abc,
+    )
+
+
+def store_reorder_points(analytics, batch_size=1000):
+    """Save the computed reorder points on Product, where ``is_low_stock`` reads them."""
+    products = [
+        Product(pk=pk, reorder_point=Decimal(str(point)).quantize(Decimal('0.1')))
+        for pk, point in zip(analytics.product_ids, analytics.reorder_point)
+    ]
+    # bulk_update leaves updated_at alone, so the tills' catalog sync is not disturbed
+    Product.objects.bulk_update(products, ['reorder_point'], batch_size=batch_size)
+    return len(products)
@@ -0,0 +1,192 @@
+import os
+import shutil
+import threading
+import traceback
+from datetime import date, timedelta
+from pathlib import Path
+
+from apps.models import Job, Purchase
+from apps.services.batch_documents import batch_document
+from apps.services.document_cache import document_cache
+from apps.services.documents import (
+    inventory_xlsx_document,
+    products_pdf_document,
+    products_xlsx_document,
+    purchase_document,
+    sales_export_document,
+)
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+# kind -> builds the job's Document from its params
+JOB_DOCUMENTS = {
+    'purchase-pdf': lambda params: purchase_document(Purchase.objects.get(pk=params['purchase'])),
+    'products-pdf': lambda params: products_pdf_document(),
+    'products-xlsx': lambda params: products_xlsx_document(),
+    'inventory-xlsx': lambda params: inventory_xlsx_document(date.fromisoformat(params['day'])),
+    'sales-export': lambda params: sales_export_document(
+        date.fromisoformat(params['start']), date.fromisoformat(params['end']), params.get('format', 'xlsx'),
+    ),
+    'batch-pdf': lambda params: batch_document(
+        date.fromisoformat(params['start']), date.fromisoformat(params['end']), params.get('format', 'zip'),
+        params.get('kinds', ['purchase', 'receipt']),
+    ),
+}
+
+
+def jobs_enabled():
+    return getattr(settings, 'BACKGROUND_JOBS', False)
+
+
+def results_dir():
+    return Path(getattr(settings, 'JOB_RESULTS_DIR', Path(settings.MEDIA_ROOT) / 'jobs'))
+
+
+def submit_job(kind, params, user=None):
+    """Queue a job; an identical job that is still queued or running is returned instead.
+
+    The unique constraint on pending jobs settles concurrent submissions:
+    the insert that loses returns the job of the one that won.
+    """
+    if kind not in JOB_DOCUMENTS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    pending = Job.objects.filter(
+        kind=kind, params=params, status__in=[Job.StatusChoices.QUEUED, Job.StatusChoices.RUNNING]
+    )
+    job = pending.first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(kind=kind, params=params, created_by=user)
+        except IntegrityError:
+            job = pending.first()
+            if job is None:
+                raise
+    return job
+
+
+def claim_job():
+    """Mark the oldest queued job running and return it, or None when the queue is empty.
+
+    SKIP LOCKED lets several workers claim at once without queueing behind
+    each other's row locks.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.StatusChoices.QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.StatusChoices.RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at', 'updated_at'])
+    return job
+
+
+def _store_result(job, path):
+    target = results_dir() / f"{job.pk}{path.suffix}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # a hard link keeps the result when the document cache evicts its copy
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(path, target)
+    return target
+
+
+class Heartbeat:
+    """Touch a running job's ``updated_at`` every ``interval`` seconds from a side thread.
+
+    ``requeue_stale`` reclaims only running jobs whose heartbeat stopped, so
+    a long render is not handed to a second worker while the first is alive.
+    """
+
+    def __init__(self, job, interval):
+        self.job = job
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{self.job.pk}', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                Job.objects.filter(pk=self.job.pk, status=Job.StatusChoices.RUNNING).update(updated_at=timezone.now())
+        finally:
+            # the thread's own connection
+            connection.close()
+
+
+def run_job(job):
+    """Render the job's document through the document cache and keep a copy as its result.
+
+    The outcome is written only while the job is still running under this
+    worker; if it was requeued meanwhile, the job is returned as it now stands.
+    """
+    changes = {}
+    try:
+        with Heartbeat(job, getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)):
+            document = JOB_DOCUMENTS[job.kind](job.params)
+            result = _store_result(job, document_cache.fetch(document))
+    except Exception:
+        retry = job.attempts < getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+        changes['status'] = Job.StatusChoices.QUEUED if retry else Job.StatusChoices.FAILED
+        changes['error'] = traceback.format_exc()
+    else:
+        changes['status'] = Job.StatusChoices.DONE
+        changes['result'] = str(result.relative_to(settings.MEDIA_ROOT))
+        changes['filename'] = document.filename
+        changes['content_type'] = document.content_type
+        changes['error'] = ''
+    changes['updated_at'] = timezone.now()
+    if changes['status'] != Job.StatusChoices.QUEUED:
+        changes['finished_at'] = changes['updated_at']
+
+    if Job.objects.filter(pk=job.pk, status=Job.StatusChoices.RUNNING).update(**changes):
+        for field, value in changes.items():
+            setattr(job, field, value)
+    else:
+        job.refresh_from_db()
+    return job
+
+
+def requeue_stale(now=None):
+    """Put running jobs whose worker stopped beating back in the queue, or fail them after the last attempt."""
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Job.StatusChoices.RUNNING,
+        updated_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', 300)),
+    )
+    max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.StatusChoices.FAILED, error="Vaqt tugadi", finished_at=now, updated_at=now,
+    )
+    requeued = stale.update(status=Job.StatusChoices.QUEUED, updated_at=now)
+    return requeued, failed
+
+
+def purge_finished(now=None):
+    """Delete finished jobs past JOB_RESULT_TTL_DAYS together with their result files."""
+    now = now or timezone.now()
+    old = Job.objects.filter(
+        status__in=[Job.StatusChoices.DONE, Job.StatusChoices.FAILED],
+        finished_at__lt=now - timedelta(days=getattr(settings, 'JOB_RESULT_TTL_DAYS', 7)),
+    )
+    for result in old.exclude(result='').values_list('result', flat=True):
+        (Path(settings.MEDIA_ROOT) / result).unlink(missing_ok=True)
+    return old.delete()[0]
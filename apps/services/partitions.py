@@ -0,0 +1,173 @@
+from datetime import date, datetime, time
+
+from apps.models import Sale, SaleItem
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+
+# Sale first: items are copied after the sales they belong to
+PARTITIONED_MODELS = (Sale, SaleItem)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(model, month):
+    return f"{model._meta.db_table}_p{month:%Y_%m}"
+
+
+def _bound(month):
+    # months start at local midnight, like the days of the reports
+    return timezone.make_aware(datetime.combine(month, time.min)).isoformat()
+
+
+def is_partitioned(model):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [model._meta.db_table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def existing_partitions(model):
+    """Months that have an attached partition of ``model``'s table, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{model._meta.db_table}_p"
+    months = []
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('_')
+            months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def create_partitions(first, last, models=PARTITIONED_MODELS):
+    """Create the missing monthly partitions of ``models`` from ``first``'s month to ``last``'s."""
+    qn = connection.ops.quote_name
+    created = []
+    with connection.cursor() as cursor:
+        for model in models:
+            existing = set(existing_partitions(model))
+            month = month_start(first)
+            while month <= last:
+                if month not in existing:
+                    name = partition_name(model, month)
+                    cursor.execute(
+                        f"CREATE TABLE {qn(name)} PARTITION OF {qn(model._meta.db_table)} "
+                        f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(add_months(month, 1))}')"
+                    )
+                    created.append(name)
+                month = add_months(month, 1)
+    return created
+
+
+def ensure_future_partitions(months_ahead=None, today=None):
+    """Partitions for this month and ``months_ahead`` more.
+
+    There is no default partition (it would rule out detaching
+    concurrently), so a sale in a month without a partition fails: run this
+    on a schedule well before the last month runs out.
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'SALES_PARTITION_MONTHS_AHEAD', 3)
+    today = today or timezone.localdate()
+    return create_partitions(today, add_months(month_start(today), months_ahead))
+
+
+def _rebuild_partitioned(model, first, last, cursor):
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = f"{table}_legacy"
+    cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+    cursor.execute(
+        f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    # unique constraints of a partitioned table must contain the partition key
+    cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, created_at)")
+    create_partitions(first, last, models=[model])
+    cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+    # CASCADE drops the foreign keys that point at the old table
+    cursor.execute(f"DROP TABLE {qn(legacy)} CASCADE")
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), MAX(id)) FROM {qn(table)} HAVING MAX(id) IS NOT NULL",
+            [table],
+        )
+
+    with connection.schema_editor() as editor:
+        for sql in editor._model_indexes_sql(model):
+            editor.execute(sql)
+        for field in model._meta.local_fields:
+            if field.remote_field and field.db_constraint and field.related_model not in PARTITIONED_MODELS:
+                editor.execute(editor._create_fk_sql(model, field, "_fk_%(to_table)s_%(to_column)s"))
+
+
+def convert_to_partitioned(months_ahead=None, today=None):
+    """Rebuild Sale and SaleItem as tables range-partitioned by month on ``created_at``.
+
+    Runs in one transaction and rewrites both tables, so it needs a
+    maintenance window; afterwards set ``SALES_PARTITIONED``. Each table is
+    renamed aside, recreated partitioned with an (id, created_at) primary
+    key, copied and dropped. A foreign key must reference a unique
+    constraint, which on a partitioned table has to include created_at, so
+    the keys pointing at the sales table (sale items, stock movements,
+    checkout requests) are dropped; Django still applies their on_delete.
+    """
+    today = today or timezone.localdate()
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'SALES_PARTITION_MONTHS_AHEAD', 3)
+
+    with transaction.atomic():
+        # the items' partition key, copied from their sale
+        SaleItem.objects.filter(created_at__isnull=True).update(
+            created_at=Subquery(Sale.objects.filter(pk=OuterRef('sale_id')).values('created_at')[:1])
+        )
+        span = Sale.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        first = timezone.localdate(span['first']) if span['first'] else today
+        last = max(timezone.localdate(span['last']) if span['last'] else today, today)
+        last = add_months(month_start(last), months_ahead)
+
+        with connection.cursor() as cursor:
+            for model in PARTITIONED_MODELS:
+                if not is_partitioned(model):
+                    _rebuild_partitioned(model, first, last, cursor)
+    return existing_partitions(Sale)
+
+
+def detach_partitions(before):
+    """Detach the partitions of months before ``before``'s month, for archiving.
+
+    ``DETACH PARTITION ... CONCURRENTLY`` (PostgreSQL 14+) does not block
+    reads or writes of the live tables while it waits for running queries,
+    and cannot run inside a transaction, so each partition is detached in
+    its own statement. The detached tables keep their names. Their sales
+    leave history and reports, while the daily summaries keep their totals.
+    """
+    if connection.in_atomic_block:
+        raise RuntimeError("Partitions cannot be detached concurrently inside a transaction.")
+    qn = connection.ops.quote_name
+    cutoff = month_start(before)
+    detached = []
+    with connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            for month in existing_partitions(model):
+                if month < cutoff:
+                    name = partition_name(model, month)
+                    cursor.execute(
+                        f"ALTER TABLE {qn(model._meta.db_table)} DETACH PARTITION {qn(name)} CONCURRENTLY"
+                    )
+                    detached.append(name)
+    return detached
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+from apps.models import Product
+from django.conf import settings
+
+
+def product_payload(product):
+    return {
+        "barcode": product.barcode,
+        "name": product.name,
+        "price": float(product.sell_price),
+        "stock": product.stock,
+        "unit": product.unit,
+    }
+
+
+class ProductLookupCache:
+    """In-process LRU of barcode -> till payload.
+
+    Every invalidation bumps ``version``; a row read from the database is only
+    stored if no invalidation happened while it was being read, so a scan that
+    races a stock change can never put the old row back. ``ttl`` bounds how
+    long another worker's changes can stay invisible to this process.
+    """
+
+    def __init__(self, maxsize=4096, ttl=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, barcodes):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            version = self.version
+            for barcode in barcodes:
+                entry = self._entries.get(barcode)
+                if entry is None or entry[0] < now:
+                    missing.append(barcode)
+                    continue
+                self._entries.move_to_end(barcode)
+                found[barcode] = entry[1]
+
+        if missing:
+            loaded = {
+                barcode: product_payload(product)
+                for barcode, product in Product.objects.in_bulk(missing, field_name='barcode').items()
+            }
+            with self._lock:
+                if version == self.version:
+                    for barcode, payload in loaded.items():
+                        self._store(barcode, payload, now)
+            found.update(loaded)
+
+        return found
+
+    def get(self, barcode):
+        return self.get_many([barcode]).get(barcode)
+
+    def _store(self, barcode, payload, now):
+        self._entries[barcode] = (now + self.ttl, payload)
+        self._entries.move_to_end(barcode)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, barcodes=None):
+        with self._lock:
+            self.version += 1
+            if barcodes is None:
+                self._entries.clear()
+                return
+            for barcode in barcodes:
+                self._entries.pop(barcode, None)
+
+
+product_cache = ProductLookupCache(
+    maxsize=getattr(settings, 'PRODUCT_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'PRODUCT_CACHE_TTL', 5),
+)
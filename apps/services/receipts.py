@@ -0,0 +1,132 @@
+from apps.models import Sale
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from apps.utils import to_decimal
+
+SHOP_LINES = ["DILYORBEK MARKET", "Farg'ona vil., Quva tumani", "Tel: +998 90 123 45 67"]
+THANKS_LINE = "Rahmat! Sizni kutib qolamiz!"
+
+# Uzbek apostrophes have no place in printer code pages
+APOSTROPHES = str.maketrans({"‘": "'", "’": "'", "ʻ": "'", "ʼ": "'", "`": "'"})
+
+# ESC @ resets the printer, ESC t 17 selects code page 866 (Latin and
+# Cyrillic); GS V 66 3 feeds three lines and cuts the paper
+ESCPOS_INIT = b"\x1b@\x1bt\x11"
+ESCPOS_ENCODING = 'cp866'
+ESCPOS_CUT = b"\x1dVB\x03"
+
+
+def format_quantity(quantity):
+    return format(to_decimal(quantity).normalize(), 'f')
+
+
+def format_amount(amount):
+    return f"{int(amount):,}"
+
+
+class ReceiptLayout:
+    """The fixed parts of the text receipt for a printer ``columns`` characters wide.
+
+    Everything that does not depend on the sale (centred header and footer,
+    rules, the column format of item rows) is built once here, so rendering
+    a receipt is a few string formats and one join.
+    """
+
+    QTY_WIDTH = 6
+    PRICE_WIDTH = 9
+    TOTAL_WIDTH = 11
+
+    def __init__(self, columns=48):
+        self.columns = columns
+        self.name_width = columns - self.QTY_WIDTH - self.PRICE_WIDTH - self.TOTAL_WIDTH - 3
+        self.row = f"{{:<{self.name_width}}} {{:>{self.QTY_WIDTH}}} {{:>{self.PRICE_WIDTH}}} {{:>{self.TOTAL_WIDTH}}}"
+        self.rule = "-" * columns
+        self.header = "\n".join(line.center(columns).rstrip() for line in SHOP_LINES) + "\n"
+        self.table_head = "\n".join([self.rule, self.row.format("Mahsulot", "Soni", "Narx", "Jami"), self.rule])
+        self.total = f"{{:>{columns}}}"
+        self.footer = "=" * columns
+        self.thanks = THANKS_LINE.center(columns).rstrip()
+
+    def render(self, sale, items):
+        """Plain-text receipt of ``sale`` with its ``items``, lines ending in newlines."""
+        lines = [
+            self.header,
+            f"Sana: {timezone.localtime(sale.created_at):%Y-%m-%d %H:%M}",
+            f"Kassir: {sale.cashier.username if sale.cashier else '-'}",
+            f"To'lov: {sale.get_payment_type_display()}",
+        ]
+        if sale.payment_type in [Sale.PAYMENT.CASH, Sale.PAYMENT.CARD]:
+            lines.append(f"Berilgan summa: {format_amount(sale.paid_amount)}")
+            lines.append(f"Qaytim: {format_amount(to_decimal(sale.paid_amount) - to_decimal(sale.total_amount))}")
+        lines.append(self.table_head)
+
+        width = self.name_width
+        for item in items:
+            name = (item.product.name if item.product else "-").translate(APOSTROPHES)
+            lines.append(self.row.format(
+                name[:width], format_quantity(item.quantity), format_amount(item.price), format_amount(item.line_total),
+            ))
+            lines.extend(name[i:i + width].lstrip() for i in range(width, len(name), width))
+
+        lines.append(self.footer)
+        lines.append(self.total.format(f"Jami: {format_amount(sale.total_amount)} so'm"))
+        lines.append("")
+        lines.append(self.thanks)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def escpos(text):
+        """``text`` as the bytes an ESC/POS printer takes, ending in a paper cut."""
+        return ESCPOS_INIT + text.encode(ESCPOS_ENCODING, errors='replace') + ESCPOS_CUT
+
+
+class ReceiptStore:
+    """Text receipts kept in a Django cache, keyed by sale.
+
+    Checkouts store the receipts of their sales as they commit, from the
+    objects already in memory, so the till's request for the receipt finds
+    it ready. A miss (an expired or evicted entry, or a sale made before
+    this store existed) renders it from the database and stores it.
+    """
+
+    def __init__(self, layout, alias='default', timeout=24 * 3600):
+        self.layout = layout
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(sale_id):
+        return f"receipt:{sale_id}"
+
+    def prepare(self, sales, items):
+        by_sale = {sale.pk: [] for sale in sales}
+        for item in items:
+            by_sale[item.sale.pk].append(item)
+        self.cache.set_many(
+            {self.key(sale.pk): self.layout.render(sale, by_sale[sale.pk]) for sale in sales}, self.timeout
+        )
+
+    def get(self, sale_id):
+        key = self.key(sale_id)
+        text = self.cache.get(key)
+        if text is None:
+            sale = Sale.objects.select_related('cashier').get(pk=sale_id)
+            items = sale.items.select_related('product').order_by('pk')
+            text = self.layout.render(sale, items)
+            self.cache.set(key, text, self.timeout)
+        return text
+
+    def forget(self, sale_id):
+        self.cache.delete(self.key(sale_id))
+
+
+receipt_store = ReceiptStore(
+    ReceiptLayout(getattr(settings, 'RECEIPT_COLUMNS', 48)),
+    timeout=getattr(settings, 'RECEIPT_CACHE_TIMEOUT', 24 * 3600),
+)
@@ -0,0 +1,203 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.models import DailySalesSummary, Product, Sale, SaleItem, User
+from apps.services.dates import day_bounds
+from apps.services.sales_summary import day_runs, sale_items_between
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+TOP_PRODUCTS = 5
+
+
+@dataclass
+class Metrics:
+    revenue: Decimal = Decimal('0.00')
+    cogs: Decimal = Decimal('0.00')
+    expenses: Decimal = Decimal('0.00')
+    sale_count: int = 0
+    by_payment: dict = field(default_factory=dict)
+
+    @property
+    def profit(self):
+        return self.revenue - self.cogs
+
+    @property
+    def net(self):
+        return self.profit - self.expenses
+
+    def add(self, summary):
+        self.revenue += summary.revenue
+        self.cogs += summary.cogs
+        self.expenses += summary.expenses
+        self.sale_count += summary.sale_count
+        for payment_type in Sale.PAYMENT.values:
+            amount = getattr(summary, f"{payment_type}_revenue")
+            if amount:
+                self.by_payment[payment_type] = self.by_payment.get(payment_type, Decimal('0.00')) + amount
+
+
+@dataclass
+class ProductStat:
+    name: str
+    quantity: Decimal
+
+
+@dataclass
+class CashierStat:
+    username: str
+    total: Decimal
+
+
+@dataclass
+class SalesReport:
+    start: object
+    end: object
+    totals: Metrics
+    today: Metrics
+    days: list
+    top_products: list
+    cashiers: list
+
+
+def _breakdowns_postgresql(ranges):
+    items = connection.ops.quote_name(SaleItem._meta.db_table)
+    sales = connection.ops.quote_name(Sale._meta.db_table)
+    products = connection.ops.quote_name(Product._meta.db_table)
+    users = connection.ops.quote_name(User._meta.db_table)
+    window = "s.created_at >= %s AND s.created_at < %s"
+    partitioned = getattr(settings, 'SALES_PARTITIONED', False)
+    if partitioned:
+        window += " AND i.created_at >= %s AND i.created_at < %s"
+    where = " OR ".join([f"({window})"] * len(ranges))
+    sql = (
+        f"SELECT d.day, GROUPING(p.name) = 0, p.name, u.username, SUM(i.quantity), SUM(i.line_total) "
+        f"FROM {items} i JOIN {sales} s ON s.id = i.sale_id "
+        f"CROSS JOIN LATERAL (SELECT (s.created_at AT TIME ZONE %s)::date AS day) d "
+        f"LEFT JOIN {products} p ON p.id = i.product_id "
+        f"LEFT JOIN {users} u ON u.id = s.cashier_id "
+        f"WHERE {where} "
+        f"GROUP BY GROUPING SETS ((d.day, p.name), (d.day, u.username))"
+    )
+    params = [timezone.get_current_timezone_name()]
+    for bounds in ranges:
+        params += [*bounds, *bounds] if partitioned else [*bounds]
+    result = defaultdict(_empty_breakdown)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for day, is_product, name, username, quantity, revenue in cursor.fetchall():
+            if is_product:
+                result[day]['products'][name] = quantity
+            else:
+                result[day]['cashiers'][username] = revenue
+    return result
+
+
+def _breakdowns_generic(ranges):
+    within = Q()
+    for low, high in ranges:
+        within |= sale_items_between(low, high)
+    rows = (
+        SaleItem.objects.filter(within)
+        .annotate(day=TruncDate('sale__created_at'))
+        .values('day', 'product__name', 'sale__cashier__username')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            revenue=Sum('line_total'),
+        )
+        .order_by()
+    )
+    result = defaultdict(_empty_breakdown)
+    for row in rows:
+        breakdown = result[row['day']]
+        name, username = row['product__name'], row['sale__cashier__username']
+        breakdown['products'][name] = breakdown['products'].get(name, 0) + (row['total_quantity'] or 0)
+        breakdown['cashiers'][username] = breakdown['cashiers'].get(username, 0) + (row['revenue'] or 0)
+    return result
+
+
+def _empty_breakdown():
+    return {'products': {}, 'cashiers': {}}
+
+
+def _day_cache_key(summary):
+    return f"report-day:{summary.day.isoformat()}:{summary.updated_at.timestamp()}"
+
+
+def day_breakdowns(days, summaries, today):
+    """Quantity per product and revenue per cashier for each of ``days``.
+
+    Breakdowns of closed days are cached without expiry under the day's
+    summary ``updated_at``: a back-dated edit refreshes the summary, which
+    moves the day to a new key, so nothing has to be invalidated. Today and
+    days without a summary row yet are always scanned; the misses are read
+    with one query.
+    """
+    keys, result = {}, {}
+    for day in days:
+        summary = summaries.get(day)
+        if summary is not None and not summary.sale_count:
+            result[day] = _empty_breakdown()
+        elif summary is not None and day < today:
+            keys[day] = _day_cache_key(summary)
+
+    cached = cache.get_many(list(keys.values()))
+    for day, key in keys.items():
+        if key in cached:
+            result[day] = cached[key]
+
+    missing = [day for day in days if day not in result]
+    if missing:
+        breakdowns = _breakdowns_postgresql if connection.vendor == 'postgresql' else _breakdowns_generic
+        scanned = breakdowns([day_bounds(first, last) for first, last in day_runs(missing)])
+        for day in missing:
+            result[day] = scanned.get(day) or _empty_breakdown()
+        cache.set_many({keys[day]: result[day] for day in missing if day in keys}, timeout=None)
+    return result
+
+
+def build_report(start, end, today):
+    """Everything ReportsView shows for ``start``..``end``.
+
+    Money figures, the daily trend and the payment split are summed from the
+    daily rollup (one read covering the range and ``today``). The top
+    products and the per-cashier totals come from per-day breakdowns, cached
+    for closed days, so a long range costs about as much as today alone.
+    """
+    totals, today_metrics, days = Metrics(), Metrics(), []
+    summaries = {
+        summary.day: summary
+        for summary in DailySalesSummary.objects.filter(day__gte=min(start, today), day__lte=max(end, today))
+    }
+    for summary in summaries.values():
+        if summary.day == today:
+            today_metrics.add(summary)
+        if start <= summary.day <= end:
+            totals.add(summary)
+            if summary.sale_count:
+                day = Metrics()
+                day.add(summary)
+                days.append((summary.day, day))
+
+    range_days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    by_product, by_cashier = defaultdict(Decimal), defaultdict(Decimal)
+    for breakdown in day_breakdowns(range_days, summaries, today).values():
+        for name, quantity in breakdown['products'].items():
+            by_product[name] += quantity or 0
+        for username, revenue in breakdown['cashiers'].items():
+            by_cashier[username] += revenue or 0
+
+    top_products = sorted(
+        (ProductStat(name, quantity) for name, quantity in by_product.items() if quantity),
+        key=lambda stat: stat.quantity,
+        reverse=True,
+    )[:TOP_PRODUCTS]
+    cashiers = [CashierStat(username, total) for username, total in by_cashier.items()]
+
+    return SalesReport(start, end, totals, today_metrics, days, top_products, cashiers)
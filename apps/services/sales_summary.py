@@ -0,0 +1,246 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.models import DailySalesSummary, PurchaseItem, Sale, SaleItem
+from apps.services.dates import day_bounds
+from apps.services.totals import mark_dirty
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+SUMMARY_FIELDS = [
+    'revenue', 'cogs', 'expenses', 'sale_count', 'cash_revenue', 'card_revenue', 'credit_revenue',
+]
+REBUILD_CHUNK_DAYS = 31
+
+
+class SummaryLockMetrics:
+    """Time checkouts spend adding to a day row, shared by all threads of the process.
+
+    An increment slower than ``wait_threshold`` seconds is counted as a lock
+    wait: the UPDATE touches one row, so it only takes that long queued
+    behind another transaction holding the day. ``manage.py bench_checkout``
+    reports these numbers.
+    """
+
+    def __init__(self, wait_threshold=0.005):
+        self.wait_threshold = wait_threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, elapsed):
+        with self._lock:
+            self._counters['updates'] += 1
+            if elapsed >= self.wait_threshold:
+                self._counters['lock_waits'] += 1
+                self._counters['wait_seconds'] += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {'updates': 0, 'lock_waits': 0, 'wait_seconds': 0.0}
+
+
+# same threshold as the guarded stock updates, which wait on row locks the same way
+summary_metrics = SummaryLockMetrics(wait_threshold=getattr(settings, 'STOCK_LOCK_WAIT_THRESHOLD', 0.005))
+
+
+def sale_items_between(low, high=None):
+    """Filter for sale items whose sale falls in [low, high).
+
+    With ``SALES_PARTITIONED`` the items' own copy of the sale time is
+    bounded too: a bound on the joined sale only prunes sale partitions.
+    """
+    window = Q(sale__created_at__gte=low)
+    if high is not None:
+        window &= Q(sale__created_at__lt=high)
+    if getattr(settings, 'SALES_PARTITIONED', False):
+        window &= Q(created_at__gte=low)
+        if high is not None:
+            window &= Q(created_at__lt=high)
+    return window
+
+
+def mark_day_dirty(moment, using=None):
+    """Schedule the summary of the local day of ``moment`` for a refresh on commit."""
+    if moment is not None:
+        mark_dirty(DailySalesSummary, timezone.localdate(moment), using=using)
+
+
+def sale_deltas(sales, items):
+    """What ``sales`` with their ``items`` add to each day's summary, as {day: {field: increment}}."""
+    deltas = {}
+
+    def row(sale):
+        day = timezone.localdate(sale.created_at)
+        return deltas.setdefault(day, {field: Decimal('0.00') for field in SUMMARY_FIELDS} | {'sale_count': 0})
+
+    for sale in sales:
+        row(sale)['sale_count'] += 1
+    for item in items:
+        summary = row(item.sale)
+        summary['revenue'] += item.line_total
+        summary['cogs'] += item.line_cost
+        payment_field = f"{item.sale.payment_type}_revenue"
+        if payment_field in summary:
+            summary[payment_field] += item.line_total
+    # expenses come from purchases, which still go through mark_day_dirty
+    for summary in deltas.values():
+        del summary['expenses']
+    return deltas
+
+
+def add_to_summaries(deltas, using=None):
+    """Add ``deltas`` to the day rows with one ``UPDATE ... SET f = f + x`` per day.
+
+    New sales only ever add to a day, so the checkout path applies what they
+    add instead of re-aggregating the whole day on every sale; edits and
+    deletes still recompute through ``mark_day_dirty``. A day without a row
+    yet gets one holding the increments, which assumes the day had no sales
+    before it (``rebuild_sales_summary`` repairs a range that did).
+
+    It runs inside the checkout's transaction, as its last statement, so the
+    day row is held only for the commit that follows. Applying the deltas
+    after the commit instead would count a sale twice whenever
+    ``summarize_range`` read the committed sale before its increment landed.
+    With ``CHECKOUT_GROUP_COMMIT`` a whole group adds one UPDATE per day.
+    ``summary_metrics`` counts how often the row was actually waited for.
+    """
+    summaries = DailySalesSummary.objects.using(using)
+    now = timezone.now()
+    for day, values in deltas.items():
+        increments = {field: F(field) + value for field, value in values.items()}
+        started = time.perf_counter()
+        updated = summaries.filter(day=day).update(**increments, updated_at=now)
+        summary_metrics.record(time.perf_counter() - started)
+        if updated:
+            continue
+        try:
+            with transaction.atomic(using=using):
+                summaries.create(day=day, **values)
+        except IntegrityError:
+            # another checkout created the row first
+            summaries.filter(day=day).update(**increments, updated_at=now)
+
+
+def day_runs(days):
+    """Split ``days`` into contiguous (first, last) runs."""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def _compute(start, end, using):
+    low, high = day_bounds(start, end)
+    rows = {}
+
+    def row(day):
+        return rows.setdefault(day, {field: Decimal('0.00') for field in SUMMARY_FIELDS} | {'sale_count': 0})
+
+    # Revenue is summed from the lines rather than Sale.total_amount so the
+    # result does not depend on the order dirty totals are flushed in. Both
+    # sums read stored line columns, so Product is not joined.
+    lines = (
+        SaleItem.objects.using(using)
+        .filter(sale_items_between(low, high))
+        .annotate(day=TruncDate('sale__created_at'))
+        .values('day', 'sale__payment_type')
+        .annotate(
+            revenue=Sum('line_total'),
+            cogs=Sum('line_cost'),
+        )
+        .order_by()
+    )
+    for line in lines:
+        summary = row(line['day'])
+        revenue = line['revenue'] or Decimal('0.00')
+        summary['revenue'] += revenue
+        summary['cogs'] += line['cogs'] or Decimal('0.00')
+        payment_field = f"{line['sale__payment_type']}_revenue"
+        if payment_field in summary:
+            summary[payment_field] += revenue
+
+    counts = (
+        Sale.objects.using(using)
+        .filter(created_at__gte=low, created_at__lt=high)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    for count in counts:
+        row(count['day'])['sale_count'] = count['count']
+
+    expenses = (
+        PurchaseItem.objects.using(using)
+        .filter(purchase__purchased_at__gte=low, purchase__purchased_at__lt=high)
+        .annotate(day=TruncDate('purchase__purchased_at'))
+        .values('day')
+        .annotate(total=Sum(F('quantity') * F('cost_price'), output_field=DecimalField()))
+        .order_by()
+    )
+    for expense in expenses:
+        row(expense['day'])['expenses'] = expense['total'] or Decimal('0.00')
+
+    return rows
+
+
+def summarize_range(start, end, using=None):
+    """Recompute every day from ``start`` to ``end`` inclusive; days without activity get zeros.
+
+    The day rows are created if missing and locked before the sales are
+    read. A checkout adding to one of them has then either committed, and
+    its sale is in the recomputed totals, or waits for the lock and adds its
+    increment on top of them; without the lock an increment committed
+    between the read and the write would be overwritten.
+    """
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    summaries = DailySalesSummary.objects.using(using)
+    with transaction.atomic(using=using):
+        summaries.bulk_create([DailySalesSummary(day=day) for day in days], ignore_conflicts=True)
+        list(summaries.select_for_update().filter(day__gte=start, day__lte=end).order_by('day').values_list('pk'))
+
+        rows = _compute(start, end, using)
+        summaries.bulk_create(
+            [DailySalesSummary(day=day, **(rows.get(day) or {field: 0 for field in SUMMARY_FIELDS})) for day in days],
+            update_conflicts=True,
+            unique_fields=['day'],
+            update_fields=SUMMARY_FIELDS + ['updated_at'],
+        )
+    return len(days)
+
+
+def summarize_days(days, using=None):
+    return sum(summarize_range(first, last, using=using) for first, last in day_runs(days))
+
+
+def rebuild_summaries(start, end, chunk_days=REBUILD_CHUNK_DAYS):
+    """Recompute ``start``..``end`` in chunks, one transaction per chunk."""
+    done = 0
+    while start <= end:
+        last = min(start + timedelta(days=chunk_days - 1), end)
+        with transaction.atomic():
+            done += summarize_range(start, last)
+        start = last + timedelta(days=1)
+    return done
+
+
+def summaries_between(start, end):
+    """Summary rows of ``start``..``end``, one per day that has one."""
+    return DailySalesSummary.objects.filter(day__gte=start, day__lte=end)
+
+
+def summary_totals(start, end):
+    totals = summaries_between(start, end).aggregate(**{field: Sum(field) for field in SUMMARY_FIELDS})
+    return {field: value or 0 for field, value in totals.items()}
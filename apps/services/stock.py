@@ -0,0 +1,348 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.models import Product, PurchaseItem, StockBalance, StockMovement, StockRollupGap, StockSnapshot
+from apps.services.product_cache import product_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from apps.utils import to_decimal
+
+# Movements younger than this are left out of a rollup: their ids may belong
+# to transactions that have not committed yet. Readers add the un-rolled tail
+# themselves, so this only delays the rollup, never the numbers.
+ROLLUP_LAG = timedelta(seconds=60)
+# The lag is only a guess, so ids a rollup passes without a row are kept as
+# gaps (StockRollupGap) and picked up if the movement commits later. A gap
+# still empty after this long is taken to be a rolled-back insert.
+ROLLUP_GAP_EXPIRY = timedelta(hours=1)
+
+
+def build_movements(quantities, kind, sale=None, purchase=None):
+    """One unsaved movement per product; ``quantities`` maps product pk -> signed quantity."""
+    return [
+        StockMovement(product_id=pk, kind=kind, quantity=quantity, sale=sale, purchase=purchase)
+        for pk, quantity in quantities.items()
+        if quantity
+    ]
+
+
+def record_movements(quantities, kind, sale=None, purchase=None):
+    StockMovement.objects.bulk_create(build_movements(quantities, kind, sale=sale, purchase=purchase))
+
+
+class InsufficientStockError(ValueError):
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f"Insufficient stock: {len(self.product_ids)} product(s)")
+
+
+class StockMetrics:
+    """Per-product counters of guarded stock updates, shared by all threads of the process.
+
+    A statement that took longer than ``wait_threshold`` seconds is counted as
+    a lock wait for every product it touched: without SELECT ... FOR UPDATE the
+    only time spent waiting is on another transaction's row lock.
+    """
+
+    def __init__(self, wait_threshold=0.005):
+        self.wait_threshold = wait_threshold
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'attempts': 0, 'failed': 0, 'lock_waits': 0, 'wait_seconds': 0.0})
+
+    def record(self, product_ids, failed_ids, elapsed):
+        waited = elapsed >= self.wait_threshold
+        with self._lock:
+            for pk in product_ids:
+                counters = self._counters[pk]
+                counters['attempts'] += 1
+                if waited:
+                    counters['lock_waits'] += 1
+                    counters['wait_seconds'] += elapsed
+            for pk in failed_ids:
+                self._counters[pk]['failed'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {pk: dict(counters) for pk, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stock_metrics = StockMetrics(wait_threshold=getattr(settings, 'STOCK_LOCK_WAIT_THRESHOLD', 0.005))
+
+
+def _update_stock_postgresql(quantities, sign, guarded):
+    table = connection.ops.quote_name(Product._meta.db_table)
+    values = ", ".join(["(%s::uuid, %s::numeric)"] * len(quantities))
+    params = [value for pk, quantity in quantities.items() for value in (str(pk), quantity)]
+    sql = (
+        f"UPDATE {table} AS p SET stock = p.stock {sign} v.quantity, updated_at = NOW() "
+        f"FROM (VALUES {values}) AS v(id, quantity) "
+        f"WHERE p.id = v.id{' AND p.stock >= v.quantity' if guarded else ''} "
+        f"RETURNING p.id, p.stock, p.barcode"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _update_stock_generic(quantities, sign, guarded):
+    rows = []
+    for pk, quantity in quantities.items():
+        products = Product.objects.filter(pk=pk)
+        if guarded:
+            products = products.filter(stock__gte=quantity)
+        change = F('stock') - quantity if sign == '-' else F('stock') + quantity
+        if products.update(stock=change, updated_at=Now()):
+            rows.extend(Product.objects.filter(pk=pk).values_list('pk', 'stock', 'barcode'))
+    return rows
+
+
+def _update_stock(quantities, sign, guarded):
+    """Apply ``quantities`` in one ``UPDATE ... RETURNING``; returns {pk: new stock} of the rows changed."""
+    quantities = {pk: to_decimal(quantity) for pk, quantity in quantities.items()}
+    if not quantities:
+        return {}
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise ValueError("Quantity must be positive")
+
+    update = _update_stock_postgresql if connection.vendor == 'postgresql' else _update_stock_generic
+    started = time.perf_counter()
+    rows = update(quantities, sign, guarded)
+    elapsed = time.perf_counter() - started
+
+    updated = {pk: stock for pk, stock, _ in rows}
+    stock_metrics.record(quantities, [pk for pk in quantities if pk not in updated], elapsed)
+
+    barcodes = [barcode for _, _, barcode in rows]
+    transaction.on_commit(lambda: product_cache.invalidate(barcodes), robust=True)
+    return updated
+
+
+def decrease_stock_many(quantities):
+    """Decrease stock of many products with one guarded UPDATE.
+
+    Either every product had enough stock and all rows are changed, or
+    InsufficientStockError is raised and none of them are.
+    """
+    with transaction.atomic():
+        updated = _update_stock(quantities, '-', guarded=True)
+        failed = [pk for pk in quantities if pk not in updated]
+        if failed:
+            raise InsufficientStockError(failed)
+    return updated
+
+
+def increase_stock_many(quantities):
+    return _update_stock(quantities, '+', guarded=False)
+
+
+def decrease_stock(product_id, quantity, kind=StockMovement.KindChoices.SALE, sale=None):
+    """Decrease ``Product.stock`` (guarded) and record the movement, in one transaction."""
+    with transaction.atomic():
+        stock = decrease_stock_many({product_id: quantity})[product_id]
+        record_movements({product_id: -to_decimal(quantity)}, kind, sale=sale)
+    return stock
+
+
+def increase_stock(product_id, quantity, kind=StockMovement.KindChoices.PURCHASE, purchase=None):
+    """Increase ``Product.stock`` and record the movement, in one transaction."""
+    with transaction.atomic():
+        stock = increase_stock_many({product_id: quantity})[product_id]
+        record_movements({product_id: to_decimal(quantity)}, kind, purchase=purchase)
+    return stock
+
+
+def receive_purchase(purchase):
+    quantities = dict(
+        PurchaseItem.objects.filter(purchase=purchase)
+        .values_list('product')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    with transaction.atomic():
+        increase_stock_many(quantities)
+        record_movements(quantities, StockMovement.KindChoices.PURCHASE, purchase=purchase)
+    return quantities
+
+
+def _tail(after_id, until=None, product_ids=None, gaps=None):
+    """Movements past ``after_id``, plus those whose ids are in ``gaps``, summed per product."""
+    window = Q(id__gt=after_id)
+    if gaps is not None:
+        window |= Q(id__in=gaps.values('movement_id'))
+    movements = StockMovement.objects.filter(window)
+    if until is not None:
+        movements = movements.filter(created_at__lte=until)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return dict(movements.values_list('product').annotate(total=Sum('quantity')).order_by())
+
+
+def _open_gaps():
+    return StockRollupGap.objects.filter(filled_at__isnull=True)
+
+
+def _gaps_open_at(moment):
+    return StockRollupGap.objects.filter(Q(noted_at__lte=moment), Q(filled_at__isnull=True) | Q(filled_at__gt=moment))
+
+
+def rollup_balances(lag=ROLLUP_LAG):
+    """Fold movements committed since the last rollup into StockBalance.
+
+    Only products that moved are touched. Ids between the last watermark and
+    the new one that have no row yet are noted as gaps, and a gap whose
+    movement has committed since is folded in by a later rollup, so a
+    movement is counted exactly once however late it commits. Meant to run
+    from a single scheduler (``manage.py stock_rollup``), not concurrently.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        watermark = StockBalance.objects.aggregate(last=Max('last_movement_id'))['last'] or 0
+        high = StockMovement.objects.filter(
+            id__gt=watermark, created_at__lt=now - lag
+        ).aggregate(last=Max('id'))['last'] or watermark
+        gaps = set(_open_gaps().select_for_update().values_list('movement_id', flat=True))
+
+        window = StockMovement.objects.filter(Q(id__gt=watermark, id__lte=high) | Q(id__in=gaps))
+        deltas = dict(window.values_list('product').annotate(total=Sum('quantity')).order_by())
+
+        passed = StockMovement.objects.filter(id__gt=watermark, id__lte=high)
+        if passed.count() < high - watermark:
+            seen = set(passed.values_list('id', flat=True))
+            missing = [pk for pk in range(watermark + 1, high + 1) if pk not in seen]
+            StockRollupGap.objects.bulk_create(
+                [StockRollupGap(movement_id=pk, noted_at=now) for pk in missing], ignore_conflicts=True,
+            )
+        if gaps:
+            filled = StockMovement.objects.filter(id__in=gaps).values('id')
+            StockRollupGap.objects.filter(movement_id__in=filled).update(filled_at=now)
+        _open_gaps().filter(noted_at__lt=now - ROLLUP_GAP_EXPIRY).delete()
+
+        if not deltas:
+            return 0
+        balances = StockBalance.objects.select_for_update().in_bulk(list(deltas))
+        StockBalance.objects.bulk_create(
+            [
+                StockBalance(
+                    product_id=pk,
+                    quantity=(balances[pk].quantity if pk in balances else Decimal('0.00')) + delta,
+                    last_movement_id=high,
+                )
+                for pk, delta in deltas.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['quantity', 'last_movement_id', 'updated_at'],
+        )
+        return len(deltas)
+
+
+def current_balances(product_ids=None):
+    """Ledger balance per product: rolled-up total plus the movements after it.
+
+    A rollup stamps every product it touches with the same watermark, and
+    products it skips had no movements up to it, so the newest watermark is
+    a valid starting point for every product's tail.
+    """
+    balances = StockBalance.objects.all()
+    if product_ids is not None:
+        balances = balances.filter(product_id__in=product_ids)
+    result = dict(balances.values_list('product', 'quantity'))
+    watermark = StockBalance.objects.aggregate(last=Max('last_movement_id'))['last'] or 0
+
+    for pk, total in _tail(watermark, product_ids=product_ids, gaps=_open_gaps()).items():
+        result[pk] = result.get(pk, Decimal('0.00')) + total
+    return result
+
+
+def take_snapshot(taken_at=None):
+    """Store every product's balance as of the latest rollup."""
+    rollup_balances()
+    taken_at = taken_at or timezone.now()
+    snapshots = [
+        StockSnapshot(
+            product_id=b.product_id,
+            taken_at=taken_at,
+            quantity=b.quantity,
+            last_movement_id=b.last_movement_id,
+        )
+        for b in StockBalance.objects.all()
+    ]
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def stock_as_of(when, product_ids=None):
+    """Stock per product at ``when``: the nearest earlier snapshot plus the movements after it."""
+    taken_at = StockSnapshot.objects.filter(taken_at__lte=when).aggregate(last=Max('taken_at'))['last']
+    result, after_id = {}, 0
+    if taken_at is not None:
+        snapshots = StockSnapshot.objects.filter(taken_at=taken_at)
+        if product_ids is not None:
+            snapshots = snapshots.filter(product_id__in=product_ids)
+        rows = list(snapshots.values_list('product', 'quantity', 'last_movement_id'))
+        result = {pk: quantity for pk, quantity, _ in rows}
+        after_id = max((last for _, _, last in rows), default=0)
+
+    gaps = _gaps_open_at(taken_at) if taken_at is not None else None
+    for pk, total in _tail(after_id, until=when, product_ids=product_ids, gaps=gaps).items():
+        result[pk] = result.get(pk, Decimal('0.00')) + total
+    return result
+
+
+def repair_drift():
+    """Correct rolled-up balances that disagree with the movements they cover; returns {pk: difference}.
+
+    A balance must equal the sum of its product's movements up to the
+    watermark, less the open gaps. A difference means a movement was never
+    counted: it committed after its gap expired, or before gaps were kept.
+    """
+    with transaction.atomic():
+        balances = dict(StockBalance.objects.select_for_update().values_list('product', 'quantity'))
+        watermark = StockBalance.objects.aggregate(last=Max('last_movement_id'))['last'] or 0
+        covered = dict(
+            StockMovement.objects.filter(id__lte=watermark)
+            .exclude(id__in=_open_gaps().values('movement_id'))
+            .values_list('product')
+            .annotate(total=Sum('quantity'))
+            .order_by()
+        )
+        drift = {}
+        for pk in balances.keys() | covered.keys():
+            difference = covered.get(pk, Decimal('0.00')) - balances.get(pk, Decimal('0.00'))
+            if difference:
+                drift[pk] = difference
+        for pk, difference in drift.items():
+            if pk in balances:
+                StockBalance.objects.filter(pk=pk).update(quantity=F('quantity') + difference)
+            else:
+                StockBalance.objects.create(product_id=pk, quantity=difference, last_movement_id=watermark)
+    return drift
+
+
+def reconcile():
+    """Repair drifted balances, then record ADJUSTMENT movements wherever the ledger disagrees with Product.stock.
+
+    Run once to open the ledger for existing stock, and afterwards to absorb
+    edits made outside the stock API (admin, fixtures). Returns the number of
+    products adjusted and the drift that was repaired ({pk: difference}).
+    """
+    drift = repair_drift()
+    ledger = current_balances()
+    adjustments = {}
+    for pk, stock in Product.objects.values_list('pk', 'stock'):
+        difference = stock - ledger.get(pk, Decimal('0.00'))
+        if difference:
+            adjustments[pk] = difference
+    record_movements(adjustments, StockMovement.KindChoices.ADJUSTMENT)
+    return len(adjustments), drift
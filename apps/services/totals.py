@@ -0,0 +1,53 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_local = threading.local()
+
+
+class DirtyTotals:
+    """Parents whose totals must be recomputed when the current transaction commits."""
+
+    def __init__(self, using):
+        self.using = using
+        self.pending = {}
+
+    def add(self, model, pk):
+        self.pending.setdefault(model, set()).add(pk)
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for model, pks in pending.items():
+            model.refresh_totals(pks, using=self.using)
+
+
+def _is_scheduled(batch, using):
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return False
+    # Callbacks registered inside a savepoint that was rolled back are dropped
+    # from run_on_commit, so membership tells whether the flush will still run.
+    return any(entry[1] == batch.flush for entry in connection.run_on_commit)
+
+
+def mark_dirty(model, pk, using=None):
+    """Schedule ``model.refresh_totals`` for ``pk`` once per transaction.
+
+    Every item write of the same parent inside one transaction collapses into
+    a single aggregate UPDATE run on commit (immediately in autocommit mode).
+    """
+    if pk is None:
+        return
+    using = using or DEFAULT_DB_ALIAS
+    batches = _local.__dict__.setdefault('batches', {})
+
+    batch = batches.get(using)
+    if batch is not None and _is_scheduled(batch, using):
+        batch.add(model, pk)
+        return
+
+    batch = batches[using] = DirtyTotals(using)
+    batch.add(model, pk)
+    # robust: the rows are committed by then, so a failed refresh is logged
+    # instead of raised into a caller whose write already succeeded
+    transaction.on_commit(batch.flush, using=using, robust=True)
@@ -1,25 +1,68 @@
-from apps.models import SaleItem, Debt
-from django.db.models.signals import post_delete, post_save, pre_save
+from apps.models import Product, Purchase, PurchaseItem, Sale, SaleItem, StockMovement
+from apps.services.product_cache import product_cache
+from apps.services.receipts import receipt_store
+from apps.services.sales_summary import mark_day_dirty
+from apps.services.totals import mark_dirty
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
+@receiver(post_delete, sender=SaleItem)
+def update_sale_total(sender, instance, using, **kwargs):
+    mark_dirty(Sale, instance.sale_id, using=using)
+
+
+@receiver(post_delete, sender=PurchaseItem)
+def update_purchase_total(sender, instance, using, **kwargs):
+    mark_dirty(Purchase, instance.purchase_id, using=using)
+
+
+@receiver(post_delete, sender=Sale)
+def update_summary_on_sale_delete(sender, instance, using, **kwargs):
+    mark_day_dirty(instance.created_at, using=using)
+
+
+@receiver(post_delete, sender=Purchase)
+def update_summary_on_purchase_delete(sender, instance, using, **kwargs):
+    mark_day_dirty(instance.purchased_at, using=using)
+
+
+@receiver(post_delete, sender=SaleItem)
+def update_summary_on_item_delete(sender, instance, using, **kwargs):
+    # a cascade from the sale is covered by update_summary_on_sale_delete
+    created_at = Sale.objects.using(using).filter(pk=instance.sale_id).values_list('created_at', flat=True).first()
+    mark_day_dirty(created_at, using=using)
+
+
+@receiver(post_delete, sender=PurchaseItem)
+def update_summary_on_purchase_item_delete(sender, instance, using, **kwargs):
+    purchased_at = (
+        Purchase.objects.using(using).filter(pk=instance.purchase_id).values_list('purchased_at', flat=True).first()
+    )
+    mark_day_dirty(purchased_at, using=using)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, using, **kwargs):
+    # the old barcode of an edited product is unknown here, so drop everything
+    transaction.on_commit(product_cache.invalidate, using=using)
+
+
+@receiver([post_save, post_delete], sender=Sale)
+def forget_receipt(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: receipt_store.forget(instance.pk), using=using)
+
+
 @receiver([post_save, post_delete], sender=SaleItem)
-def update_sale_total(sender, instance, **kwargs):
-    sale = instance.sale
-    total = sum(item.subtotal for item in sale.items.all())
-    if sale.total_amount == total:
-        return
-    sale.total_amount = total
-    post_save.disconnect(update_sale_total, sender=SaleItem)
-    try:
-        sale.save(update_fields=["total_amount"])
-    finally:
-        post_save.connect(update_sale_total, sender=SaleItem)
+def forget_receipt_of_item(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: receipt_store.forget(instance.sale_id), using=using)
 
 
 @receiver(post_delete, sender=SaleItem)
 def restore_stock_on_delete(sender, instance, **kwargs):
     try:
-        instance.product.increase_stock(instance.quantity)
+        # no sale reference: the sale itself may be part of the same delete
+        instance.product.increase_stock(instance.quantity, kind=StockMovement.KindChoices.RETURN)
     except Exception:
-        pass
\ No newline at end of file
+        pass
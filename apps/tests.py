@@ -0,0 +1,995 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy as np
+from apps.models import (
+    CheckoutRequest, Customer, DailySalesSummary, Debt, Job, Product, Purchase, PurchaseItem, Sale, SaleItem,
+    StockBalance, StockMovement, User,
+)
+from apps.services import batch_documents, exports, jobs
+from apps.services.batch_documents import batch_document, batch_members, render_batch
+from apps.services.checkout import IdempotencyConflict, InsufficientStock, checkout, prepare_order
+from apps.services.counters import DashboardCounters, LocalCounterBackend
+from apps.services.dates import between_days
+from apps.services.debt_aging import AGING_BUCKETS, aging_queryset
+from apps.services import document_backends
+from apps.services.document_backends import LazyModule, openpyxl
+from apps.services.document_cache import DocumentCache
+from apps.services.documents import LAYOUT_VERSIONS, Document, inventory_xlsx_document, sales_export_document
+from apps.services.exports import (
+    INVENTORY_HEADER, PRODUCT_HEADER, SALE_HEADER, product_rows, sale_rows, write_xlsx,
+)
+from apps.services.forecasting import METHODS, create_suggested_purchase, fit_demand, forecast_purchases
+from apps.services.group_commit import GroupCommitWriter
+from apps.services.inventory_analytics import compute_inventory_analytics
+from apps.services.product_cache import product_cache
+from apps.services.receipts import receipt_store
+from apps.services.report_engine import build_report, day_breakdowns
+from apps.services.sales_summary import summarize_range, summary_metrics
+from apps.services.stock import (
+    InsufficientStockError, current_balances, decrease_stock_many, reconcile, record_movements, rollup_balances,
+    stock_as_of, stock_metrics, take_snapshot,
+)
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+
+class DateRangeIndexTests(TestCase):
+    """Local-day filters must reach the date column's index as a range scan."""
+
+    day = date(2025, 3, 14)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # the test tables are tiny, so a sequential scan would always win
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assertIndexRangeScan(self, model, field):
+        index = next(index.name for index in model._meta.indexes if index.fields == [field])
+        plan = self.explain(model.objects.filter(between_days(field, self.day)).order_by())
+        self.assertIn(index, plan)
+        if connection.vendor == 'postgresql':
+            self.assertRegex(plan, r"Index (Only )?Scan|Bitmap Index Scan")
+            self.assertNotIn("Seq Scan", plan)
+        else:
+            self.assertRegex(plan, rf"SEARCH .*USING (COVERING )?INDEX {index} \({field}>\? AND {field}<\?\)")
+
+    def test_sale_created_at(self):
+        self.assertIndexRangeScan(Sale, 'created_at')
+
+    def test_purchase_purchased_at(self):
+        self.assertIndexRangeScan(Purchase, 'purchased_at')
+
+    def test_debt_created_at(self):
+        self.assertIndexRangeScan(Debt, 'created_at')
+
+    def test_bounds_are_half_open_local_days(self):
+        window = between_days('created_at', self.day, date(2025, 3, 16))
+        (low_lookup, low), (high_lookup, high) = window.children
+        self.assertEqual((low_lookup, high_lookup), ('created_at__gte', 'created_at__lt'))
+        self.assertEqual((high - low).days, 3)
+        self.assertEqual(low.hour, 0)
+        self.assertIsNotNone(low.tzinfo)
+
+
+class SaleTotalsTests(TransactionTestCase):
+    """Real commits: the totals are refreshed once per transaction, on commit."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Ali')
+        self.product = Product.objects.create(name='Olma', barcode='1', cost_price=2, sell_price=10, stock=100)
+
+    def add_item(self, sale, quantity):
+        return SaleItem.objects.create(sale=sale, product=self.product, quantity=quantity, price=10)
+
+    def assertTotals(self, sale, total, debt):
+        sale.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual((sale.total_amount, self.customer.total_debt), (Decimal(total), Decimal(debt)))
+
+    def test_credit_sale_debt_follows_the_recomputed_total(self):
+        with transaction.atomic():
+            sale = Sale.objects.create(customer=self.customer, payment_type=Sale.PAYMENT.CREDIT, paid_amount=5)
+            self.add_item(sale, 1)
+            self.add_item(sale, 2)
+        self.assertTotals(sale, 30, 25)
+
+        # saving the sale again must not count its debt twice
+        with transaction.atomic():
+            sale.save()
+            self.add_item(sale, 1)
+        self.assertTotals(sale, 40, 35)
+
+        sale.items.order_by('pk').first().delete()
+        self.assertTotals(sale, 30, 25)
+
+    def test_cash_sale_leaves_debt_alone(self):
+        with transaction.atomic():
+            sale = Sale.objects.create(customer=self.customer, payment_type=Sale.PAYMENT.CASH, paid_amount=50)
+            self.add_item(sale, 3)
+        self.assertTotals(sale, 30, 0)
+
+
+class ProductLookupCacheTests(TestCase):
+    def setUp(self):
+        product_cache.invalidate()
+        self.product = Product.objects.create(name='Olma', barcode='1', cost_price=2, sell_price=5, stock=10)
+        self.client.force_login(User.objects.create(username='kassa', role='cashier'))
+
+    def test_batch_endpoint_reports_missing_barcodes(self):
+        response = self.client.get(reverse('get_products'), {'barcode': ['1', '404']})
+        body = response.json()
+        self.assertEqual([product['name'] for product in body['products']], ['Olma'])
+        self.assertEqual(body['missing'], ['404'])
+
+    def test_product_save_invalidates_on_commit(self):
+        self.assertEqual(product_cache.get('1')['name'], 'Olma')
+        # a queryset update sends no signal: the cached row is served
+        Product.objects.filter(pk=self.product.pk).update(name='Nok')
+        self.assertEqual(product_cache.get('1')['name'], 'Olma')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Anor'
+            self.product.save()
+        self.assertEqual(product_cache.get('1')['name'], 'Anor')
+
+    def test_lookup_that_raced_an_invalidation_is_not_stored(self):
+        in_bulk = Product.objects.in_bulk
+
+        def racing_in_bulk(*args, **kwargs):
+            rows = in_bulk(*args, **kwargs)
+            product_cache.invalidate(['1'])
+            return rows
+
+        with mock.patch.object(Product.objects, 'in_bulk', side_effect=racing_in_bulk):
+            self.assertEqual(product_cache.get('1')['name'], 'Olma')
+        Product.objects.filter(pk=self.product.pk).update(name='Nok')
+        self.assertEqual(product_cache.get('1')['name'], 'Nok')
+
+
+class ProductCatalogTests(TestCase):
+    def setUp(self):
+        self.apple = Product.objects.create(name='Olma', barcode='1', cost_price=2, sell_price=5, stock=10)
+        self.pear = Product.objects.create(name='Nok', barcode='2', cost_price=3, sell_price=7, stock=10)
+        self.client.force_login(User.objects.create(username='kassa', role='cashier'))
+
+    def sync(self, since=None, etag=None):
+        params = {'since': since} if since is not None else {}
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('product_catalog'), params, headers=headers)
+
+    def test_full_then_delta_then_not_modified(self):
+        full = self.sync()
+        body = full.json()
+        self.assertEqual((body['full'], body['count'], len(body['products'])), (True, 2, 2))
+
+        self.assertEqual(self.sync(body['version'], self.sync(body['version'])['ETag']).status_code, 304)
+
+        self.pear.name = 'Anor'
+        self.pear.save()
+        delta = self.sync(body['version']).json()
+        self.assertFalse(delta['full'])
+        self.assertIn(['2', 'Anor', 7.0, 'kg', 10.0], delta['products'])
+
+    def test_row_committed_late_with_an_older_stamp_changes_the_etag(self):
+        version = self.sync().json()['version']
+        etag = self.sync(version)['ETag']
+
+        # stamped when its transaction started, committed after the sync
+        late = self.apple.updated_at + (Product.objects.get(pk=self.pear.pk).updated_at - self.apple.updated_at) / 2
+        Product.objects.filter(pk=self.apple.pk).update(name='Behi', updated_at=late)
+        self.assertEqual(self.sync().json()['version'], version)
+
+        response = self.sync(version, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Behi', [row[1] for row in response.json()['products']])
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Olma', barcode='1', cost_price=2, sell_price=5, stock=0)
+        self.pk = self.product.pk
+
+    def move(self, quantity):
+        record_movements({self.pk: Decimal(quantity)}, StockMovement.KindChoices.ADJUSTMENT)
+        return StockMovement.objects.latest('id')
+
+    def hold_back(self, movement):
+        # the insert has taken its id but not committed yet
+        held = StockMovement(
+            id=movement.id, product=self.product, kind=movement.kind,
+            quantity=movement.quantity, created_at=movement.created_at,
+        )
+        movement.delete()
+        return held
+
+    def commit_late(self, held):
+        held.save(force_insert=True)
+
+    def rollup(self):
+        return rollup_balances(lag=timedelta(0))
+
+    def balance(self):
+        return StockBalance.objects.get(product=self.product).quantity
+
+    def test_movement_committed_after_the_rollup_passed_its_id(self):
+        self.move(10)
+        late = self.hold_back(self.move(-3))
+        self.move(5)
+        self.rollup()
+        self.assertEqual(self.balance(), Decimal('15'))
+
+        self.commit_late(late)
+        self.assertEqual(current_balances()[self.pk], Decimal('12'))
+        self.rollup()
+        self.assertEqual(self.balance(), Decimal('12'))
+        # counted once, however many rollups follow
+        self.move(1)
+        self.rollup()
+        self.assertEqual(self.balance(), Decimal('13'))
+        self.assertEqual(current_balances()[self.pk], Decimal('13'))
+
+    def test_snapshot_sees_a_gap_filled_after_it(self):
+        self.move(10)
+        late = self.hold_back(self.move(-4))
+        self.move(1)
+        self.rollup()
+        take_snapshot()
+        self.commit_late(late)
+        self.assertEqual(stock_as_of(timezone.now())[self.pk], Decimal('7'))
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        Product.objects.filter(pk=self.pk).update(stock=7)
+        self.move(7)
+        self.rollup()
+        StockBalance.objects.filter(product=self.product).update(quantity=9)
+
+        adjusted, drift = reconcile()
+        self.assertEqual((adjusted, drift), (0, {self.pk: Decimal('-2')}))
+        self.assertEqual(self.balance(), Decimal('7'))
+
+
+class CheckoutFixtureMixin:
+    def setUp(self):
+        cache.clear()
+        self.cashier = User.objects.create(username='kassa')
+        self.apple = Product.objects.create(name='Olma', barcode='1', cost_price=2, sell_price=5, stock=10)
+        self.pear = Product.objects.create(name='Nok', barcode='2', cost_price=3, sell_price=7, stock=10)
+
+    def basket(self):
+        return [{'barcode': '1', 'qty': 2, 'price': 5}, {'barcode': '2', 'qty': 1, 'price': 7}]
+
+    def assertStock(self, apple, pear):
+        self.apple.refresh_from_db()
+        self.pear.refresh_from_db()
+        self.assertEqual((self.apple.stock, self.pear.stock), (Decimal(apple), Decimal(pear)))
+
+
+class GuardedStockTests(CheckoutFixtureMixin, TestCase):
+    def test_all_or_nothing(self):
+        with self.assertRaises(InsufficientStockError) as raised:
+            decrease_stock_many({self.apple.pk: 3, self.pear.pk: 11})
+        self.assertEqual(raised.exception.product_ids, [self.pear.pk])
+        self.assertStock(10, 10)
+
+        self.assertEqual(decrease_stock_many({self.apple.pk: 3, self.pear.pk: 10}), {
+            self.apple.pk: Decimal('7'), self.pear.pk: Decimal('0'),
+        })
+
+    def test_metrics_count_attempts_and_failures(self):
+        stock_metrics.reset()
+        self.addCleanup(stock_metrics.reset)
+        with self.assertRaises(InsufficientStockError):
+            decrease_stock_many({self.apple.pk: 3, self.pear.pk: 11})
+
+        counters = stock_metrics.snapshot()
+        self.assertEqual((counters[self.apple.pk]['attempts'], counters[self.apple.pk]['failed']), (1, 0))
+        self.assertEqual((counters[self.pear.pk]['attempts'], counters[self.pear.pk]['failed']), (1, 1))
+
+
+class CheckoutIdempotencyTests(CheckoutFixtureMixin, TestCase):
+    def test_retry_with_the_same_key_replays_the_first_sale(self):
+        first = checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:42')
+        cache.clear()  # answered from CheckoutRequest, not only the cache
+        second = checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:42')
+
+        self.assertFalse(first.replayed)
+        self.assertTrue(second.replayed)
+        self.assertEqual(second.sale_id, first.sale_id)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(StockMovement.objects.count(), 2)
+        self.assertStock(8, 9)
+
+    def test_lost_race_on_the_key_is_a_replay(self):
+        # the key was claimed between the lookup and the insert
+        first = checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:43')
+        with mock.patch('apps.services.checkout.committed_sale_id', side_effect=[None, first.sale_id]):
+            second = checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:43')
+
+        self.assertTrue(second.replayed)
+        self.assertEqual(second.sale_id, first.sale_id)
+        self.assertStock(8, 9)
+
+    def test_different_keys_are_different_sales(self):
+        checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:44')
+        checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:45')
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertStock(6, 8)
+
+    def test_key_reused_by_another_cashier_or_basket_is_a_conflict(self):
+        first = checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:46')
+        other = User.objects.create(username='kassa-2')
+        bigger = self.basket() + [{'barcode': '1', 'qty': 1, 'price': 5}]
+
+        with self.assertRaises(IdempotencyConflict):
+            checkout(other, self.basket(), 'cash', 100, idempotency_key='till-1:46')
+        cache.clear()
+        with self.assertRaises(IdempotencyConflict):
+            checkout(self.cashier, bigger, 'cash', 100, idempotency_key='till-1:46')
+
+        self.assertEqual(list(Sale.objects.values_list('pk', flat=True)), [first.sale_id])
+        self.assertStock(8, 9)
+
+    def test_view_answers_a_conflict_with_409(self):
+        checkout(self.cashier, self.basket(), 'cash', 100, idempotency_key='till-1:47')
+        self.client.force_login(User.objects.create(username='kassa-2', role='cashier'))
+        response = self.client.post(reverse('sale_create'), {
+            'total_amount': 17, 'payment_type': 'cash', 'received_amount': 100,
+            'cart_data': json.dumps(self.basket()), 'idempotency_key': 'till-1:47',
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(Sale.objects.count(), 1)
+
+
+class GroupCommitTests(CheckoutFixtureMixin, TransactionTestCase):
+    """commit_group called directly, so the post-commit hooks run for real."""
+
+    def group(self, *orders):
+        return [(order, Future()) for order in orders]
+
+    def order(self, key=None):
+        return prepare_order(self.cashier, self.basket(), 'cash', 100, idempotency_key=key)
+
+    def test_baskets_share_one_commit(self):
+        group = self.group(self.order('a'), self.order('b'), self.order('a'))
+        GroupCommitWriter().commit_group(group)
+
+        results = [future.result() for _, future in group]
+        self.assertEqual([result.replayed for result in results], [False, False, True])
+        self.assertEqual(results[2].sale_id, results[0].sale_id)
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertStock(6, 8)
+
+    def test_key_reused_within_a_group_by_another_cashier_fails_alone(self):
+        other = prepare_order(User.objects.create(username='kassa-2'), self.basket(), 'cash', 100, idempotency_key='e')
+        group = self.group(self.order('e'), other)
+        GroupCommitWriter().commit_group(group)
+
+        (_, ok), (_, conflict) = group
+        self.assertFalse(ok.result().replayed)
+        self.assertIsInstance(conflict.exception(), IdempotencyConflict)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertStock(8, 9)
+
+    def test_basket_that_lost_its_stock_fails_alone(self):
+        group = self.group(self.order(), self.order())
+        Product.objects.filter(pk=self.pear.pk).update(stock=1)
+        GroupCommitWriter().commit_group(group)
+
+        (_, ok), (_, failed) = group
+        self.assertIsNotNone(ok.result().sale_id)
+        self.assertIsInstance(failed.exception(), InsufficientStock)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertStock(8, 0)
+
+    def test_failing_hook_after_commit_does_not_commit_again(self):
+        group = self.group(self.order('c'), self.order())
+        with mock.patch(
+            'apps.services.checkout.dashboard_counters.record_sales', side_effect=RuntimeError("cache down")
+        ):
+            GroupCommitWriter().commit_group(group)
+
+        self.assertTrue(all(future.result().sale_id for _, future in group))
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(CheckoutRequest.objects.count(), 1)
+        self.assertStock(6, 8)
+
+    def test_group_that_cannot_commit_retries_each_basket(self):
+        group = self.group(self.order('d'), self.order())
+        with mock.patch('apps.services.group_commit.persist_sales', side_effect=IntegrityError("bulk insert")):
+            GroupCommitWriter().commit_group(group)
+
+        self.assertTrue(all(not future.result().replayed for _, future in group))
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertStock(6, 8)
+
+
+class DailySummaryTests(CheckoutFixtureMixin, TestCase):
+    def summary(self, day=None):
+        return DailySalesSummary.objects.get(day=day or timezone.localdate())
+
+    def test_checkout_adds_to_the_day(self):
+        summary_metrics.reset()
+        self.addCleanup(summary_metrics.reset)
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        checkout(self.cashier, self.basket(), 'card', 100)
+
+        summary = self.summary()
+        self.assertEqual((summary.sale_count, summary.revenue, summary.cogs), (2, Decimal('34'), Decimal('14')))
+        self.assertEqual((summary.cash_revenue, summary.card_revenue), (Decimal('17'), Decimal('17')))
+        self.assertEqual(summary_metrics.snapshot()['updates'], 2)
+
+    def test_recompute_repairs_the_day_and_fills_empty_days(self):
+        today = timezone.localdate()
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        DailySalesSummary.objects.filter(day=today).update(revenue=0, sale_count=5)
+
+        self.assertEqual(summarize_range(today - timedelta(days=1), today), 2)
+        summary = self.summary()
+        self.assertEqual((summary.sale_count, summary.revenue), (1, Decimal('17')))
+        self.assertEqual(self.summary(today - timedelta(days=1)).sale_count, 0)
+
+        # a checkout after the recompute adds on top of it
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        summary = self.summary()
+        self.assertEqual((summary.sale_count, summary.revenue), (2, Decimal('34')))
+
+
+class ReportEngineTests(CheckoutFixtureMixin, TestCase):
+    def test_report_reads_the_rollup_and_one_breakdown_scan(self):
+        today = timezone.localdate()
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        checkout(User.objects.create(username='kassa-2'), self.basket() + self.basket(), 'card', 100)
+
+        with self.assertNumQueries(2):
+            report = build_report(today - timedelta(days=6), today, today)
+
+        self.assertEqual((report.totals.revenue, report.totals.sale_count), (Decimal('51'), 2))
+        self.assertEqual(report.totals.by_payment, {'cash': Decimal('17'), 'card': Decimal('34')})
+        self.assertEqual(report.today.revenue, Decimal('51'))
+        self.assertEqual([day for day, _ in report.days], [today])
+        top = [(stat.name, stat.quantity) for stat in report.top_products]
+        self.assertEqual(top, [('Olma', Decimal('6')), ('Nok', Decimal('3'))])
+        self.assertEqual(
+            {stat.username: stat.total for stat in report.cashiers}, {'kassa': Decimal('17'), 'kassa-2': Decimal('34')},
+        )
+
+
+class SaleItemCostTests(CheckoutFixtureMixin, TestCase):
+    def test_cost_is_kept_from_the_time_of_sale(self):
+        sale = Sale.objects.create(cashier=self.cashier, payment_type=Sale.PAYMENT.CASH, paid_amount=0)
+        item = SaleItem.objects.create(sale=sale, product=self.apple, quantity=3, price=5)
+        Product.objects.filter(pk=self.apple.pk).update(cost_price=4)
+
+        item = SaleItem.objects.get(pk=item.pk)
+        item.quantity = 2
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual((item.cost_price, item.line_cost, item.line_total), (2, 4, 10))
+
+    def test_backfill_uses_current_costs_and_rebuilds_the_days(self):
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        SaleItem.objects.update(cost_price=None, line_total=0, line_cost=0)
+        DailySalesSummary.objects.update(cogs=0)
+        Product.objects.filter(pk=self.apple.pk).update(cost_price=4)
+
+        call_command('backfill_sale_costs', stdout=StringIO())
+
+        costs = dict(SaleItem.objects.values_list('product', 'line_cost'))
+        self.assertEqual(costs, {self.apple.pk: Decimal('8'), self.pear.pk: Decimal('3')})
+        self.assertFalse(SaleItem.objects.filter(line_total=0).exists())
+        self.assertEqual(DailySalesSummary.objects.get(day=timezone.localdate()).cogs, Decimal('11'))
+
+
+class DayBreakdownCacheTests(CheckoutFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        Sale.objects.update(created_at=F('created_at') - timedelta(days=1))
+        SaleItem.objects.update(created_at=F('created_at') - timedelta(days=1))
+        summarize_range(self.yesterday, self.today)
+
+    def breakdowns(self, *days):
+        summaries = {summary.day: summary for summary in DailySalesSummary.objects.all()}
+        return day_breakdowns(list(days), summaries, self.today)
+
+    def test_closed_day_is_scanned_once(self):
+        with self.assertNumQueries(2):
+            self.breakdowns(self.yesterday)
+        with self.assertNumQueries(1):
+            breakdown = self.breakdowns(self.yesterday)[self.yesterday]
+        self.assertEqual(breakdown['products'], {'Olma': Decimal('2'), 'Nok': Decimal('1')})
+
+    def test_back_dated_edit_moves_the_day_to_a_new_key(self):
+        self.breakdowns(self.yesterday)
+        SaleItem.objects.filter(product=self.pear).update(quantity=3)
+        summarize_range(self.yesterday, self.yesterday)
+        self.assertEqual(self.breakdowns(self.yesterday)[self.yesterday]['products']['Nok'], Decimal('3'))
+
+    def test_today_is_always_scanned_and_empty_days_never(self):
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                self.breakdowns(self.today)
+
+        quiet = self.today - timedelta(days=2)
+        summarize_range(quiet, quiet)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.breakdowns(quiet)[quiet], {'products': {}, 'cashiers': {}})
+
+
+class DashboardCounterTests(CheckoutFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.counters = DashboardCounters(LocalCounterBackend(), reconcile_interval=60)
+        self.enterContext(mock.patch('apps.services.checkout.dashboard_counters', self.counters))
+
+    def sell(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.cashier, self.basket(), 'cash', 100)
+
+    def test_reads_reconcile_once_then_follow_checkouts(self):
+        self.sell()
+        figures = self.counters.dashboard(self.today)
+        self.assertEqual((figures['total_sales_today'], figures['total_amount_today']), (1, 17))
+        self.assertEqual((figures['total_products'], figures['revenue'][-1]), (2, 17))
+
+        self.sell()
+        with self.assertNumQueries(0):
+            figures = self.counters.dashboard(self.today)
+        self.assertEqual((figures['total_sales_today'], figures['total_amount_today']), (2, 34))
+
+    def test_unknown_counter_is_filled_from_the_database(self):
+        # sold before anything was read: the increment has no counter to add to
+        self.sell()
+        self.assertEqual(self.counters.backend.get_many(self.counters._day_keys(self.today)), {})
+        self.assertEqual(self.counters.dashboard(self.today)['total_sales_today'], 1)
+
+    def test_stale_counters_are_reconciled(self):
+        self.counters.dashboard(self.today)
+        Sale.objects.create(cashier=self.cashier, payment_type=Sale.PAYMENT.CASH, total_amount=9, paid_amount=9)
+        summarize_range(self.today, self.today)
+        self.assertEqual(self.counters.dashboard(self.today)['total_sales_today'], 0)
+
+        self.counters.backend.set_many({'dashboard:reconciled': 0})
+        self.assertEqual(self.counters.dashboard(self.today)['total_sales_today'], 1)
+
+
+class ReceiptStoreTests(CheckoutFixtureMixin, TestCase):
+    def test_prepared_on_commit_and_forgotten_on_edit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = checkout(self.cashier, self.basket(), 'cash', 100)
+        text = cache.get(receipt_store.key(result.sale_id))
+        self.assertIn("Olma", text)
+        self.assertIn("Jami: 17 so'm", text)
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.get(pk=result.sale_id).save()
+        self.assertIsNone(cache.get(receipt_store.key(result.sale_id)))
+        self.assertEqual(receipt_store.get(result.sale_id), text)
+
+
+class DocumentFixtureMixin:
+    """A throwaway MEDIA_ROOT and document cache, and an admin logged in."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.documents = DocumentCache(f"{media}/documents", 2**20)
+        self.enterContext(self.settings(MEDIA_ROOT=media, JOB_RESULTS_DIR=f"{media}/jobs"))
+        self.enterContext(mock.patch('apps.services.document_cache.document_cache', self.documents))
+        self.enterContext(mock.patch('apps.views.jobs.document_cache', self.documents))
+        self.enterContext(mock.patch.object(jobs, 'document_cache', self.documents))
+        self.client.force_login(User.objects.create(username='admin', role='admin'))
+
+    def download(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+
+class InventoryAnalyticsTests(DocumentFixtureMixin, CheckoutFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.idle = Product.objects.create(name='Anor', barcode='3', cost_price=1, sell_price=2, stock=4)
+
+    def test_metrics_from_the_sale_history(self):
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        analytics = compute_inventory_analytics(window_days=10, lead_time_days=7)
+        rows = {row['name']: row for row in analytics.rows()}
+
+        self.assertEqual({name: row['abc'] for name, row in rows.items()}, {'Olma': 'A', 'Nok': 'A', 'Anor': 'C'})
+        # one day of 2 sold in ten: mean 0.2, standard deviation 0.6
+        self.assertEqual((rows['Olma']['velocity'], rows['Olma']['days_of_cover']), (0.2, 40.0))
+        self.assertEqual(rows['Olma']['reorder_point'], round(0.2 * 7 + 1.65 * 0.6 * 7 ** 0.5, 1))
+        self.assertIsNone(rows['Anor']['days_of_cover'])
+
+    def test_export_key_follows_the_inputs(self):
+        key = DocumentCache.key(inventory_xlsx_document(self.today))
+        self.assertEqual(DocumentCache.key(inventory_xlsx_document(self.today)), key)
+        with self.settings(INVENTORY_LEAD_TIME_DAYS=14):
+            self.assertNotEqual(DocumentCache.key(inventory_xlsx_document(self.today)), key)
+        checkout(self.cashier, self.basket(), 'cash', 100)
+        self.assertNotEqual(DocumentCache.key(inventory_xlsx_document(self.today)), key)
+
+    def test_export_is_rendered_once_and_served_from_the_cache(self):
+        url = reverse('export_inventory_analytics')
+        with mock.patch(
+            'apps.services.documents.compute_inventory_analytics', wraps=compute_inventory_analytics,
+        ) as compute:
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertEqual(compute.call_count, 1)
+
+        content = self.download(first)
+        self.assertEqual(content, self.download(second))
+        sheet = openpyxl.load_workbook(BytesIO(content)).active
+        self.assertEqual([cell.value for cell in sheet[1]], INVENTORY_HEADER)
+        self.assertEqual(sheet.max_row, 4)
+
+    def test_export_goes_through_the_job_queue(self):
+        with self.settings(BACKGROUND_JOBS=True):
+            response = self.client.get(reverse('export_inventory_analytics'))
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual((job.kind, job.params), ('inventory-xlsx', {'day': self.today.isoformat()}))
+        self.assertEqual(jobs.run_job(jobs.claim_job()).status, Job.StatusChoices.DONE)
+
+
+class ForecastTests(CheckoutFixtureMixin, TestCase):
+    def test_flat_and_weekday_demand(self):
+        flat = np.full((1, 70), 2.0)
+        monday_only = np.zeros((1, 70))
+        monday_only[0, ::7] = 7
+        for method in METHODS:
+            with self.subTest(method=method):
+                forecast, variability = fit_demand(flat, 0, 21, method=method)
+                self.assertEqual((forecast[0], variability[0]), (42, 0))
+                # days it never sells on are no evidence of a lower level
+                forecast, variability = fit_demand(monday_only, 0, 14, method=method)
+                self.assertAlmostEqual(forecast[0], 14)
+                self.assertAlmostEqual(variability[0], 0)
+
+    def test_suggestion_covers_the_forecast_minus_stock_and_pending(self):
+        today = timezone.localdate()
+        Product.objects.update(stock=100)
+        for days_ago in range(1, 15):
+            sale_id = checkout(self.cashier, self.basket(), 'cash', 100).sale_id
+            Sale.objects.filter(pk=sale_id).update(created_at=F('created_at') - timedelta(days=days_ago))
+            SaleItem.objects.filter(sale=sale_id).update(created_at=F('created_at') - timedelta(days=days_ago))
+        Product.objects.update(stock=5)
+        pending = Purchase.objects.create(total_price=6, status=Purchase.StatusChoices.PENDING)
+        PurchaseItem.objects.bulk_create([PurchaseItem(purchase=pending, product=self.apple, quantity=3, cost_price=2)])
+
+        forecast = forecast_purchases(
+            history_days=14, lead_time_days=7, cover_days=7, method='moving_average', today=today,
+        )
+        suggested = dict(zip(forecast.product_ids, forecast.suggested))
+        self.assertEqual(suggested, {self.apple.pk: 28 - 5 - 3, self.pear.pk: 14 - 5})
+
+        purchase = create_suggested_purchase(forecast)
+        self.assertEqual(purchase.status, Purchase.StatusChoices.PENDING)
+        self.assertEqual(
+            dict(purchase.items.values_list('product', 'quantity')), {self.apple.pk: 20, self.pear.pk: 9},
+        )
+        self.assertStock(5, 5)
+
+
+class DebtAgingTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.clerk = User.objects.create(username='kassa')
+        self.ali = Customer.objects.create(name='Ali')
+        self.vali = Customer.objects.create(name='Vali')
+        self.paid_up = Customer.objects.create(name='Soli')
+
+    def debt(self, customer, days_ago, amount, paid=0):
+        debt = Debt.objects.create(customer=customer, amount=amount, paid_amount=paid, created_by=self.clerk)
+        # late in the day, so the bucket edges are day-based, not 24-hour based
+        taken = timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(23, 30)))
+        Debt.objects.filter(pk=debt.pk).update(created_at=taken)
+
+    def names(self, **kwargs):
+        return [row['customer__name'] for row in aging_queryset(self.today, **kwargs)]
+
+    def test_remaining_debt_per_customer_by_age(self):
+        self.debt(self.ali, 0, 100, paid=40)
+        self.debt(self.ali, 30, 10)
+        self.debt(self.ali, 31, 20)
+        self.debt(self.ali, 90, 30)
+        self.debt(self.ali, 91, 50, paid=60)
+        self.debt(self.vali, 200, 70)
+        self.debt(self.paid_up, 5, 10, paid=10)
+
+        with self.assertNumQueries(1):
+            rows = {row['customer__name']: row for row in aging_queryset(self.today)}
+        self.assertEqual(set(rows), {'Ali', 'Vali'})
+        buckets = [rows['Ali'][key] for key, *_ in AGING_BUCKETS]
+        self.assertEqual(buckets + [rows['Ali']['total']], [70, 20, 30, 0, 120])
+        self.assertEqual(rows['Vali']['days_over_90'], 70)
+
+    def test_sort_and_search(self):
+        self.debt(self.ali, 0, 10)
+        self.debt(self.vali, 0, 20)
+        self.assertEqual(self.names(), ['Vali', 'Ali'])
+        self.assertEqual(self.names(sort='customer__name'), ['Ali', 'Vali'])
+        self.assertEqual(self.names(sort='-customer__id; DROP'), ['Vali', 'Ali'])
+        self.assertEqual(self.names(search='val'), ['Vali'])
+
+
+class ProductExportTests(DocumentFixtureMixin, CheckoutFixtureMixin, TestCase):
+    def workbook(self, content):
+        return openpyxl.load_workbook(BytesIO(content), read_only=True)
+
+    def test_rows_past_a_sheet_continue_on_the_next(self):
+        file = BytesIO()
+        with mock.patch.object(exports, 'XLSX_MAX_ROWS', 3):
+            self.assertEqual(write_xlsx(file, "Products", ["n"], ([n] for n in range(5))), 5)
+        workbook = self.workbook(file.getvalue())
+        self.assertEqual(workbook.sheetnames, ["Products", "Products (2)", "Products (3)"])
+        sheets = [[row[0] for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets]
+        self.assertEqual(sheets, [["n", 0, 1], ["n", 2, 3], ["n", 4]])
+
+    def test_empty_export_still_has_its_header(self):
+        file = BytesIO()
+        self.assertEqual(write_xlsx(file, "Products", PRODUCT_HEADER, []), 0)
+        self.assertEqual(list(self.workbook(file.getvalue()).active.values), [tuple(PRODUCT_HEADER)])
+
+    def test_rows_are_read_in_chunks_of_one_query(self):
+        Product.objects.filter(pk=self.pear.pk).update(barcode='')
+        with self.assertNumQueries(1):
+            rows = list(product_rows(chunk_size=1))
+        self.assertEqual(rows, [['Nok', '-', 3.0, 7.0, 10.0], ['Olma', '1', 2.0, 5.0, 10.0]])
+
+    def test_view_sends_the_workbook(self):
+        sheet = self.workbook(self.download(self.client.get(reverse('export_products_excel')))).active
+        self.assertEqual([row[0] for row in sheet.iter_rows(min_row=2, values_only=True)], ['Nok', 'Olma'])
+
+
+class SalesExportTests(DocumentFixtureMixin, CheckoutFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        old = checkout(self.cashier, self.basket(), 'cash', 100).sale_id
+        Sale.objects.filter(pk=old).update(created_at=F('created_at') - timedelta(days=40))
+        SaleItem.objects.filter(sale=old).update(created_at=F('created_at') - timedelta(days=40))
+        self.sale = checkout(self.cashier, self.basket(), 'card', 100).sale
+
+    def export(self, **params):
+        day = self.today.isoformat()
+        return self.client.get(reverse('sale_export'), {'start_date': day, 'end_date': day, **params})
+
+    def test_rows_of_the_range_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(sale_rows(self.today, self.today, chunk_size=1))
+        self.assertEqual([row[7] for row in rows], ['Olma', 'Nok'])
+        created_at, sale_id, cashier, _, payment, total = rows[0][:6]
+        self.assertEqual((sale_id, cashier, payment, total), (str(self.sale.pk), 'kassa', 'Karta', 17.0))
+        self.assertIsNone(created_at.tzinfo)
+        self.assertEqual(rows[0][-4:], [5.0, 2.0, 10.0, 4.0])
+
+    def test_csv_is_streamed_with_a_bom(self):
+        response = self.export()
+        self.assertTrue(response.streaming)
+        lines = list(csv.reader(self.download(response).decode('utf-8-sig').splitlines()))
+        self.assertEqual(lines[0], SALE_HEADER)
+        self.assertEqual([line[7] for line in lines[1:]], ['Olma', 'Nok'])
+
+    def test_xlsx_is_a_cached_document(self):
+        content = self.download(self.export(format='xlsx'))
+        sheet = openpyxl.load_workbook(BytesIO(content), read_only=True).active
+        self.assertEqual([row[7] for row in sheet.iter_rows(min_row=2, values_only=True)], ['Olma', 'Nok'])
+        self.assertIsNotNone(self.documents.lookup(sales_export_document(self.today, self.today)))
+
+    def test_renamed_product_changes_the_key(self):
+        key = self.documents.key(sales_export_document(self.today, self.today))
+        Product.objects.filter(pk=self.apple.pk).update(name='Qizil olma')
+        self.assertNotEqual(self.documents.key(sales_export_document(self.today, self.today)), key)
+
+
+class BatchDocumentTests(DocumentFixtureMixin, CheckoutFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.purchase = Purchase.objects.create(total_price=6)
+        PurchaseItem.objects.create(purchase=self.purchase, product=self.apple, quantity=3, cost_price=2)
+        self.sales = [checkout(self.cashier, self.basket(), 'cash', 100).sale_id for _ in range(2)]
+
+    def member(self, kind, pk):
+        return Document(
+            kind=kind, filename=f"{kind}_{pk}.txt", content_type='text/plain', source=[kind, pk],
+            render=lambda file: file.write(f"{kind} {pk}".encode()),
+        )
+
+    def batch(self, **params):
+        day = self.today.isoformat()
+        return self.client.get(reverse('batch_documents'), {'start_date': day, 'end_date': day, **params})
+
+    def test_members_of_the_range_in_order(self):
+        receipts = [('receipt', pk) for pk in self.sales]
+        self.assertEqual(batch_members(self.today, self.today), [('purchase', self.purchase.pk)] + receipts)
+        self.assertEqual(batch_members(self.today, self.today, ['receipt']), receipts)
+        self.assertEqual(batch_members(self.today - timedelta(days=1), self.today - timedelta(days=1)), [])
+
+    def test_zip_of_the_members(self):
+        self.enterContext(mock.patch.dict(batch_documents.WARM_UPS, {'purchase': lambda: None}))
+        members = {'purchase': lambda pk: self.member('purchase', pk)}
+        self.enterContext(mock.patch.dict(batch_documents.MEMBER_DOCUMENTS, members))
+        file = BytesIO()
+        self.assertEqual(render_batch(file, [('purchase', 1), ('purchase', 2)], workers=1, cache=self.documents), 2)
+        with zipfile.ZipFile(file) as archive:
+            self.assertEqual(archive.namelist(), ['purchase_1.txt', 'purchase_2.txt'])
+            self.assertEqual(archive.read('purchase_2.txt'), b"purchase 2")
+
+    def test_renamed_product_or_cashier_changes_the_key(self):
+        key = self.documents.key(batch_document(self.today, self.today))
+        Product.objects.filter(pk=self.pear.pk).update(name='Nok (sariq)')
+        renamed = self.documents.key(batch_document(self.today, self.today))
+        self.assertNotEqual(renamed, key)
+        User.objects.filter(pk=self.cashier.pk).update(username='kassa-2')
+        self.assertNotEqual(self.documents.key(batch_document(self.today, self.today)), renamed)
+
+    def test_not_rendered_in_the_request_without_jobs(self):
+        with self.settings(BACKGROUND_JOBS=False), mock.patch.object(batch_documents, 'render_batch') as render:
+            response = self.batch()
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, "manage.py batch_pdfs", status_code=503)
+        render.assert_not_called()
+        self.assertFalse(Job.objects.exists())
+
+    def test_queued_with_jobs(self):
+        with self.settings(BACKGROUND_JOBS=True):
+            response = self.batch(format='pdf', kinds='receipt')
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual((job.kind, job.params['format'], job.params['kinds']), ('batch-pdf', 'pdf', ['receipt']))
+
+
+class DocumentBackendTests(TestCase):
+    def test_not_imported_at_start_up(self):
+        # a fresh interpreter: this one has rendered documents already
+        script = (
+            "import django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().resolve('/sales/create/'); "
+            "from apps.services.document_backends import loaded_backends; print(loaded_backends())"
+        )
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_preload_skips_what_cannot_be_imported(self):
+        json_backend, missing, no_pango = LazyModule('json'), LazyModule('apps.no_such_backend'), LazyModule('pango')
+        self.enterContext(mock.patch.object(document_backends, 'DOCUMENT_BACKENDS', [missing, no_pango, json_backend]))
+        self.enterContext(mock.patch.object(no_pango, '_load', side_effect=OSError("cannot load library 'libpango'")))
+        with self.assertLogs('apps.services.document_backends', 'WARNING') as logs:
+            failures = document_backends.preload()
+        self.assertEqual(set(failures), {'apps.no_such_backend', 'pango'})
+        self.assertIn("OSError: cannot load library", failures['pango'])
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(json_backend.dumps([]), "[]")
+
+
+class DocumentCacheTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.cache = DocumentCache(root, max_bytes=250)
+        self.renders = []
+
+    def document(self, source, size=100):
+        def render(file):
+            self.renders.append(source)
+            file.write(b"x" * size)
+
+        return Document(kind='test', filename='test.txt', content_type='text/plain', source=[source], render=render)
+
+    def test_rendered_once_per_source_and_layout(self):
+        path = self.cache.fetch(self.document('a'))
+        self.assertEqual(self.cache.fetch(self.document('a')), path)
+        self.assertNotEqual(self.cache.fetch(self.document('b')), path)
+        with mock.patch.dict(LAYOUT_VERSIONS, {'test': 2}):
+            self.assertIsNone(self.cache.lookup(self.document('a')))
+        self.assertEqual(self.renders, ['a', 'b'])
+
+    def test_failed_render_leaves_nothing_behind(self):
+        document = self.document('a')
+        document.render = mock.Mock(side_effect=RuntimeError("render failed"))
+        with self.assertRaises(RuntimeError):
+            self.cache.fetch(document)
+        self.assertIsNone(self.cache.lookup(document))
+        self.assertEqual([path for path in self.cache.root.rglob('*') if path.is_file()], [])
+
+    def test_least_recently_served_files_are_evicted_past_the_limit(self):
+        a = self.cache.fetch(self.document('a'))
+        b = self.cache.fetch(self.document('b'))
+        os.utime(b, (1000, 1000))
+        os.utime(a, (2000, 2000))
+
+        c = self.cache.fetch(self.document('c'))
+        self.assertEqual([path.exists() for path in (a, b, c)], [True, False, True])
+
+    def test_directory_is_scanned_only_when_the_running_total_passes_the_limit(self):
+        with mock.patch.object(self.cache, 'evict', wraps=self.cache.evict) as evict:
+            for source in 'ab':
+                self.cache.fetch(self.document(source))
+            self.assertEqual(evict.call_count, 1)
+            self.cache.fetch(self.document('c'))
+            self.assertEqual(evict.call_count, 2)
+
+
+class JobQueueTests(DocumentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(self.settings(JOB_MAX_ATTEMPTS=2))
+
+    def submit(self, render):
+        document = Document(
+            kind='test', filename='test.txt', content_type='text/plain', source=[], render=render,
+        )
+        self.enterContext(mock.patch.dict(jobs.JOB_DOCUMENTS, {'test': lambda params: document}))
+        return jobs.submit_job('test', {})
+
+    def test_claim_run_and_store_result(self):
+        job = self.submit(lambda file: file.write(b"ok"))
+        self.assertEqual(jobs.submit_job('test', {}), job)
+
+        claimed = jobs.claim_job()
+        self.assertEqual((claimed, claimed.status, claimed.attempts), (job, Job.StatusChoices.RUNNING, 1))
+        self.assertIsNone(jobs.claim_job())
+
+        jobs.run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.StatusChoices.DONE)
+        self.assertEqual(job.filename, 'test.txt')
+
+    def test_failure_is_retried_then_failed(self):
+        def render(file):
+            raise RuntimeError("render failed")
+
+        job = self.submit(render)
+        requeued = jobs.run_job(jobs.claim_job())
+        self.assertEqual((requeued.status, requeued.finished_at), (Job.StatusChoices.QUEUED, None))
+        self.assertEqual(jobs.run_job(jobs.claim_job()).status, Job.StatusChoices.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.StatusChoices.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn("render failed", job.error)
+
+    def test_requeued_job_is_not_overwritten(self):
+        job = self.submit(lambda file: Job.objects.filter(pk=job.pk).update(status=Job.StatusChoices.QUEUED))
+        self.assertEqual(jobs.run_job(jobs.claim_job()).status, Job.StatusChoices.QUEUED)
+
+    def test_concurrent_submission_gets_the_winning_job(self):
+        job = self.submit(lambda file: file.write(b"ok"))
+        # the other request inserted between this one's lookup and insert
+        with mock.patch('django.db.models.query.QuerySet.first', side_effect=[None, job]):
+            self.assertEqual(jobs.submit_job('test', {}), job)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_one_pending_job_per_request(self):
+        job = self.submit(lambda file: file.write(b"ok"))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(kind='test', params={})
+        jobs.run_job(jobs.claim_job())
+        self.assertNotEqual(jobs.submit_job('test', {}), job)
@@ -1,4 +1,4 @@
-from apps.views.customers import CustomerDebtListView, CustomerListView
+from apps.views.customers import CustomerDebtListView, CustomerListView, DebtAgingView
 from apps.views.debts import DebtPaymentView
 from apps.views.employees import (
     EmployeeAddView,
@@ -6,6 +6,7 @@ from apps.views.employees import (
     EmployeeListView,
     EmployeeUpdateView,
 )
+from apps.views.jobs import JobDetailView, JobDownloadView, JobStatusView
 from apps.views.products import (
     ExportProductsExcelView,
     ExportProductsPDFView,
@@ -21,14 +22,24 @@ from apps.views.purchases import (
     PurchaseDetailView,
     PurchaseListView,
     PurchasePDFView,
+    SuggestPurchaseView,
+)
+from apps.views.reports import (
+    BatchDocumentsView,
+    ExportInventoryAnalyticsView,
+    InventoryAnalyticsView,
+    ReportsView,
 )
-from apps.views.reports import ReportsView
 from apps.views.sales import (
+    ExportSalesView,
+    GetProductsView,
     GetProductView,
+    ProductCatalogView,
     SaleCreateView,
     SaleDetailView,
     SaleHistoryView,
     SaleReceiptPDFView,
+    SaleReceiptTextView,
 )
 from apps.views.users import (
     CustomLoginView,
@@ -42,6 +53,7 @@ from django.urls import path
 urlpatterns = [
 
     path('customers/', CustomerListView.as_view(), name='customer_list'),
+    path('customers/aging/', DebtAgingView.as_view(), name='debt_aging'),
     path('<int:customer_id>/debts/', CustomerDebtListView.as_view(), name='customer_debt_list'),
     path('<uuid:debt_pk>/payment/', DebtPaymentView.as_view(), name='debt_payment'),
 
@@ -59,6 +71,7 @@ urlpatterns = [
 
     path('purchases/', PurchaseListView.as_view(), name='purchase_list'),
     path('purchases/add/', AddPurchaseView.as_view(), name='add_purchase'),
+    path('purchases/suggest/', SuggestPurchaseView.as_view(), name='suggest_purchase'),
     path('purchases/detail/<uuid:pk>/', PurchaseDetailView.as_view(), name='purchase_detail'),
     path('purchases/detail/<uuid:pk>/pdf/', PurchasePDFView.as_view(), name='purchase_pdf'),
     path('purchases/<uuid:pk>/complete/', PurchaseCompleteView.as_view(), name='purchase_complete'),
@@ -66,11 +79,22 @@ urlpatterns = [
 
     path('sales/create/', SaleCreateView.as_view(), name='sale_create'),
     path('sales/get-product/', GetProductView.as_view(), name='get_product'),
+    path('sales/get-products/', GetProductsView.as_view(), name='get_products'),
+    path('sales/catalog/', ProductCatalogView.as_view(), name='product_catalog'),
     path('sales/history/', SaleHistoryView.as_view(), name='sale_history'),
+    path('sales/history/export/', ExportSalesView.as_view(), name='sale_export'),
     path('sales/history/detail/<uuid:pk>/', SaleDetailView.as_view(), name='sale_history_detail'),
     path('sales/<uuid:sale_id>/chek/', SaleReceiptPDFView.as_view(), name='sale_receipt_pdf'),
+    path('sales/<uuid:sale_id>/chek/text/', SaleReceiptTextView.as_view(), name='sale_receipt_text'),
+
+    path('jobs/<uuid:pk>/', JobDetailView.as_view(), name='job_detail'),
+    path('jobs/<uuid:pk>/status/', JobStatusView.as_view(), name='job_status'),
+    path('jobs/<uuid:pk>/download/', JobDownloadView.as_view(), name='job_download'),
 
     path('reports/', ReportsView.as_view(), name='reports'),
+    path('reports/inventory/', InventoryAnalyticsView.as_view(), name='inventory_analytics'),
+    path('reports/inventory/export/', ExportInventoryAnalyticsView.as_view(), name='export_inventory_analytics'),
+    path('reports/documents/', BatchDocumentsView.as_view(), name='batch_documents'),
 
     path('login/', CustomLoginView.as_view(), name='login'),
     path('logout/', CustomLogoutView.as_view(), name='logout'),
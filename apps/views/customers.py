@@ -1,5 +1,6 @@
 from apps.mixins import RoleRequiredMixin
 from apps.models import Customer, Debt
+from apps.services.debt_aging import AGING_BUCKETS, DEFAULT_SORT, aging_queryset
 from django.db.models import F, Max
 from django.shortcuts import get_object_or_404
 from django.views.generic import ListView
@@ -63,3 +64,26 @@ class CustomerDebtListView(RoleRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['customer'] = self.customer
         return context
+
+
+class DebtAgingView(RoleRequiredMixin, ListView):
+    allowed_roles = ['admin']
+    template_name = 'debt/debt_aging.html'
+    context_object_name = 'rows'
+    paginate_by = 20
+
+    def get_queryset(self):
+        self.search_query = self.request.GET.get('q', '')
+        self.sort = self.request.GET.get('sort') or DEFAULT_SORT
+        return aging_queryset(search=self.search_query, sort=self.sort)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_query'] = self.search_query
+        context['sort'] = self.sort
+        context['buckets'] = [{'key': key, 'label': label} for key, label, _, _ in AGING_BUCKETS]
+        # templates cannot index a dict by a variable, so cells go in bucket order
+        context['table'] = [
+            (row, [row[key] for key, _, _, _ in AGING_BUCKETS]) for row in context['rows']
+        ]
+        return context
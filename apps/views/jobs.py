@@ -0,0 +1,76 @@
+from pathlib import Path
+
+from apps.mixins import RoleRequiredMixin
+from apps.models import Job
+from apps.services.document_cache import document_cache, document_response
+from apps.services.documents import PDF_CONTENT_TYPE
+from apps.services.jobs import jobs_enabled, submit_job
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views import View
+from django.views.generic import DetailView
+
+
+def serve_document(request, kind, params, document, as_attachment=True, inline=True):
+    """Send ``document`` if it is rendered already, otherwise queue it and show the job page.
+
+    With BACKGROUND_JOBS off the document is rendered in the request, as
+    before, unless ``inline`` is false: documents too heavy for a web worker
+    get a 503 page pointing at the management command instead.
+    """
+    if document_cache.lookup(document) is not None:
+        return document_response(document, as_attachment=as_attachment)
+    if not jobs_enabled():
+        if not inline:
+            return render(request, 'jobs/jobs_disabled.html', {'kind': kind}, status=503)
+        return document_response(document, as_attachment=as_attachment)
+    job = submit_job(kind, params, request.user)
+    return redirect('job_detail', pk=job.pk)
+
+
+def job_status(job):
+    return {
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'error': job.error if job.status == Job.StatusChoices.FAILED else '',
+        'download_url': reverse('job_download', args=[job.pk]) if job.status == Job.StatusChoices.DONE else None,
+    }
+
+
+class JobDetailView(RoleRequiredMixin, DetailView):
+    allowed_roles = ['admin']
+    model = Job
+    template_name = 'jobs/job_detail.html'
+    context_object_name = 'job'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['job_status'] = job_status(self.object)
+        context['poll_interval'] = getattr(settings, 'JOB_POLL_INTERVAL', 1) * 1000
+        return context
+
+
+class JobStatusView(RoleRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def get(self, request, pk):
+        return JsonResponse(job_status(get_object_or_404(Job, pk=pk)))
+
+
+class JobDownloadView(RoleRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk, status=Job.StatusChoices.DONE)
+        try:
+            file = open(Path(settings.MEDIA_ROOT) / job.result, 'rb')
+        except FileNotFoundError:
+            raise Http404("Fayl topilmadi")
+        return FileResponse(
+            file,
+            as_attachment=job.content_type != PDF_CONTENT_TYPE,
+            filename=job.filename,
+            content_type=job.content_type,
+        )
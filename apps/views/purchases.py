@@ -1,13 +1,16 @@
 from apps.mixins import RoleRequiredMixin
 from apps.models import Product, Purchase, PurchaseItem
+from apps.services.dates import between_days, parse_day
+from apps.services.documents import purchase_document
+from apps.services.forecasting import create_suggested_purchase, forecast_purchases
+from apps.services.stock import receive_purchase
+from apps.views.jobs import serve_document
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Sum
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.template.loader import render_to_string
 from django.views import View
 from django.views.generic import DetailView, ListView
-from weasyprint import HTML
 
 
 class PurchaseListView(RoleRequiredMixin, ListView):
@@ -18,11 +21,11 @@ class PurchaseListView(RoleRequiredMixin, ListView):
     paginate_by = 15
 
     def get_queryset(self):
-        selected_date = self.request.GET.get('date')
+        selected_date = parse_day(self.request.GET.get('date'))
         queryset = super().get_queryset().order_by('-purchased_at')
 
         if selected_date:
-            queryset = queryset.filter(purchased_at__date=selected_date)
+            queryset = queryset.filter(between_days('purchased_at', selected_date))
 
         return queryset
 
@@ -91,18 +94,27 @@ class AddPurchaseView(RoleRequiredMixin, View):
             return redirect('add_purchase')
 
 
+class SuggestPurchaseView(RoleRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def post(self, request):
+        purchase = create_suggested_purchase(forecast_purchases())
+        if purchase is None:
+            messages.info(request, "Hozircha xarid qilish kerak bo‘lgan mahsulot yo‘q.")
+            return redirect('purchase_list')
+
+        messages.success(request, "Taklif qilingan xarid yaratildi, miqdorlarni tekshiring ✅")
+        return redirect('purchase_detail', pk=purchase.pk)
+
+
 class PurchasePDFView(RoleRequiredMixin, View):
     allowed_roles = ['admin']
 
     def get(self, request, pk):
         purchase = get_object_or_404(Purchase, id=pk)
-        html_string = render_to_string('purchases/purchase_pdf.html', {'purchase': purchase})
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'filename="purchase_{purchase.id}.pdf"'
-
-        HTML(string=html_string).write_pdf(response)
-        return response
+        return serve_document(
+            request, 'purchase-pdf', {'purchase': str(purchase.pk)}, purchase_document(purchase), as_attachment=False,
+        )
 
 
 class PurchaseCompleteView(RoleRequiredMixin, View):
@@ -112,19 +124,10 @@ class PurchaseCompleteView(RoleRequiredMixin, View):
         purchase = get_object_or_404(Purchase, pk=pk)
 
         if purchase.status == "PENDING":
-            items = PurchaseItem.objects.filter(purchase=purchase)
-            total_price = 0
-
-            for item in items:
-                product = item.product
-                product.stock += item.quantity
-                product.save()
-
-                total_price += item.cost_price * item.quantity
-
-            purchase.total_price = total_price
-            purchase.status = "COMPLETED"
-            purchase.save()
+            with transaction.atomic():
+                receive_purchase(purchase)
+                purchase.status = "COMPLETED"
+                purchase.save()
 
             messages.success(request, "Purchase yakunlandi ✅")
         else:
@@ -1,13 +1,18 @@
 import json
-from datetime import date, timedelta
+from datetime import timedelta
 
 from apps.mixins import RoleRequiredMixin
-from apps.models import Purchase, Sale, SaleItem
+from apps.services.batch_documents import BATCH_FORMATS, BATCH_KINDS, batch_document
+from apps.services.dates import parse_day
+from apps.services.documents import inventory_xlsx_document
+from apps.services.inventory_analytics import compute_inventory_analytics
+from apps.services.report_engine import build_report
+from apps.views.jobs import serve_document
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.paginator import Paginator
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db.models import DecimalField, F, Sum
-from django.db.models.functions import TruncDate
 from django.shortcuts import render
+from django.utils import timezone
 from django.views import View
 
 
@@ -16,124 +21,100 @@ class ReportsView(RoleRequiredMixin, LoginRequiredMixin, View):
     template_name = "reports/dashboard.html"
 
     def _get_dates(self, request):
-        today = date.today()
-        start_date_str = request.GET.get("start_date")
-        end_date_str = request.GET.get("end_date")
-
-        start_date = date.fromisoformat(start_date_str) if start_date_str else today - timedelta(days=6)
-        end_date = date.fromisoformat(end_date_str) if end_date_str else today
+        today = timezone.localdate()
+        start_date = parse_day(request.GET.get("start_date"), today - timedelta(days=6))
+        end_date = parse_day(request.GET.get("end_date"), today)
 
         return today, start_date, end_date
 
     def get(self, request):
         today, start_date, end_date = self._get_dates(request)
+        report = build_report(start_date, end_date, today)
 
-        sales_range = Sale.objects.filter(created_at__date__range=[start_date, end_date])
-        purchases_range = Purchase.objects.filter(purchased_at__date__range=[start_date, end_date])
+        context = {
 
-        sales_today = Sale.objects.filter(created_at__date=today)
-        purchases_today = Purchase.objects.filter(purchased_at__date=today)
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
 
-        revenue_agg = sales_range.aggregate(total=Sum("total_amount"))
-        total_revenue = revenue_agg["total"] or 0
+            "total_revenue": report.totals.revenue,
+            "total_profit": report.totals.profit,
+            "total_expenses": report.totals.expenses,
+            "net_profit": report.totals.net,
 
-        cogs_agg = SaleItem.objects.filter(sale__in=sales_range).aggregate(
-            cost=Sum(F("quantity") * F("product__cost_price"), output_field=DecimalField())
-        )
-        total_cost = cogs_agg["cost"] or 0
+            "today_revenue": report.today.revenue,
+            "today_profit": report.today.profit,
+            "today_expenses": report.today.expenses,
+            "today_net": report.today.net,
 
-        total_profit = total_revenue - total_cost
+            "top_products": json.dumps(self._get_top_products(report), cls=DjangoJSONEncoder),
+            "payment_stats": json.dumps(self._get_payment_stats(report), cls=DjangoJSONEncoder),
+            "cashier_stats": json.dumps(self._get_cashier_stats(report), cls=DjangoJSONEncoder),
+            "daily_stats": json.dumps(self._get_daily_trend(report), cls=DjangoJSONEncoder),
+        }
 
-        expenses_agg = purchases_range.aggregate(exp=Sum("total_price"))
-        total_expenses = expenses_agg["exp"] or 0
+        return render(request, self.template_name, context)
 
-        net_profit = total_profit - total_expenses
+    def _get_top_products(self, report):
+        return [{"product__name": p.name, "qty": p.quantity} for p in report.top_products]
 
-        today_metrics = self._calculate_daily_metrics(sales_today, purchases_today)
+    def _get_payment_stats(self, report):
+        return [
+            {"payment_type": payment_type, "total": total}
+            for payment_type, total in report.totals.by_payment.items()
+        ]
 
-        top_products = self._get_top_products(sales_range)
-        payment_stats = self._get_payment_stats(sales_range)
-        cashier_stats = self._get_cashier_stats(sales_range)
-        daily_stats = self._get_daily_trend(sales_range)
+    def _get_cashier_stats(self, report):
+        return [{"cashier__username": c.username, "total": c.total} for c in report.cashiers]
 
-        context = {
+    def _get_daily_trend(self, report):
+        return [
+            {"day": day.strftime("%Y-%m-%d"), "revenue": float(m.revenue), "profit": float(m.profit)}
+            for day, m in report.days
+        ]
 
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d"),
 
-            "total_revenue": total_revenue,
-            "total_profit": total_profit,
-            "total_expenses": total_expenses,
-            "net_profit": net_profit,
+class InventoryAnalyticsView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin']
+    template_name = "reports/inventory.html"
+    paginate_by = 50
 
-            "today_revenue": today_metrics['revenue'],
-            "today_profit": today_metrics['profit'],
-            "today_expenses": today_metrics['expenses'],
-            "today_net": today_metrics['net'],
+    def get(self, request):
+        abc = request.GET.get("abc", "")
+        below = request.GET.get("below") == "1"
+        analytics = compute_inventory_analytics()
+        rows = analytics.rows(abc=abc if abc in ("A", "B", "C") else None, below_reorder_point=below)
 
-            "top_products": json.dumps(list(top_products), cls=DjangoJSONEncoder),
-            "payment_stats": json.dumps(list(payment_stats), cls=DjangoJSONEncoder),
-            "cashier_stats": json.dumps(list(cashier_stats), cls=DjangoJSONEncoder),
-            "daily_stats": json.dumps(daily_stats, cls=DjangoJSONEncoder),
+        context = {
+            "page_obj": Paginator(rows, self.paginate_by).get_page(request.GET.get("page")),
+            "abc": abc,
+            "below": below,
+            "class_counts": analytics.class_counts(),
+            "window_days": analytics.window_days,
+            "lead_time_days": analytics.lead_time_days,
         }
-
         return render(request, self.template_name, context)
 
-    def _calculate_daily_metrics(self, sales, purchases):
-        revenue = sales.aggregate(total=Sum("total_amount"))["total"] or 0
-
-        cogs_agg = SaleItem.objects.filter(sale__in=sales).aggregate(
-            cost=Sum(F("quantity") * F("product__cost_price"), output_field=DecimalField())
-        )
-        cost = cogs_agg["cost"] or 0
-
-        profit = revenue - cost
-
-        expenses = purchases.aggregate(exp=Sum("total_price"))["exp"] or 0
-        net = profit - expenses
-
-        return {'revenue': revenue, 'profit': profit, 'expenses': expenses, 'net': net}
-
-    def _get_top_products(self, sales):
-        return (
-            SaleItem.objects.filter(sale__in=sales)
-            .values("product__name")
-            .annotate(qty=Sum("quantity"))
-            .order_by("-qty")[:5]
-        )
-
-    def _get_payment_stats(self, sales):
-        return (
-            sales.values("payment_type")
-            .annotate(total=Sum("total_amount"))
-        )
-
-    def _get_cashier_stats(self, sales):
-        return (
-            sales.values("cashier__username")
-            .annotate(total=Sum("total_amount"))
-        )
-
-    def _get_daily_trend(self, sales):
-        daily_stats = (
-            sales.annotate(day=TruncDate("created_at"))
-            .values("day")
-            .annotate(
-                revenue=Sum("total_amount"),
-
-                cost=Sum(F("items__quantity") * F("items__product__cost_price"),
-                         output_field=DecimalField())
-            )
-            .order_by("day")
-        )
-
-        results = []
-        for d in daily_stats:
-            profit = d["revenue"] - (d["cost"] or 0)
-            results.append({
-                "day": d["day"].strftime("%Y-%m-%d"),
-                "revenue": float(d["revenue"] or 0),
-                "profit": float(profit or 0),
-            })
-
-        return results
+
+class ExportInventoryAnalyticsView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def get(self, request):
+        today = timezone.localdate()
+        return serve_document(request, 'inventory-xlsx', {'day': today.isoformat()}, inventory_xlsx_document(today))
+
+
+class BatchDocumentsView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def get(self, request):
+        today = timezone.localdate()
+        start_date = parse_day(request.GET.get("start_date"), today.replace(day=1))
+        end_date = parse_day(request.GET.get("end_date"), today)
+        fmt = request.GET.get("format") if request.GET.get("format") in BATCH_FORMATS else "zip"
+        kinds = sorted(set(request.GET.getlist("kinds")) & set(BATCH_KINDS)) or list(BATCH_KINDS)
+
+        params = {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'format': fmt, 'kinds': kinds}
+        # a batch forks a render pool: never in a web worker, only in run_jobs
+        # or manage.py batch_pdfs
+        document = batch_document(start_date, end_date, fmt, kinds)
+        return serve_document(request, 'batch-pdf', params, document, inline=False)
@@ -2,18 +2,33 @@ import json
 from decimal import Decimal as Dec
 
 from apps.mixins import RoleRequiredMixin
-from apps.models import Customer, Debt, Product, Sale, SaleItem
+from apps.models import Sale
+from apps.services.catalog import (
+    CATALOG_FIELDS,
+    catalog_etag,
+    catalog_rows,
+    catalog_state,
+    parse_since,
+)
+from apps.services.checkout import IdempotencyConflict, InsufficientStock, checkout
+from apps.services.dates import between_days, parse_day
+from apps.services.document_cache import document_response
+from apps.services.documents import receipt_document, sales_export_document
+from apps.services.exports import SALE_HEADER, csv_response, sale_rows
+from apps.services.group_commit import checkout_writer
+from apps.services.product_cache import product_cache
+from apps.services.receipts import receipt_store
+from apps.views.jobs import serve_document
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.views import View
 from django.views.generic import CreateView, DetailView, ListView
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.pdfgen import canvas
 
 
 class GetProductView(RoleRequiredMixin, LoginRequiredMixin, View):
@@ -21,18 +36,52 @@ class GetProductView(RoleRequiredMixin, LoginRequiredMixin, View):
 
     def get(self, request):
         barcode = request.GET.get("barcode")
-        try:
-            product = Product.objects.get(Q(barcode=barcode))
-            return JsonResponse({
-                "success": True,
-                "barcode": product.barcode,
-                "name": product.name,
-                "price": float(product.sell_price),
-                "stock": product.stock,
-                "unit": product.unit,
-            })
-        except Product.DoesNotExist:
+        payload = product_cache.get(barcode) if barcode else None
+        if payload is None:
             return JsonResponse({"success": False, "message": "❌ Mahsulot topilmadi!"})
+        return JsonResponse({"success": True, **payload})
+
+
+class GetProductsView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin', 'cashier']
+    max_barcodes = 500
+
+    def get(self, request):
+        barcodes = [b for b in request.GET.getlist("barcode") if b][:self.max_barcodes]
+        found = product_cache.get_many(barcodes)
+        return JsonResponse({
+            "success": True,
+            "products": [found[b] for b in barcodes if b in found],
+            "missing": [b for b in barcodes if b not in found],
+        })
+
+
+class ProductCatalogView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin', 'cashier']
+
+    def get(self, request):
+        try:
+            since = parse_since(request.GET.get("since"))
+        except ValueError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+        version, count, recent = catalog_state()
+        etag = catalog_etag(version, count, recent, since)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = JsonResponse({
+            "success": True,
+            "version": version,
+            "count": count,
+            "full": since is None,
+            "fields": CATALOG_FIELDS,
+            "products": catalog_rows(since),
+        })
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
 
 class SaleCreateView(RoleRequiredMixin, LoginRequiredMixin, CreateView):
@@ -49,11 +98,8 @@ class SaleCreateView(RoleRequiredMixin, LoginRequiredMixin, CreateView):
         template = "sales/add_sale.html" if request.user.role == "admin" else "sales/add_sale_for_employees.html"
         return render(request, template)
 
-    @transaction.atomic
     def post(self, request):
-
         try:
-
             total_amount = Dec(request.POST.get('total_amount', 0) or 0)
 
             payment_type = request.POST.get('payment_type')
@@ -61,6 +107,9 @@ class SaleCreateView(RoleRequiredMixin, LoginRequiredMixin, CreateView):
 
             customer_name = request.POST.get('customer_name', '').strip()
             cart_data = request.POST.get('cart_data')
+            idempotency_key = (
+                request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key') or ''
+            ).strip()[:64] or None
 
             cart_items = json.loads(cart_data)
 
@@ -68,75 +117,42 @@ class SaleCreateView(RoleRequiredMixin, LoginRequiredMixin, CreateView):
                 messages.error(request, "❌ Savdo summasi 0 bo‘lishi yoki savatcha bo‘sh bo‘lishi mumkin emas!")
                 return self._redirect_by_role(request)
 
-            customer = None
-            if payment_type == "credit":
-                if len(customer_name) < 3:
-                    messages.error(request, "Nasiya uchun mijoz ismini kiriting.")
-                    return self._redirect_by_role(request)
-                customer, _ = Customer.objects.get_or_create(name=customer_name)
+            if payment_type == "credit" and len(customer_name) < 3:
+                messages.error(request, "Nasiya uchun mijoz ismini kiriting.")
+                return self._redirect_by_role(request)
 
-            sale = Sale.objects.create(
-                customer=customer,
+            result = checkout(
                 cashier=request.user,
+                cart_items=cart_items,
                 payment_type=payment_type,
-                total_amount=total_amount,
-                paid_amount=received_amount,
+                received_amount=received_amount,
+                customer_name=customer_name,
+                idempotency_key=idempotency_key,
+                writer=checkout_writer if settings.CHECKOUT_GROUP_COMMIT else None,
             )
 
-            for item in cart_items:
-                barcode = item.get("barcode")
-                qty = Dec(item.get("qty", 1) or 1)
-                price = Dec(item.get("price", 0) or 0)
-
-                product = Product.objects.filter(Q(barcode=barcode)).first()
-
-                if not product:
-                    messages.warning(request, f"{item.get('name')} topilmadi.")
-                    continue
-
-                if product.stock < qty:
-                    messages.error(request, f"{product.name} uchun yetarli mahsulot yo‘q!")
-                    raise ValueError(f"Stock yetarli emas: {product.name}")
-
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product,
-                    quantity=qty,
-                    price=price,
-                )
+            for name in result.missing:
+                messages.warning(request, f"{name} topilmadi.")
 
-                product.stock -= qty
-
-                product.save()
-
-            debt_amount = total_amount - received_amount
-
-            if payment_type in ["cash", "card"] and received_amount < total_amount:
-                messages.error(request, "❌ To‘lov summasi umumiy summadan kam bo‘lishi mumkin emas!")
-                raise ValueError("To‘lov summasi kam")
-
-            if payment_type == "credit" and debt_amount > 0 and sale.customer:
-                sale.customer.total_debt += debt_amount
-                sale.customer.save()
-
-                debt = Debt.objects.create(
-                    customer=sale.customer,
-                    amount=total_amount,
-                    paid_amount=received_amount,
-                    created_by=request.user,
-                )
+            messages.success(request, "✅ Savdo muvaffaqiyatli amalga oshirildi!")
+            return JsonResponse({
+                "success": True,
+                "sale_id": result.sale_id,
+                "replayed": result.replayed,
+                "receipt_url": reverse("sale_receipt_text", args=[result.sale_id]),
+            })
 
-                debt.update_status()
+        except InsufficientStock as e:
+            messages.error(request, f"{e.product.name} uchun yetarli mahsulot yo‘q!")
+            return JsonResponse({"success": False, "message": str(e)})
 
-            messages.success(request, "✅ Savdo muvaffaqiyatli amalga oshirildi!")
-            return JsonResponse({"success": True, "sale_id": sale.id})
+        except IdempotencyConflict as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=409)
 
         except ValueError as e:
-            transaction.set_rollback(True)
             return JsonResponse({"success": False, "message": str(e)})
 
         except Exception as e:
-            transaction.set_rollback(True)
             return JsonResponse({"success": False, "message": "Kutilmagan xatolik: " + str(e)})
 
 
@@ -148,15 +164,31 @@ class SaleHistoryView(RoleRequiredMixin, LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        filter_date = self.request.GET.get("date")
+        filter_date = parse_day(self.request.GET.get("date"))
         queryset = super().get_queryset().order_by("-created_at")
 
         if filter_date:
-            queryset = queryset.filter(created_at__date=filter_date)
+            queryset = queryset.filter(between_days('created_at', filter_date))
 
         return queryset
 
 
+class ExportSalesView(RoleRequiredMixin, LoginRequiredMixin, View):
+    allowed_roles = ['admin']
+
+    def get(self, request):
+        today = timezone.localdate()
+        start_date = parse_day(request.GET.get("start_date"), today.replace(day=1))
+        end_date = parse_day(request.GET.get("end_date"), today)
+
+        if request.GET.get("format") == "xlsx":
+            params = {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'format': 'xlsx'}
+            return serve_document(request, 'sales-export', params, sales_export_document(start_date, end_date))
+        # CSV is written while it downloads, so it never waits for a worker
+        filename = f"sales_{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}.csv"
+        return csv_response(filename, SALE_HEADER, sale_rows(start_date, end_date))
+
+
 class SaleDetailView(LoginRequiredMixin, DetailView):
     queryset = Sale.objects.all()
     template_name = 'sales/sale_detail.html'
@@ -169,78 +201,22 @@ class SaleReceiptPDFView(RoleRequiredMixin, LoginRequiredMixin, View):
 
     def get(self, request, sale_id):
         sale = get_object_or_404(Sale, pk=sale_id)
+        return document_response(receipt_document(sale), as_attachment=False)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="receipt_{sale.id}.pdf"'
-
-        page_width = 80 * mm
-        page_height = A4[1]
-        p = canvas.Canvas(response, pagesize=(page_width, page_height))
-        width, height = page_width, page_height
-        y = height - 10 * mm
-
-        p.setFont("Courier", 7)
-
-        p.drawCentredString(width / 2, y, "🏪 DILYORBEK MARKET")
-        y -= 3 * mm
-        p.drawCentredString(width / 2, y, "📍 Farg'ona vil., Quva tumani")
-        y -= 3 * mm
-        p.drawCentredString(width / 2, y, "☎ +998 90 123 45 67")
-        y -= 5 * mm
-
-        p.drawString(2 * mm, y, f"Sana: {sale.created_at.strftime('%Y-%m-%d %H:%M')}")
-        y -= 3 * mm
-        p.drawString(2 * mm, y, f"Kassir: {sale.cashier.username if sale.cashier else '-'}")
-        y -= 3 * mm
-        p.drawString(2 * mm, y, f"To‘lov: {sale.get_payment_type_display()}")
-        y -= 5 * mm
-
-        if sale.payment_type in ['cash', 'card']:
-            p.drawString(2 * mm, y, f"Berilgan summa: {sale.paid_amount}")
-            y -= 5 * mm
-            p.drawString(2 * mm, y, f"Qaytim: {sale.paid_amount - sale.total_amount}")
-            y -= 5 * mm
-
-        p.drawString(2 * mm, y, "-" * 39)
-        y -= 3 * mm
-        p.drawString(2 * mm, y, "Mahsulot       | Soni | Narx    | Jami")
-        y -= 2 * mm
-        p.drawString(2 * mm, y, "-" * 39)
-        y -= 3 * mm
-
-        for item in sale.items.all():
-            name = item.product.name
-            qty = str(item.quantity)
-            price = f"{int(item.price):,}"
-            subtotal = f"{int(item.subtotal):,}"
-
-            max_len = 14
-            name_lines = [name[i:i + max_len] for i in range(0, len(name), max_len)]
-
-            for i, line_name in enumerate(name_lines):
-                if i == 0:
-                    line = f"{line_name:<14} | {qty:>3}  | {price:>7} | {subtotal:>7}"
-                else:
-                    line = f"{line_name:<14} |      |         |       "
-                p.drawString(2 * mm, y, line)
-                y -= 3 * mm
-
-            p.drawString(2 * mm, y, "-" * 39)
-            y -= 3 * mm
-
-            if y < 20 * mm:
-                p.showPage()
-                p.setFont("Courier", 7)
-                y = height - 10 * mm
-
-        p.drawString(2 * mm, y, "=" * 39)
-        y -= 5 * mm
-        p.drawRightString(width - 2 * mm, y, f"Jami: {int(sale.total_amount):,} so‘m")
-        y -= 7 * mm
-
-        p.drawCentredString(width / 2, y, "✅ Rahmat! Sizni kutib qolamiz!")
-        y -= 5 * mm
-
-        p.showPage()
-        p.save()
-        return response
+
+class SaleReceiptTextView(RoleRequiredMixin, LoginRequiredMixin, View):
+    """The text receipt, or with ?format=escpos the bytes to send to a thermal printer."""
+
+    allowed_roles = ['admin', 'cashier']
+
+    def get(self, request, sale_id):
+        try:
+            text = receipt_store.get(sale_id)
+        except Sale.DoesNotExist:
+            raise Http404("Sotuv topilmadi")
+
+        if request.GET.get("format") == "escpos":
+            response = HttpResponse(receipt_store.layout.escpos(text), content_type="application/octet-stream")
+            response["Content-Disposition"] = f'attachment; filename="receipt_{sale_id}.bin"'
+            return response
+        return HttpResponse(text, content_type="text/plain; charset=utf-8")
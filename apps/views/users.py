@@ -1,12 +1,11 @@
 import json
-from datetime import timedelta
 
 from apps.forms import CustomPasswordChangeForm
 from apps.mixins import RoleRequiredMixin
-from apps.models import Product, Sale, User
+from apps.models import Sale
+from apps.services.counters import dashboard_counters
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
-from django.db.models import Sum
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
@@ -48,34 +47,19 @@ class DashboardView(RoleRequiredMixin, LoginRequiredMixin, View):
         if request.user.role != 'admin':
             return redirect("sale_create")
 
-        today = timezone.now().date()
+        today = timezone.localdate()
 
-        today_sales_queryset = Sale.objects.filter(created_at__date=today)
-        total_sales_today = today_sales_queryset.count()
-        total_amount_today = float(today_sales_queryset
-                                   .aggregate(total=Sum('total_amount'))['total'] or 0)
-
-        total_products = Product.objects.count()
-        total_employees = User.objects.filter(is_staff=True).count()
+        counters = dashboard_counters.dashboard(today)
         recent_sales = Sale.objects.order_by('-created_at')[:5]
 
-        last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-        sales_chart_labels = [d.strftime("%d-%m") for d in last_7_days]
-
-        sales_chart_data = []
-        for d in last_7_days:
-            amount = Sale.objects.filter(created_at__date=d) \
-                         .aggregate(total=Sum('total_amount'))['total'] or 0
-            sales_chart_data.append(float(amount))
-
         context = {
-            'total_sales_today': total_sales_today,
-            'total_amount_today': total_amount_today,
-            'total_products': total_products,
-            'total_employees': total_employees,
+            'total_sales_today': counters['total_sales_today'],
+            'total_amount_today': counters['total_amount_today'],
+            'total_products': counters['total_products'],
+            'total_employees': counters['total_employees'],
             'recent_sales': recent_sales,
-            'sales_chart_labels': json.dumps(sales_chart_labels),
-            'sales_chart_data': json.dumps(sales_chart_data),
+            'sales_chart_labels': json.dumps([d.strftime("%d-%m") for d in counters['days']]),
+            'sales_chart_data': json.dumps(counters['revenue']),
         }
 
         return render(request, 'dashboard.html', context)
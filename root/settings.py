@@ -135,6 +135,79 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Barcode lookup cache of the till (apps/services/product_cache.py)
+PRODUCT_CACHE_SIZE = 4096
+PRODUCT_CACHE_TTL = 5
+
+# Guarded stock updates slower than this (seconds) count as lock waits (apps/services/stock.py)
+STOCK_LOCK_WAIT_THRESHOLD = 0.005
+
+# Commit checkouts of concurrent tills in shared transactions (apps/services/group_commit.py)
+CHECKOUT_GROUP_COMMIT = False
+CHECKOUT_GROUP_COMMIT_MAX_BATCH = 32
+CHECKOUT_GROUP_COMMIT_MAX_DELAY = 0.005
+CHECKOUT_GROUP_COMMIT_TIMEOUT = 10
+
+# Live dashboard counters (apps/services/counters.py). The local backend keeps
+# them per process; CacheCounterBackend shares them through the default cache.
+DASHBOARD_COUNTERS_BACKEND = 'apps.services.counters.LocalCounterBackend'
+DASHBOARD_COUNTERS_RECONCILE_INTERVAL = 60
+
+# Inventory analytics (apps/services/inventory_analytics.py): days of history,
+# supplier lead time in days and safety-stock z-score per ABC class
+INVENTORY_WINDOW_DAYS = 90
+INVENTORY_LEAD_TIME_DAYS = 7
+INVENTORY_SERVICE_LEVELS = {'A': 1.65, 'B': 1.28, 'C': 0.84}
+
+# Purchase suggestions (apps/services/forecasting.py): days of history fitted,
+# days an order should last after it arrives, 'ses' or 'moving_average', and
+# the safety-stock z-score
+PURCHASE_FORECAST_HISTORY_DAYS = 365
+PURCHASE_FORECAST_COVER_DAYS = 14
+PURCHASE_FORECAST_METHOD = 'ses'
+PURCHASE_FORECAST_Z = 1.65
+
+# Monthly partitions of Sale and SaleItem (apps/services/partitions.py). Set
+# SALES_PARTITIONED once `partition_sales convert` has run, so sale item
+# queries also bound their own created_at and prune item partitions.
+SALES_PARTITIONED = False
+SALES_PARTITION_MONTHS_AHEAD = 3
+
+# Rendered PDFs and exports (apps/services/document_cache.py), evicted least
+# recently served first once the directory grows past the limit
+DOCUMENT_CACHE_DIR = MEDIA_ROOT / "documents"
+DOCUMENT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Render purchase PDFs, product exports and Excel sales exports in
+# `manage.py run_jobs` workers (apps/services/jobs.py) instead of the request.
+# Batch documents are never rendered in the request: with this off the page
+# answers 503 and `manage.py batch_pdfs` is the way to get them. Failed jobs are retried up to JOB_MAX_ATTEMPTS. A worker touches its running
+# job every JOB_HEARTBEAT_INTERVAL seconds; a running job not touched for
+# JOB_TIMEOUT seconds is taken to have lost its worker and is requeued.
+BACKGROUND_JOBS = False
+JOB_RESULTS_DIR = MEDIA_ROOT / "jobs"
+JOB_MAX_ATTEMPTS = 3
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_TIMEOUT = 5 * 60
+JOB_RESULT_TTL_DAYS = 7
+JOB_POLL_INTERVAL = 1
+
+# Processes rendering a batch of purchase and receipt PDFs
+# (apps/services/batch_documents.py); None uses one per core
+BATCH_PDF_WORKERS = None
+
+# Text and ESC/POS receipts (apps/services/receipts.py), rendered when a sale
+# commits and kept in the default cache; RECEIPT_COLUMNS is the printer's
+# line width in characters (48 on most 80 mm printers)
+RECEIPT_COLUMNS = 48
+RECEIPT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# WeasyPrint, reportlab and openpyxl are imported the first time a document
+# is rendered (apps/services/document_backends.py). Set this in workers that
+# mostly render documents, so they import them at start-up instead;
+# `run_jobs` always does. `manage.py bench_startup` measures the difference.
+PRELOAD_DOCUMENT_BACKENDS = False
+
 JAZZMIN_SETTINGS = {
     # title of the window (Will default to current_admin_site.site_title if absent or None)
     "site_title": "Library Admin",